@@ -0,0 +1,99 @@
+"""
+Consultas de administración sobre la auditoría persistida.
+
+- `GET /admin/audit/rollups`: serie temporal (minuto u hora) de una ruta o de todas.
+- `GET /admin/audit/routes`: resumen por ruta en una ventana, ordenable por p99, volumen o errores.
+- `GET /admin/audit/events`: eventos recientes de `marine_audit` (login, logout...).
+
+Los rollups de varios workers y minutos se combinan sumando histogramas (`merge_rollups`).
+"""
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.audit.audit_writer import merge_rollups
+from app.core.auth.guards import require_admin
+from app.db import models as m
+from app.db.routing import get_read_db
+
+router = APIRouter(prefix="/admin/audit", tags=["admin"])
+
+MAX_WINDOW_MINUTES = 7 * 24 * 60
+
+
+def _rollup_rows(db: Session, since_minutes: int, route: Optional[str], method: Optional[str]):
+    since = datetime.now(timezone.utc) - timedelta(minutes=since_minutes)
+    stmt = select(m.MarineRequestRollup).where(m.MarineRequestRollup.bucket >= since)
+    if route:
+        stmt = stmt.where(m.MarineRequestRollup.route == route)
+    if method:
+        stmt = stmt.where(m.MarineRequestRollup.method == method.upper())
+    return db.execute(stmt).scalars().all()
+
+
+@router.get("/rollups")
+def list_rollups(
+    since_minutes: int = Query(60, ge=1, le=MAX_WINDOW_MINUTES),
+    route: Optional[str] = Query(None, description="Plantilla de ruta, p. ej. /details/{query}"),
+    method: Optional[str] = Query(None),
+    granularity: Literal["minute", "hour"] = Query("minute"),
+    db: Session = Depends(get_read_db),
+    _: m.User = Depends(require_admin),
+) -> List[dict]:
+    groups = defaultdict(list)
+    for row in _rollup_rows(db, since_minutes, route, method):
+        bucket = row.bucket.replace(minute=0) if granularity == "hour" else row.bucket
+        groups[(bucket, row.method, row.route)].append(row)
+    return [
+        {"bucket": bucket.isoformat(), "method": meth, "route": rt, **merge_rollups(rows)}
+        for (bucket, meth, rt), rows in sorted(groups.items(), key=lambda item: (item[0][0], item[0][2], item[0][1]))
+    ]
+
+
+@router.get("/routes")
+def top_routes(
+    since_minutes: int = Query(60, ge=1, le=MAX_WINDOW_MINUTES),
+    order_by: Literal["p99_ms", "p95_ms", "count", "error_count", "error_rate"] = Query("p99_ms"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    _: m.User = Depends(require_admin),
+) -> List[dict]:
+    groups = defaultdict(list)
+    for row in _rollup_rows(db, since_minutes, None, None):
+        groups[(row.method, row.route)].append(row)
+    summaries = [{"method": meth, "route": rt, **merge_rollups(rows)} for (meth, rt), rows in groups.items()]
+    summaries.sort(key=lambda s: s[order_by] or 0, reverse=True)
+    return summaries[:limit]
+
+
+@router.get("/events")
+def list_events(
+    action: Optional[str] = Query(None, description="p. ej. auth.login, auth.login_failed, auth.logout"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    _: m.User = Depends(require_admin),
+) -> List[dict]:
+    stmt = select(m.MarineAudit).order_by(m.MarineAudit.created_at.desc()).limit(limit)
+    if action:
+        stmt = stmt.where(m.MarineAudit.action == action)
+    out = []
+    for event in db.execute(stmt).scalars():
+        try:
+            details = json.loads(event.details) if event.details else None
+        except ValueError:
+            details = event.details
+        out.append({
+            "id": event.id,
+            "action": event.action,
+            "actor_id": event.actor_id,
+            "details": details,
+            "created_at": event.created_at.isoformat() if event.created_at else None,
+        })
+    return out
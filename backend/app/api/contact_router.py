@@ -1,8 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr, Field
 from typing import List
-from sqlalchemy.orm import Session
-from app.db.database import get_db
 
 
 from app.utils.adapters.email_adapter import async_send_email, EmailConfigError
@@ -71,7 +69,7 @@ def _compose_html(data: ContactForm) -> str:
 
 
 @router.post("/submit")
-async def submit_contact(form: ContactForm, db: Session = Depends(get_db)):
+async def submit_contact(form: ContactForm):
     try:
         # No persistence in DB
         subject = "HSO Marine — Contact form"
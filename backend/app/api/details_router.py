@@ -1,17 +1,25 @@
 # details_router.py
+import asyncio
 from fastapi import APIRouter, Path, HTTPException, Depends
 from fastapi.responses import JSONResponse
 import logging
-from typing import Optional
-import asyncio
-from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import any_, or_, select
 
-from app.db.database import get_db
+from app.db.routing import get_async_read_db, get_read_db
 from app.db.models.marine_vessel import MarineVessel
-from app.db.models.marine_country import MarineCountry
-from app.schemas.vessel_schemas import VesselDetailsWrapper, VesselData, VesselDimensions
+from app.schemas.vessel_schemas import (
+    VesselDetailsWrapper,
+    VesselData,
+    VesselBatchRequest,
+    VesselBatchItem,
+    VesselBatchResponse,
+)
+from app.services.country_index import country_index
+from app.services.search_service import best_vessel_mmsi_async
+from app.integrations.aisstream.details import detail_doc_from_vessel
 
 router = APIRouter(prefix="/details", tags=["details"])
 logger = logging.getLogger(__name__)
@@ -21,52 +29,13 @@ def get_ais_bridge_service():
     from app.main import app
     return getattr(app.state, "ais_bridge", None)
 
-def parse_timestamp(ts_val) -> str:
-    """
-    Intenta parsear un timestamp en varios formatos y devolver ISO 8601 string.
-    Si falla o es nulo, devuelve la fecha actual en UTC.
-    """
-    if not ts_val:
-        return datetime.now(timezone.utc).isoformat()
-    
-    if isinstance(ts_val, datetime):
-        return ts_val.isoformat()
-    
-    ts_str = str(ts_val).strip()
-    if not ts_str:
-        return datetime.now(timezone.utc).isoformat()
-        
-    # Intentar formatos comunes
-    formats = [
-        "%Y-%m-%dT%H:%M:%S.%f%z",  # ISO con timezone
-        "%Y-%m-%dT%H:%M:%S%z",     # ISO sin microsegundos
-        "%Y-%m-%d %H:%M:%S%z",     # Espacio en vez de T
-        "%Y-%m-%d %H:%M:%S",       # Sin timezone (asumir UTC)
-        "%Y-%m-%dT%H:%M:%S",       # ISO naive
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(ts_str, fmt)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return dt.isoformat()
-        except ValueError:
-            continue
-            
-    # Si todo falla, devolver el string original o datetime actual como fallback seguro
-    # Preferimos devolver algo parseable por JS si es posible, pero si es basura,
-    # el frontend tendrá que lidiar con ello o mostrar 'Invalid Date'.
-    # Retornamos el original por si acaso es un formato que JS sí entiende nativamente.
-    return ts_str
-
 @router.get("/{query}", response_model=VesselDetailsWrapper)
 async def get_ship_details(
     query: str = Path(..., description="MMSI o nombre del barco"),
     service = Depends(get_ais_bridge_service),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    print(f"=== SOLICITANDO DETALLES PARA QUERY: {query} ===")
+    logger.debug(f"Vessel details requested for query={query}")
     
     mmsi = None
     
@@ -76,13 +45,11 @@ async def get_ship_details(
     elif query.isdigit() and len(query) in (7, 8):
         # Buscar por IMO en la base de datos
         logger.info(f"Buscando barco por IMO: {query}")
-        vessel = db.execute(
-            select(MarineVessel).where(MarineVessel.imo == query)
-        ).first()
+        mmsi = (await db.execute(
+            select(MarineVessel.mmsi).where(MarineVessel.imo == query)
+        )).scalar()
         
-        if vessel:
-            vessel = vessel[0]
-            mmsi = vessel.mmsi
+        if mmsi:
             logger.info(f"IMO '{query}' resuelto a MMSI: {mmsi}")
         else:
             raise HTTPException(
@@ -90,15 +57,11 @@ async def get_ship_details(
                 detail=f"No se encontró ningún barco con el IMO: {query}"
             )
     else:
-        # Buscar por nombre en la base de datos
+        # Buscar por nombre en la base de datos (índice trigram, mejor coincidencia)
         logger.info(f"Buscando barco por nombre: {query}")
-        vessel = db.execute(
-            select(MarineVessel).where(MarineVessel.name.ilike(f"%{query}%"))
-        ).first()
+        mmsi = await best_vessel_mmsi_async(db, query)
         
-        if vessel:
-            vessel = vessel[0] # SQLAlchemy result proxy returns tuples when using select(Model) in some versions or depending on execution
-            mmsi = vessel.mmsi
+        if mmsi:
             logger.info(f"Nombre '{query}' resuelto a MMSI: {mmsi}")
         else:
             raise HTTPException(
@@ -117,114 +80,30 @@ async def get_ship_details(
             detail="MMSI inválido o no se pudo resolver el nombre"
         )
 
-    realtime_data = None
+    # Documento materializado por el bridge: una búsqueda por clave, sin esperar al stream.
+    # En workers pasivos es un HGET a Redis (cliente síncrono): fuera del event loop
     if service:
-        try:
-            # Usar el servicio existente para obtener datos estáticos
-            realtime_data = await service.get_ship_static_data(mmsi, timeout=2.0)
-            print(f"Resultado del servicio: {realtime_data}")
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout obteniendo datos en tiempo real para MMSI {mmsi}, buscando en DB...")
-        except Exception as e:
-            logger.error(f"Error obteniendo datos del servicio: {str(e)}")
-
-    # Obtener nombre del país (flag) basado en los primeros 3 dígitos del MMSI
-    country_name = "N/A"
-    try:
-        mid = int(mmsi[:3])
-        country = db.execute(
-            select(MarineCountry).where(MarineCountry.mid == mid)
-        ).scalar_one_or_none()
-        if country:
-            country_name = country.country
-    except (ValueError, TypeError):
-        pass
-
-    if realtime_data:
-        try:
-            dims_data = realtime_data.get('dimensions', {})
-            
-            # Asegúrate de que estás convirtiendo tipos adecuadamente
-            # Conversión de los campos que pueden ser de tipos inesperados
-            vessel_data = VesselData(
-                ship_name=realtime_data.get('ship_name', 'Unknown'),
-                imo_number=str(realtime_data.get('imo_number')) if realtime_data.get('imo_number') is not None else None,
-                call_sign=realtime_data.get('call_sign', 'N/A'),
-                ship_type=realtime_data.get('ship_type', 'Unknown'),
-                flag=country_name,
-                dimensions=VesselDimensions(
-                    a=int(dims_data.get('a', 0)),  # Asegúrate de que estos son enteros
-                    b=int(dims_data.get('b', 0)),
-                    c=int(dims_data.get('c', 0)),
-                    d=int(dims_data.get('d', 0)),
-                    length=float(dims_data.get('length', 0)),  # Convertir a float
-                    width=float(dims_data.get('width', 0))     # Convertir a float
-                ),
-                fix_type=str(realtime_data.get('fix_type', 'N/A')) if realtime_data.get('fix_type') is not None else 'N/A',
-                eta=str(realtime_data.get('eta', 'N/A')),
-                draught=str(realtime_data.get('draught', 'N/A')) if realtime_data.get('draught') is not None else 'N/A',
-                destination=str(realtime_data.get('destination', 'N/A')),
-                timestamp=parse_timestamp(realtime_data.get('timestamp')),
-                latitude=None,
-                longitude=None
-            )
-
-            # Intentar obtener posición (lat, lon)
-            pos = service.get_ship_position(mmsi)
-            if pos:
-                vessel_data.latitude = pos[0]
-                vessel_data.longitude = pos[1]
-            
-            return VesselDetailsWrapper(
-                mmsi=mmsi,
-                data=vessel_data,
-                status="success"
-            )
-        except Exception as e:
-            logger.error(f"Error mapeando datos realtime: {e}")
-            # Si falla mapeo, fallback a DB
+        doc = await asyncio.to_thread(service.get_ship_details, mmsi)
+        if doc:
+            try:
+                return VesselDetailsWrapper(mmsi=mmsi, data=VesselData(**doc), status="success")
+            except Exception as e:
+                logger.error(f"Error mapeando documento de detalle: {e}")
+                # Si falla mapeo, fallback a DB
 
     # Fallback a DB
     logger.info(f"Buscando MMSI {mmsi} en base de datos...")
-    vessel = db.execute(select(MarineVessel).where(MarineVessel.mmsi == mmsi)).scalar_one_or_none()
+    vessel = (await db.execute(select(MarineVessel).where(MarineVessel.mmsi == mmsi))).scalar_one_or_none()
     
     if vessel:
-        ext_refs = vessel.ext_refs or {}
-        dims_data = ext_refs.get('dimensions', {})
-        
-        ts = ext_refs.get('timestamp') or vessel.updated_at.isoformat()
-        
-        vessel_data = VesselData(
-            ship_name=vessel.name or "Unknown",
-            imo_number=str(vessel.imo),  # Convertir a string
-            call_sign=ext_refs.get('call_sign', 'N/A'),
-            ship_type=vessel.type or "Unknown",
-            flag=country_name,
-            dimensions=VesselDimensions(
-                a=int(dims_data.get('a', 0)),  # Asegúrate que sean enteros
-                b=int(dims_data.get('b', 0)),
-                c=int(dims_data.get('c', 0)),
-                d=int(dims_data.get('d', 0)),
-                length=float(vessel.length or dims_data.get('length', 0)),  # Convertir a float
-                width=float(vessel.width or dims_data.get('width', 0))      # Convertir a float
-            ),
-            fix_type=str(ext_refs.get('fix_type', 'N/A')) if ext_refs.get('fix_type') is not None else 'N/A',
-            eta=ext_refs.get('eta', 'N/A'),
-            draught=str(ext_refs.get('draught', 'N/A')) if ext_refs.get('draught') is not None else 'N/A',
-            destination=ext_refs.get('destination', 'N/A'),
-            timestamp=parse_timestamp(ext_refs.get('timestamp') or vessel.updated_at),
-            latitude=None,
-            longitude=None
-        )
-        
+        # País de bandera por el MID del MMSI (tabla en memoria, sin consulta)
+        if not country_index.fresh:
+            await asyncio.to_thread(country_index.ensure)
+        country_name = country_index.name(mmsi)
+
         # Intentar enriquecer con posición en tiempo real si el servicio está activo
-        if service:
-            pos = service.get_ship_position(mmsi)
-            if pos:
-                vessel_data.latitude = pos[0]
-                vessel_data.longitude = pos[1]
-        print(f"=== DETALLES PARA MMSI: {mmsi} DESDE LA BASE DE DATOS ===")
-        print(vessel_data)
+        position = await asyncio.to_thread(service.get_ship_position, mmsi) if service else None
+        vessel_data = VesselData(**detail_doc_from_vessel(vessel, country_name, position))
         return VesselDetailsWrapper(
             mmsi=mmsi,
             data=vessel_data,
@@ -235,4 +114,72 @@ async def get_ship_details(
     raise HTTPException(
         status_code=404,
         detail="No se encontraron datos estáticos para el barco (ni en tiempo real ni en la base de datos)."
-    )
\ No newline at end of file
+    )
+
+@router.post("/batch", response_model=VesselBatchResponse)
+def get_ships_details_batch(
+    payload: VesselBatchRequest,
+    service = Depends(get_ais_bridge_service),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Detalles de varios barcos (MMSI o IMO) en una sola llamada.
+
+    Coste fijo: un pipeline Redis (documentos + posiciones), como mucho una consulta
+    `mmsi = ANY(...) OR imo = ANY(...)`, en vez de N peticiones; las banderas salen de
+    la tabla de países en memoria.
+    """
+    results: Dict[str, VesselBatchItem] = {}
+    mmsi_for: Dict[str, str] = {}  # identificador pedido -> MMSI
+    imos: List[str] = []
+    for ident in dict.fromkeys(i.strip() for i in payload.ids):
+        if ident.isdigit() and len(ident) == 9:
+            mmsi_for[ident] = ident
+        elif ident.isdigit() and len(ident) in (7, 8):
+            imos.append(ident)
+        else:
+            results[ident] = VesselBatchItem(status="invalid")
+
+    # IMO -> MMSI y filas para el fallback, en la misma consulta
+    vessels: Dict[str, MarineVessel] = {}
+    direct = list(mmsi_for.values())
+    if imos:
+        imo_set = set(imos)
+        for vessel in db.execute(
+            select(MarineVessel).where(or_(MarineVessel.mmsi == any_(direct), MarineVessel.imo == any_(imos)))
+        ).scalars():
+            vessels[vessel.mmsi] = vessel
+            if vessel.imo in imo_set:
+                mmsi_for[vessel.imo] = vessel.mmsi
+
+    all_mmsis = list(dict.fromkeys(mmsi_for.values()))
+    docs, positions = service.get_details_bulk(all_mmsis) if service else ({}, {})
+
+    missing = [m for m in all_mmsis if m not in docs and m not in vessels]
+    if missing and not imos:
+        for vessel in db.execute(select(MarineVessel).where(MarineVessel.mmsi == any_(missing))).scalars():
+            vessels[vessel.mmsi] = vessel
+
+    # Países sólo para las filas del fallback (los documentos ya traen la bandera)
+    fallback = [m for m in all_mmsis if m not in docs and m in vessels]
+    country_names: Dict[str, str] = {}
+    if fallback:
+        country_index.ensure()
+        country_names = dict(zip(fallback, country_index.names(fallback)))
+
+    for ident in dict.fromkeys(i.strip() for i in payload.ids):
+        if ident in results:
+            continue
+        mmsi = mmsi_for.get(ident)
+        try:
+            if mmsi in docs:
+                results[ident] = VesselBatchItem(status="success", mmsi=mmsi, data=VesselData(**docs[mmsi]))
+            elif mmsi in vessels:
+                doc = detail_doc_from_vessel(vessels[mmsi], country_names[mmsi], positions.get(mmsi))
+                results[ident] = VesselBatchItem(status="success (db-fallback)", mmsi=mmsi, data=VesselData(**doc))
+            else:
+                results[ident] = VesselBatchItem(status="not_found", mmsi=mmsi)
+        except Exception as e:
+            logger.error(f"Error mapeando detalles de {ident}: {e}")
+            results[ident] = VesselBatchItem(status="error", mmsi=mmsi)
+    return VesselBatchResponse(results=results)
@@ -1,237 +1,133 @@
+import asyncio
 import httpx
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.db.database import get_db
+from sqlalchemy import select, text
+from app.db.database import SessionLocal
+from app.db.routing import get_async_read_db, get_read_db, mark_write
 from app.db import models as m
 from app.core.auth.guards import require_admin
 from app.core.auth.session_manager import get_current_user
-from geoalchemy2.functions import ST_SetSRID, ST_Point
-from app.schemas.port_schemas import PortListResponse, PortListEntry
+from app.config.settings import PORTS_SYNC_SOURCE, PORTS_SYNC_LOCAL_DIR
+from app.schemas.port_schemas import (
+    PortListResponse,
+    NearestPortsResponse,
+    BulkNearestRequest,
+    BulkNearestResponse,
+    BulkNearestEntry,
+)
+from app.services.port_index import port_index, bump_port_dataset_version
+from app.services.port_sync import sync_ports_from_source
+from app.services.port_list_cache import port_list_cache, etag_matches
+from app.services.search_service import search_ports_async
+from app.services.destination_resolver import (
+    destination_resolver,
+    load_port_rows,
+    backfill_vessel_destinations,
+)
 
 router = APIRouter(prefix="/ports", tags=["Ports"])
 
-NGA_API_URL = "https://msi.nga.mil/api/publications/world-port-index?output=json"
-
-FIELD_MAP = {
-    "portNumber": "port_number",
-    "portName": "port_name",
-    "regionNumber": "region_number",
-    "regionName": "region_name",
-    "countryCode": "country_code",
-    "countryName": "country_name",
-    "alternateName": "alternate_name",
-    "unloCode": "unlocode",
-    "globalId": "global_id",
-    "latitude": "latitude",
-    "longitude": "longitude",
-    "ycoord": "ycoord",
-    "xcoord": "xcoord",
-    "publicationNumber": "publication_number",
-    "chartNumber": "chart_number",
-    "navArea": "nav_area",
-    "dnc": "dnc",
-    "s121WaterBody": "s121_water_body",
-    "s57Enc": "s57_enc",
-    "s101Enc": "s101_enc",
-    "dodWaterBody": "dod_water_body",
-    "harborSize": "harbor_size",
-    "harborType": "harbor_type",
-    "shelter": "shelter",
-    "erTide": "er_tide",
-    "erSwell": "er_swell",
-    "erIce": "er_ice",
-    "erOther": "er_other",
-    "overheadLimits": "overhead_limits",
-    "chDepth": "ch_depth",
-    "anDepth": "an_depth",
-    "cpDepth": "cp_depth",
-    "otDepth": "ot_depth",
-    "tide": "tide",
-    "lngTerminalDepth": "lng_terminal_depth",
-    "maxVesselLength": "max_vessel_length",
-    "maxVesselBeam": "max_vessel_beam",
-    "maxVesselDraft": "max_vessel_draft",
-    "offMaxVesselLength": "off_max_vessel_length",
-    "offMaxVesselBeam": "off_max_vessel_beam",
-    "offMaxVesselDraft": "off_max_vessel_draft",
-    "entranceWidth": "entrance_width",
-    "goodHoldingGround": "good_holding_ground",
-    "turningArea": "turning_area",
-    "firstPortOfEntry": "first_port_of_entry",
-    "usRep": "us_rep",
-    "ptCompulsory": "pt_compulsory",
-    "ptAvailable": "pt_available",
-    "ptLocalAssist": "pt_local_assist",
-    "ptAdvisable": "pt_advisable",
-    "tugsSalvage": "tugs_salvage",
-    "tugsAssist": "tugs_assist",
-    "qtPratique": "qt_pratique",
-    "qtOther": "qt_other",
-    "qtSanitation": "qt_sanitation",
-    "cmTelephone": "cm_telephone",
-    "cmTelegraph": "cm_telegraph",
-    "cmRadio": "cm_radio",
-    "cmRadioTel": "cm_radio_tel",
-    "cmAir": "cm_air",
-    "cmRail": "cm_rail",
-    "loWharves": "lo_wharves",
-    "loAnchor": "lo_anchor",
-    "loMedMoor": "lo_med_moor",
-    "loBeachMoor": "lo_beach_moor",
-    "loIceMoor": "lo_ice_moor",
-    "loRoro": "lo_roro",
-    "loSolidBulk": "lo_solid_bulk",
-    "loContainer": "lo_container",
-    "loBreakBulk": "lo_break_bulk",
-    "loOilTerm": "lo_oil_term",
-    "loLongTerm": "lo_long_term",
-    "loOther": "lo_other",
-    "loDangCargo": "lo_dang_cargo",
-    "loLiquidBulk": "lo_liquid_bulk",
-    "medFacilities": "med_facilities",
-    "garbageDisposal": "garbage_disposal",
-    "degauss": "degauss",
-    "dirtyBallast": "dirty_ballast",
-    "crFixed": "cr_fixed",
-    "crMobile": "cr_mobile",
-    "crFloating": "cr_floating",
-    "cranesContainer": "cranes_container",
-    "lifts100": "lifts_100",
-    "lifts50": "lifts_50",
-    "lifts25": "lifts_25",
-    "lifts0": "lifts_0",
-    "srLongshore": "sr_longshore",
-    "srElectrical": "sr_electrical",
-    "srSteam": "sr_steam",
-    "srNavigEquip": "sr_navig_equip",
-    "srElectRepair": "sr_elect_repair",
-    "srIceBreaking": "sr_ice_breaking",
-    "srDiving": "sr_diving",
-    "suProvisions": "su_provisions",
-    "suWater": "su_water",
-    "suFuel": "su_fuel",
-    "suDiesel": "su_diesel",
-    "suDeck": "su_deck",
-    "suEngine": "su_engine",
-    "suAviationFuel": "su_aviation_fuel",
-    "repairCode": "repair_code",
-    "drydock": "drydock",
-    "railway": "railway",
-    "harborUse": "harbor_use",
-    "ukcMgmtSystem": "ukc_mgmt_system",
-    "portSecurity": "port_security",
-    "etaMessage": "eta_message",
-    "searchAndRescue": "search_and_rescue",
-    "tss": "tss",
-    "vts": "vts",
-    "cht": "cht",
-}
+# Columnas de MarinePort que devuelven /details y /search (todas menos la geometría 'coords')
+_PORT_DETAIL_COLUMNS = tuple(c for c in m.MarinePort.__table__.columns if c.name != "coords")
 
-@router.get("/sync")
-async def sync_ports(db: Session = Depends(get_db), current_user: m.User = Depends(require_admin)):
-    """
-    Sync ports from NGA World Port Index API.
-    """
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(NGA_API_URL)
-            response.raise_for_status()
-            data = response.json()
-    except Exception as e:
-        return {"error": f"Failed to fetch data from NGA: {str(e)}"}
 
-    ports_data = data.get("ports", [])
-    added_count = 0
-    updated_count = 0
+def _resolve_sync_source(file: Optional[str]) -> str:
+    """`file` es un nombre dentro de PORTS_SYNC_LOCAL_DIR; sin él se usa PORTS_SYNC_SOURCE."""
+    if not file:
+        return PORTS_SYNC_SOURCE
+    base = Path(PORTS_SYNC_LOCAL_DIR).resolve()
+    path = (base / file).resolve()
+    if base not in path.parents or not path.is_file():
+        raise HTTPException(status_code=400, detail="Sync file not found in PORTS_SYNC_LOCAL_DIR")
+    return str(path)
 
-    for port_json in ports_data:
-        port_num = port_json.get("portNumber")
-        
-        if not port_num:
-            continue
 
-        # Try to find ONLY by port_number (now our unique source of truth)
-        db_port = db.query(m.MarinePort).filter(m.MarinePort.port_number == port_num).first()
-        
-        is_new = False
-        if not db_port:
-            db_port = m.MarinePort()
-            db_port.port_number = port_num
-            # Default unlocode to whatever is in JSON or a temp value
-            unlocode = port_json.get("unloCode")
-            db_port.unlocode = unlocode if unlocode else f"PORT_{port_num}"
-            db_port.name = port_json.get("portName") or "Unknown"
-            is_new = True
-            db.add(db_port)
-        
-        # Update fields
-        for json_key, db_key in FIELD_MAP.items():
-            if json_key in port_json:
-                setattr(db_port, db_key, port_json[json_key])
-        
-        # Sync duplicate fields for compatibility
-        if "portName" in port_json:
-            db_port.name = port_json["portName"]
-        if "countryName" in port_json:
-            db_port.country = port_json["countryName"]
-        if "unloCode" in port_json and port_json["unloCode"]:
-            db_port.unlocode = port_json["unloCode"]
-
-        # Handle Coords (Geography)
-        x = port_json.get("xcoord")
-        y = port_json.get("ycoord")
-        if x is not None and y is not None:
-            try:
-                # Use ST_SetSRID and ST_Point to create the geometry
-                db_port.coords = ST_SetSRID(ST_Point(float(x), float(y)), 4326)
-            except (ValueError, TypeError):
-                pass
-
-        if is_new:
-            added_count += 1
-        else:
-            updated_count += 1
+def _run_port_sync(source: str) -> dict:
+    """Upsert del dataset + invalidación de derivados; corre en un hilo con su propia sesión."""
+    with SessionLocal() as db:
+        stats = sync_ports_from_source(db, source)
+        # Invalida el índice de cercanía (y cualquier derivado del dataset) en todos los workers
+        bump_port_dataset_version()
+        # Precalcular el payload de /ports/list para que la primera carga del mapa sea un hit
+        try:
+            port_list_cache.get(_load_port_list_rows)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Port list prewarm failed: {e}")
 
+        # Re-resolver destinos AIS -> port_number con el dataset nuevo
+        stats["vessel destinations updated"] = None
+        try:
+            destination_resolver.ensure(lambda: load_port_rows(db), force=True)
+            stats["vessel destinations updated"] = backfill_vessel_destinations(db, destination_resolver)
+        except Exception as e:
+            db.rollback()
+            logging.getLogger(__name__).error(f"Destination backfill failed: {e}")
+    return stats
+
+
+@router.get("/sync")
+async def sync_ports(
+    file: Optional[str] = Query(None, description="JSON (o .json.gz) dentro de PORTS_SYNC_LOCAL_DIR para sync offline"),
+    current_user: m.User = Depends(require_admin),
+):
+    """
+    Sync ports from NGA World Port Index API (or a local copy of its JSON).
+    """
+    source = _resolve_sync_source(file)
     try:
-        db.commit()
+        stats = await asyncio.to_thread(_run_port_sync, source)
+    except httpx.HTTPError as e:
+        return {"error": f"Failed to fetch data from NGA: {str(e)}"}
     except Exception as e:
-        db.rollback()
-        return {"error": f"Database commit failed: {str(e)}"}
+        return {"error": f"Port sync failed: {str(e)}"}
+    # Lecturas siguientes del admin al primario (las réplicas pueden ir por detrás del sync)
+    mark_write(sub=current_user.id)
 
     return {
         "message": "update successfull",
-        "ports added": added_count,
-        "ports updated": updated_count
+        "ports added": stats["added"],
+        "ports updated": stats["updated"],
+        "stats": stats,
     }
 
 
+def _load_port_list_rows():
+    with SessionLocal() as db:
+        return db.query(m.MarinePort.port_number, m.MarinePort.xcoord, m.MarinePort.ycoord).all()
+
+
 @router.get("/list", response_model=PortListResponse)
-async def list_ports(db: Session = Depends(get_db), current_user: m.User = Depends(get_current_user)):
+async def list_ports(request: Request, current_user: m.User = Depends(get_current_user)):
     """
     Get a list of all ports with their basic info for map display.
     Returns xcoord (longitude) and ycoord (latitude) as decimal coordinates.
+
+    El cuerpo se serializa una vez por versión del dataset (ver `port_list_cache`) y se
+    sirve ya comprimido, con ETag fuerte y 304 si el cliente tiene la versión vigente.
     """
-    ports = db.query(
-        m.MarinePort.port_number, 
-        m.MarinePort.xcoord,  # longitude in decimal
-        m.MarinePort.ycoord   # latitude in decimal
-    ).all()
-    
-    # Map the results to the response format
-    port_entries = [
-        PortListEntry(port_number=p.port_number, lon=p.xcoord, lat=p.ycoord)
-        for p in ports
-    ]
-    
-    return PortListResponse(ports=port_entries)
+    if port_list_cache.fresh:
+        payload = port_list_cache.get(_load_port_list_rows)
+    else:
+        payload = await asyncio.to_thread(port_list_cache.get, _load_port_list_rows)
+
+    headers = {"ETag": payload.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    encoding, body = payload.pick(request.headers.get("accept-encoding", ""))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/search")
 async def search_ports(
     unlocode: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Search for a port by UN/LOCODE.
@@ -262,11 +158,17 @@ async def search_ports(
     # logging.info(f"Searching port: input='{unlocode}' -> normalized='{final_query}'")
 
     # Case-insensitive search
-    port = db.query(m.MarinePort).filter(m.MarinePort.unlocode.ilike(final_query)).first()
+    port = (await db.execute(
+        select(*_PORT_DETAIL_COLUMNS).where(m.MarinePort.unlocode.ilike(final_query)).limit(1)
+    )).first()
     
     if not port:
-        # Fallback: search by name (case-insensitive, partial match)
-        port = db.query(m.MarinePort).filter(m.MarinePort.name.ilike(f"%{unlocode.strip()}%")).first()
+        # Fallback: best-ranked match by name / alternate name (trigram index)
+        best = await search_ports_async(db, unlocode, limit=1)
+        if best:
+            port = (await db.execute(
+                select(*_PORT_DETAIL_COLUMNS).where(m.MarinePort.port_number == best[0]["port_number"]).limit(1)
+            )).first()
     
     if not port:
         raise HTTPException(
@@ -274,33 +176,24 @@ async def search_ports(
             detail=f"Port with UN/LOCODE '{final_query}' or name '{unlocode}' not found"
         )
         
-    # Manual conversion to dict to safely exclude the binary 'coords' field
-    # reusing logic from get_port_details
-    port_data = {}
-    for column in m.MarinePort.__table__.columns:
-        if column.name != 'coords':
-            port_data[column.name] = getattr(port, column.name)
-            
-    return port_data
+    # Sin la columna binaria 'coords' (misma forma que get_port_details)
+    return dict(port._mapping)
 
 
 @router.get("/details/{port_number}")
-async def get_port_details(port_number: int, db: Session = Depends(get_db)):
+async def get_port_details(port_number: int, db: AsyncSession = Depends(get_async_read_db)):
     """
     Get all details for a specific port by its port_number.
     """
-    port = db.query(m.MarinePort).filter(m.MarinePort.port_number == port_number).first()
+    port = (await db.execute(
+        select(*_PORT_DETAIL_COLUMNS).where(m.MarinePort.port_number == port_number).limit(1)
+    )).first()
     
     if not port:
         raise HTTPException(status_code=404, detail=f"Port with number {port_number} not found")
         
-    # Manual conversion to dict to safely exclude the binary 'coords' field
-    port_data = {}
-    for column in m.MarinePort.__table__.columns:
-        if column.name != 'coords':
-            port_data[column.name] = getattr(port, column.name)
-            
-    return port_data
+    # Sólo columnas escalares: la geometría 'coords' (binaria) no se lee ni se serializa
+    return dict(port._mapping)
 
 
 # Dependencia para obtener el servicio AISBridge (similar a details_router)
@@ -309,10 +202,67 @@ def get_ais_bridge_service():
     return getattr(app.state, "ais_bridge", None)
 
 
+def _port_index(db: Session):
+    def load():
+        return db.query(
+            m.MarinePort.port_number,
+            m.MarinePort.name,
+            m.MarinePort.unlocode,
+            m.MarinePort.ycoord,
+            m.MarinePort.xcoord,
+        ).all()
+    return port_index.ensure(load)
+
+
+@router.get("/nearest", response_model=NearestPortsResponse)
+def get_nearest_ports(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=50),
+    max_km: Optional[float] = Query(None, gt=0),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Nearest ports to a location, ordered by great-circle distance (in-memory index).
+    """
+    ports = _port_index(db).nearest(lat, lon, k=k, max_km=max_km)
+    return {"lat": lat, "lon": lon, "ports": ports}
+
+
+@router.post("/nearest/bulk", response_model=BulkNearestResponse)
+def get_nearest_ports_bulk(
+    payload: BulkNearestRequest,
+    db: Session = Depends(get_read_db),
+    current_user: m.User = Depends(get_current_user),
+    service = Depends(get_ais_bridge_service),
+):
+    """
+    Nearest ports for many vessels at once, using their last known AIS positions.
+    Vessels without a known position are returned with an empty list.
+    """
+    mmsis = list(dict.fromkeys(str(x).strip() for x in payload.mmsis if str(x).strip()))
+    positions = service.get_positions_bulk(mmsis) if service else {}
+    located = [mmsi for mmsi in mmsis if mmsi in positions]
+    nearest = _port_index(db).nearest_many(
+        [positions[mmsi] for mmsi in located], k=payload.k, max_km=payload.max_km
+    )
+    by_mmsi = dict(zip(located, nearest))
+    results = []
+    for mmsi in mmsis:
+        pos = positions.get(mmsi)
+        results.append(BulkNearestEntry(
+            mmsi=mmsi,
+            lat=pos[0] if pos else None,
+            lon=pos[1] if pos else None,
+            ports=by_mmsi.get(mmsi, []),
+        ))
+    return BulkNearestResponse(results=results)
+
+
 @router.get("/{port_number}/arriving")
 async def get_arriving_vessels(
     port_number: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_read_db), 
     current_user: m.User = Depends(get_current_user),
     service = Depends(get_ais_bridge_service)
 ):
@@ -320,71 +270,62 @@ async def get_arriving_vessels(
     Get all vessels that have this port as their destination.
     It searches both the realtime in-memory data and the database fallback.
     """
-    port = db.query(m.MarinePort).filter(m.MarinePort.port_number == port_number).first()
+    port = (await db.execute(
+        select(m.MarinePort.port_number, m.MarinePort.name).where(m.MarinePort.port_number == port_number).limit(1)
+    )).first()
     
     if not port:
         raise HTTPException(status_code=404, detail=f"Port with number {port_number} not found")
 
-    search_terms = []
-    if port.unlocode:
-        search_terms.append(port.unlocode.strip().lower())
-        # Also try without space for unnormalized AIS inputs just in case
-        search_terms.append(port.unlocode.replace(" ", "").lower())
-    if port.name:
-        search_terms.append(port.name.strip().lower())
-
-    # 1. Search in DB
-    db_vessels = []
-    for term in search_terms:
-        # We query the JSONB ext_refs->>'destination'
-        vessels = db.execute(
-            text("SELECT mmsi, name, type, ext_refs FROM marine_vessel WHERE ext_refs->>'destination' ILIKE :term"),
-            {"term": f"%{term}%"}
-        ).fetchall()
-        db_vessels.extend(vessels)
+    # 1. DB: destino ya resuelto a port_number (columna indexada)
+    #    (columnas tipadas; índice (destination_port_number, eta) -> ya ordenado por ETA)
+    db_vessels = (await db.execute(
+        text(
+            "SELECT mmsi, name, type, destination, eta, draught FROM marine_vessel "
+            "WHERE destination_port_number = :port_number ORDER BY eta NULLS LAST"
+        ),
+        {"port_number": port_number}
+    )).fetchall()
 
     results_map = {} # deduplicate by MMSI
     
-    for v in db_vessels:
-        mmsi = v[0]
-        ext_refs = v[3] or {}
+    for mmsi, name, type_, destination, eta, draught in db_vessels:
         results_map[mmsi] = {
             "mmsi": mmsi,
-            "ship_name": v[1] or ext_refs.get("ship_name", "Unknown"),
-            "ship_type": v[2] or ext_refs.get("ship_type", "Unknown"),
-            "destination": ext_refs.get("destination", "N/A"),
-            "eta": ext_refs.get("eta", "N/A"),
-            "draught": ext_refs.get("draught", "N/A"),
+            "ship_name": name or "Unknown",
+            "ship_type": type_ or "Unknown",
+            "destination": destination or "N/A",
+            "eta": eta.strftime("%Y-%m-%d %H:%M") if eta else "N/A",
+            "draught": draught if draught is not None else "N/A",
             "source": "db"
         }
 
-    # 2. Search in Realtime Service
+    # 2. Realtime: índice puerto -> barcos del bridge (Redis síncrono en workers pasivos:
+    #    fuera del event loop)
     if service:
-        for term in search_terms:
-            realtime_vessels = service.get_vessels_by_destination(term)
-            for rv in realtime_vessels:
-                mmsi = rv["mmsi"]
-                # Override or add
-                results_map[mmsi] = {
-                    "mmsi": mmsi,
-                    "ship_name": rv.get("ship_name", "Unknown"),
-                    "ship_type": rv.get("ship_type", "Unknown"),
-                    "destination": rv.get("destination", "N/A"),
-                    "eta": rv.get("eta", "N/A"),
-                    "draught": rv.get("draught", "N/A"),
-                    "source": "realtime"
-                }
+        for rv in await asyncio.to_thread(service.get_arriving, port_number):
+            mmsi = rv["mmsi"]
+            # Override or add
+            results_map[mmsi] = {
+                "mmsi": mmsi,
+                "ship_name": rv.get("ship_name", "Unknown"),
+                "ship_type": rv.get("ship_type", "Unknown"),
+                "destination": rv.get("destination", "N/A"),
+                "eta": rv.get("eta", "N/A"),
+                "draught": rv.get("draught", "N/A"),
+                "source": "realtime"
+            }
 
     # Format output list
     final_list = list(results_map.values())
     
-    # Optionally enrich with current coordinates if service is active
-    if service:
+    # Optionally enrich with current coordinates if service is active (una sola consulta)
+    if service and final_list:
+        positions = await asyncio.to_thread(service.get_positions_bulk, [v["mmsi"] for v in final_list])
         for v in final_list:
-            pos = service.get_ship_position(v["mmsi"])
+            pos = positions.get(v["mmsi"])
             if pos:
                 v["latitude"] = pos[0]
                 v["longitude"] = pos[1]
 
     return {"port": port.name, "count": len(final_list), "vessels": final_list}
-
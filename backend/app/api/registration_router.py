@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.utils.adapters.email_adapter import async_send_email, EmailConfigError
 from app.db import models
 
@@ -95,7 +97,7 @@ def get_plans(db: Session = Depends(get_db)):
 
 
 @router.post("/start-marine")
-async def register_start_marine(form: StartMarineRegistration, db: Session = Depends(get_db)):
+async def register_start_marine(form: StartMarineRegistration, db: AsyncSession = Depends(get_async_db)):
     """
     Start Marine registration endpoint - sends to info@hsomarine.com
     """
@@ -103,7 +105,7 @@ async def register_start_marine(form: StartMarineRegistration, db: Session = Dep
         from app.config import settings as cfg
         
         # Get plan name from DB
-        plan = db.query(models.Plan).filter(models.Plan.id == form.plan_id).first()
+        plan = (await db.execute(select(models.Plan).where(models.Plan.id == form.plan_id))).scalars().first()
         plan_name = plan.name if plan else f"Unknown (ID: {form.plan_id})"
         
         # Prepare email content for sales team
@@ -3,12 +3,13 @@ from __future__ import annotations
 from typing import List, Optional
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
 
 from app.db.database import get_db
+from app.db.routing import get_read_db, mark_write
 from app.db.models import Release, ReleaseSection
 from app.auth.dependencies import require_roles
 
@@ -57,7 +58,7 @@ class ReleaseOut(BaseModel):
 
 @router.get("", response_model=List[ReleaseOut])
 def list_releases(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     q: Optional[str] = Query(None, description="Filtro por coincidencia en title o version"),
@@ -79,7 +80,7 @@ def list_releases(
 
 
 @router.get("/{release_id}", response_model=ReleaseOut)
-def get_release(release_id: int, db: Session = Depends(get_db)):
+def get_release(release_id: int, db: Session = Depends(get_read_db)):
     release = db.query(Release).filter(Release.id == release_id).first()
     if not release:
         raise HTTPException(status_code=404, detail="Release no encontrado")
@@ -92,7 +93,7 @@ def get_release(release_id: int, db: Session = Depends(get_db)):
     status_code=status.HTTP_201_CREATED,
     dependencies=[Depends(require_roles("admin"))],
 )
-def create_release(data: ReleaseCreate, db: Session = Depends(get_db)):
+def create_release(data: ReleaseCreate, request: Request, db: Session = Depends(get_db)):
     existing = (
         db.query(Release)
         .filter(Release.version == data.version, Release.type == data.type)
@@ -118,6 +119,7 @@ def create_release(data: ReleaseCreate, db: Session = Depends(get_db)):
             )
         )
     db.commit()
+    mark_write(request)
     db.refresh(release)
     return release
 
@@ -127,7 +129,7 @@ def create_release(data: ReleaseCreate, db: Session = Depends(get_db)):
     response_model=ReleaseOut,
     dependencies=[Depends(require_roles("admin"))],
 )
-def update_release(release_id: int, data: ReleaseCreate, db: Session = Depends(get_db)):
+def update_release(release_id: int, data: ReleaseCreate, request: Request, db: Session = Depends(get_db)):
     release = db.query(Release).filter(Release.id == release_id).first()
     if not release:
         raise HTTPException(status_code=404, detail="Release no encontrado")
@@ -154,6 +156,7 @@ def update_release(release_id: int, data: ReleaseCreate, db: Session = Depends(g
             )
         )
     db.commit()
+    mark_write(request)
     db.refresh(release)
     return release
 
@@ -163,10 +166,11 @@ def update_release(release_id: int, data: ReleaseCreate, db: Session = Depends(g
     status_code=status.HTTP_204_NO_CONTENT,
     dependencies=[Depends(require_roles("admin"))],
 )
-def delete_release(release_id: int, db: Session = Depends(get_db)):
+def delete_release(release_id: int, request: Request, db: Session = Depends(get_db)):
     release = db.query(Release).filter(Release.id == release_id).first()
     if not release:
         raise HTTPException(status_code=404, detail="Release no encontrado")
     db.delete(release)
     db.commit()
+    mark_write(request)
     return None
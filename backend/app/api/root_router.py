@@ -146,3 +146,27 @@ try:
 except Exception as e:
 	import logging
 	logging.error(f"Error loading port_router: {e}")
+
+# Watchlist
+try:
+	from app.api.watchlist_router import router as watchlist_router
+	router.include_router(watchlist_router)
+except Exception as e:
+	import logging
+	logging.error(f"Error loading watchlist_router: {e}")
+
+# Search (typeahead barcos + puertos)
+try:
+	from app.api.search_router import router as search_router
+	router.include_router(search_router)
+except Exception as e:
+	import logging
+	logging.error(f"Error loading search_router: {e}")
+
+# Auditoría persistida (rollups de requests y eventos, sólo admin)
+try:
+	from app.api.audit_router import router as audit_router
+	router.include_router(audit_router)
+except Exception as e:
+	import logging
+	logging.error(f"Error loading audit_router: {e}")
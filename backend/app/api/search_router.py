@@ -0,0 +1,61 @@
+# search_router.py
+from __future__ import annotations
+
+import time
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.core.auth.session_manager import get_current_user
+from app.db.routing import get_read_db
+from app.db.models import User
+from app.schemas.search_schemas import SearchResponse, SearchResult
+from app.services.search_service import search_ports, search_vessels
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+def get_ais_bridge_service():
+    from app.main import app
+    return getattr(app.state, "ais_bridge", None)
+
+
+@router.get("", response_model=SearchResponse)
+def unified_search(
+    q: str = Query(..., min_length=1, max_length=64, description="Nombre, MMSI, IMO, call sign, puerto o UN/LOCODE"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+    service=Depends(get_ais_bridge_service),
+):
+    """Typeahead de barcos y puertos, ordenado por relevancia."""
+    started = time.perf_counter()
+    results = []
+    seen_mmsi = set()
+    for row in search_vessels(db, q, limit):
+        seen_mmsi.add(row["mmsi"])
+        results.append(SearchResult(
+            kind="vessel", label=row["name"], score=float(row["score"]),
+            mmsi=row["mmsi"], imo=row["imo"], call_sign=row["call_sign"],
+        ))
+    # Barcos vistos en el stream que aún no ha sincronizado el syncer
+    if service is not None:
+        for row in service.search_live(q, limit):
+            if row["mmsi"] in seen_mmsi:
+                continue
+            results.append(SearchResult(
+                kind="vessel", label=row["name"], score=row["score"], source="live",
+                mmsi=row["mmsi"], imo=row["imo"], call_sign=row["call_sign"],
+            ))
+    for row in search_ports(db, q, limit):
+        results.append(SearchResult(
+            kind="port", label=row["name"], score=float(row["score"]),
+            port_number=row["port_number"], unlocode=row["unlocode"], country=row["country"],
+            lat=row["lat"], lon=row["lon"],
+        ))
+    results.sort(key=lambda r: (-r.score, r.label or ""))
+    return SearchResponse(
+        query=q,
+        results=results[:limit],
+        took_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
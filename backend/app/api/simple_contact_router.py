@@ -1,8 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr, Field
 from typing import List
-from sqlalchemy.orm import Session
-from app.db.database import get_db
 from app.utils.adapters.email_adapter import async_send_email, EmailConfigError
 
 
@@ -82,7 +80,7 @@ def _compose_simple_html(data: SimpleContactForm) -> str:
 
 
 @router.post("/simple-submit")
-async def submit_simple_contact(form: SimpleContactForm, db: Session = Depends(get_db)):
+async def submit_simple_contact(form: SimpleContactForm):
     """
     Simplified contact form endpoint matching current frontend fields.
     Sends email to configured recipients and confirmation to user.
@@ -1,7 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr, Field
-from sqlalchemy.orm import Session
-from app.db.database import get_db
 from app.utils.adapters.email_adapter import async_send_email, EmailConfigError
 
 
@@ -81,7 +79,7 @@ def _compose_support_html(data: SupportForm) -> str:
 
 
 @router.post("/support-submit")
-async def submit_support(form: SupportForm, db: Session = Depends(get_db)):
+async def submit_support(form: SupportForm):
     """
     Support form endpoint - sends to support@hsomarine.com
     """
@@ -7,6 +7,7 @@ from app.core.auth.guards import require_admin
 from app.db import models
 from app.utils.adapters.cache_adapter import is_redis_enabled
 from app.utils.metrics import snapshot as metrics_snapshot
+from app.db.routing import pool_status
 from app.observability.prometheus_exporter import render_prometheus_text
 
 router = APIRouter()
@@ -49,6 +50,14 @@ def debug_cache_status():
     }
 
 
+@router.get("/debug/db")
+def debug_db_pools():
+    if not DEBUG:
+        raise HTTPException(status_code=404, detail="Not found")
+    # Estado de los pools por target (primario / réplicas) y retraso de cada réplica
+    return pool_status()
+
+
 @router.get("/debug/metrics")
 def debug_metrics():
     if not DEBUG:
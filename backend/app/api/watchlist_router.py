@@ -0,0 +1,152 @@
+# watchlist_router.py
+from __future__ import annotations
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.auth.session_manager import get_current_user
+from app.db.database import get_db
+from app.db.models import MarineVessel, MarineWatchlist, ResUser, User
+from app.services.country_index import country_index
+
+router = APIRouter(prefix="/watchlist", tags=["watchlist"])
+
+MAX_WATCHLIST_ITEMS = 500
+
+
+def get_ais_bridge_service():
+    from app.main import app
+    return getattr(app.state, "ais_bridge", None)
+
+
+class WatchlistIn(BaseModel):
+    mmsi: str = Field(..., min_length=1, max_length=16, pattern=r"^\d+$")
+
+
+class WatchlistItem(BaseModel):
+    mmsi: str
+    name: Optional[str] = None
+    imo: Optional[str] = None
+    added_at: Optional[str] = None
+
+
+class WatchlistPosition(BaseModel):
+    mmsi: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+
+def _res_user_for(db: Session, user: User, create: bool = False) -> Optional[ResUser]:
+    """`marine_watchlist` apunta a `res_user`; el usuario de la app se enlaza por email."""
+    res_user = db.execute(select(ResUser).where(ResUser.email == user.email)).scalars().first()
+    if res_user is None and create:
+        full_name = " ".join(p for p in (user.first_name, user.last_name) if p) or user.email
+        res_user = ResUser(login=user.email, name=full_name, email=user.email)
+        db.add(res_user)
+        db.flush()
+    return res_user
+
+
+def _watched(db: Session, res_user: Optional[ResUser]):
+    if res_user is None:
+        return []
+    return db.execute(
+        select(MarineVessel.mmsi, MarineVessel.name, MarineVessel.imo, MarineWatchlist.created_at)
+        .join(MarineWatchlist, MarineWatchlist.vessel_id == MarineVessel.id)
+        .where(MarineWatchlist.user_id == res_user.id)
+        .order_by(MarineWatchlist.created_at)
+    ).all()
+
+
+@router.get("", response_model=List[WatchlistItem])
+def list_watchlist(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    rows = _watched(db, _res_user_for(db, user))
+    return [
+        WatchlistItem(mmsi=mmsi, name=name, imo=imo, added_at=created.isoformat() if created else None)
+        for mmsi, name, imo, created in rows
+    ]
+
+
+@router.post("", response_model=WatchlistItem, status_code=201)
+def add_to_watchlist(
+    payload: WatchlistIn,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    service=Depends(get_ais_bridge_service),
+):
+    if user.id is None or user.id <= 0:
+        raise HTTPException(status_code=400, detail="Watchlist not available for this account")
+    res_user = _res_user_for(db, user, create=True)
+    count = db.query(MarineWatchlist).filter(MarineWatchlist.user_id == res_user.id).count()
+    if count >= MAX_WATCHLIST_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_WATCHLIST_ITEMS} vessels allowed")
+
+    vessel = db.execute(select(MarineVessel).where(MarineVessel.mmsi == payload.mmsi)).scalars().first()
+    if vessel is None:
+        # Barco aún no sincronizado desde AIS: registro mínimo, el syncer completará los datos
+        static = getattr(service, "_ship_static_data", {}).get(payload.mmsi) if service else None
+        vessel = MarineVessel(mmsi=payload.mmsi, name=(static or {}).get("ship_name"))
+        country_index.ensure()
+        if vessel.flag is not None and not country_index.known(vessel.flag):
+            vessel.flag = None
+        db.add(vessel)
+        db.flush()
+
+    item = db.execute(
+        select(MarineWatchlist).where(MarineWatchlist.user_id == res_user.id, MarineWatchlist.vessel_id == vessel.id)
+    ).scalars().first()
+    if item is None:
+        item = MarineWatchlist(user_id=res_user.id, vessel_id=vessel.id)
+        db.add(item)
+    db.commit()
+    db.refresh(item)
+    if service:
+        service.bump_watchlist_version()
+    return WatchlistItem(
+        mmsi=vessel.mmsi, name=vessel.name, imo=vessel.imo,
+        added_at=item.created_at.isoformat() if item.created_at else None,
+    )
+
+
+@router.delete("/{mmsi}", status_code=204)
+def remove_from_watchlist(
+    mmsi: str,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    service=Depends(get_ais_bridge_service),
+):
+    res_user = _res_user_for(db, user)
+    if res_user is None:
+        raise HTTPException(status_code=404, detail="Vessel not in watchlist")
+    vessel_id = db.execute(select(MarineVessel.id).where(MarineVessel.mmsi == mmsi)).scalar()
+    deleted = 0
+    if vessel_id is not None:
+        deleted = db.query(MarineWatchlist).filter(
+            MarineWatchlist.user_id == res_user.id, MarineWatchlist.vessel_id == vessel_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Vessel not in watchlist")
+    if service:
+        service.bump_watchlist_version()
+    return Response(status_code=204)
+
+
+@router.get("/positions", response_model=List[WatchlistPosition])
+def watchlist_positions(
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    service=Depends(get_ais_bridge_service),
+):
+    """Última posición de todos los barcos de la watchlist (un único HMGET en modo pasivo)."""
+    mmsis = [row[0] for row in _watched(db, _res_user_for(db, user))]
+    positions = service.get_positions_bulk(mmsis) if service else {}
+    out = []
+    for mmsi in mmsis:
+        pos = positions.get(mmsi)
+        out.append(WatchlistPosition(mmsi=mmsi, lat=pos[0] if pos else None, lon=pos[1] if pos else None))
+    return out
@@ -2,8 +2,7 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 import logging
-from jose import jwt, JWTError
-from app.config.settings import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE
+from app.core.auth.session_manager import authenticate_scope
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 logger = logging.getLogger("app.analytics")
@@ -18,16 +17,10 @@ class PageDwellEvent(BaseModel):
 
 
 def _get_user_id(request: Request) -> str:
-    auth = request.headers.get("authorization") or request.headers.get("Authorization")
-    if not auth or not auth.lower().startswith("bearer "):
-        return "-"
-    token = auth.split(" ", 1)[1].strip()
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM], audience=JWT_AUDIENCE)
-        sub = payload.get("sub")
-        return str(sub) if sub is not None else "-"
-    except JWTError:
-        return "-"
+    # Reutiliza el token ya verificado por RequestPipelineMiddleware
+    payload = authenticate_scope(request.scope).payload
+    sub = payload.get("sub") if payload else None
+    return str(sub) if sub is not None else "-"
 
 
 @router.post("/page_dwell")
@@ -1,6 +1,8 @@
 """Servicio de auditoría privada (solo backend).
 
-Registra eventos de autenticación, tiempos de request y sesiones en memoria.
+Registra eventos de autenticación y tiempos de request en logs y, en bloque, en base de datos
+(`audit_writer`: eventos en `marine_audit`, rollups por minuto en `marine_request_rollup`).
+Las sesiones abiertas se comparten entre workers por el caché.
 """
 from __future__ import annotations
 import logging
@@ -8,8 +10,16 @@ import time
 import hashlib
 from typing import Optional, Dict, Any, Tuple
 
+from app.audit.audit_writer import audit_writer
+from app.utils.adapters.cache_adapter import clear_cache, get_cache, set_cache
+from app.utils.logging_config import request_log_sampler
+
 logger = logging.getLogger("app.audit")
 
+SESSION_KEY = "audit:session:{tid}"
+# TTL de la sesión en caché si el token no trae exp
+SESSION_DEFAULT_TTL = 24 * 3600
+
 
 def _token_id(token: str) -> str:
     # Identificador opaco derivado del token sin exponerlo en claro
@@ -17,6 +27,8 @@ def _token_id(token: str) -> str:
 
 
 class SessionStore:
+    """Inicio de sesión por token: en memoria y en el caché compartido (otros workers / reinicios)."""
+
     def __init__(self) -> None:
         # token_id -> data
         self._store: Dict[str, Dict[str, Any]] = {}
@@ -31,11 +43,22 @@ class SessionStore:
             "start_ts": time.time(),
             "exp_ts": exp_ts,
         }
+        ttl = int(exp_ts - time.time()) if exp_ts else SESSION_DEFAULT_TTL
+        try:
+            set_cache(SESSION_KEY.format(tid=tid), self._store[tid], max(1, ttl))
+        except Exception:
+            pass
         return tid
 
     def end(self, token: str) -> Tuple[Optional[float], Optional[Dict[str, Any]]]:
         tid = _token_id(token)
         data = self._store.pop(tid, None)
+        try:
+            if not data:
+                data = get_cache(SESSION_KEY.format(tid=tid))
+            clear_cache(SESSION_KEY.format(tid=tid))
+        except Exception:
+            pass
         if not data:
             return None, None
         duration = max(0.0, time.time() - float(data.get("start_ts", time.time())))
@@ -56,10 +79,12 @@ def record_login_success(user_id: str, email: str, ip: str, ua: str, token: str,
         tid,
         int(exp_ts) if exp_ts else "-",
     )
+    audit_writer.record_event("auth.login", {"user_id": user_id, "email": email, "ip": ip, "ua": ua, "token_id": tid})
 
 
 def record_login_failure(email: str, ip: str, ua: str) -> None:
     logger.warning("login failed email=%s ip=%s ua=%s", email, ip, ua)
+    audit_writer.record_event("auth.login_failed", {"email": email, "ip": ip, "ua": ua})
 
 
 def record_logout(user_id: str, email: str, ip: str, ua: str, token: Optional[str]) -> None:
@@ -74,11 +99,33 @@ def record_logout(user_id: str, email: str, ip: str, ua: str, token: Optional[st
         ua,
         f"{(duration or 0.0)*1000.0:.2f}",
     )
-
-
-def record_request_timing(method: str, path: str, status: int, duration_ms: float, user_id: Optional[str], ip: str, ua: str) -> None:
+    audit_writer.record_event("auth.logout", {
+        "user_id": user_id,
+        "email": email,
+        "ip": ip,
+        "ua": ua,
+        "session_ms": round((duration or 0.0) * 1000.0, 2) if duration is not None else None,
+    })
+
+
+def record_request_timing(
+    method: str,
+    path: str,
+    status: int,
+    duration_ms: float,
+    user_id: Optional[str],
+    ip: str,
+    ua: str,
+    route: Optional[str] = None,
+) -> None:
+    # Rollup por minuto y ruta (todas las requests, sin muestreo; sólo memoria)
+    audit_writer.observe(method, route, status, duration_ms)
+    # Muestreo por ruta (REQUEST_LOG_SAMPLE_RULES): errores y requests lentas siempre
+    rate = request_log_sampler.sample(path, status, duration_ms)
+    if rate is None or not logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
-        "request method=%s path=%s status=%s duration_ms=%.2f user_id=%s ip=%s ua=%s",
+        "request method=%s path=%s status=%s duration_ms=%.2f user_id=%s ip=%s ua=%s sample_rate=%s",
         method,
         path,
         status,
@@ -86,4 +133,5 @@ def record_request_timing(method: str, path: str, status: int, duration_ms: floa
         user_id if user_id is not None else "-",
         ip,
         ua,
+        rate,
     )
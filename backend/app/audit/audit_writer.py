@@ -0,0 +1,279 @@
+"""
+Escritor de auditoría en bloque: rollups de requests por minuto y eventos de auth.
+
+Cada request suma a un acumulador en memoria por (minuto, método, ruta): count, errores,
+tiempo total/máximo e histograma de latencias con buckets fijos (`LATENCY_BOUNDS_MS`).
+Un hilo vuelca cada `AUDIT_FLUSH_SECONDS`:
+
+- los rollups a `marine_request_rollup`, un UPSERT por lote con una fila por
+  (minuto, método, ruta, worker); el minuto en curso se reescribe en cada volcado con sus
+  valores acumulados (idempotente) y los minutos cerrados se sueltan de memoria;
+- los eventos (login, logout, ...) a `marine_audit` con un único INSERT multi-fila.
+
+Los percentiles salen del histograma, así que filas de varios workers o minutos se combinan
+sumando histogramas (`merge_rollups`). Nunca hay INSERT por request.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import (
+    AUDIT_ROLLUP_ENABLED,
+    AUDIT_FLUSH_SECONDS,
+    AUDIT_EVENT_BUFFER_MAX,
+    AUDIT_ROLLUP_RETENTION_DAYS,
+)
+
+logger = logging.getLogger("app.audit")
+
+# Límites superiores (ms) de los buckets de latencia: 1 ms .. ~60 s en pasos de x1.2
+LATENCY_GROWTH = 1.2
+LATENCY_BOUNDS_MS: List[float] = [round(LATENCY_GROWTH ** k, 3) for k in range(61)]
+UNMATCHED_ROUTE = "-"
+RETENTION_CHECK_SECONDS = 3600
+
+RollupKey = Tuple[int, str, str]  # (minuto epoch, método, ruta)
+
+
+def latency_bucket(duration_ms: float) -> int:
+    return bisect.bisect_left(LATENCY_BOUNDS_MS, duration_ms)
+
+
+def histogram_percentile(histogram: Dict[int, int], q: float, max_ms: Optional[float] = None) -> Optional[float]:
+    """Percentil `q` (0-1): punto medio geométrico del bucket que lo contiene (error < ~10%),
+    acotado por el máximo observado."""
+    total = sum(histogram.values())
+    if total <= 0:
+        return None
+    rank = q * total
+    seen = 0
+    for idx in sorted(histogram):
+        seen += histogram[idx]
+        if seen >= rank:
+            if idx >= len(LATENCY_BOUNDS_MS):
+                value = max_ms
+            elif idx == 0:
+                value = LATENCY_BOUNDS_MS[0]
+            else:
+                value = LATENCY_BOUNDS_MS[idx] / LATENCY_GROWTH ** 0.5
+            if max_ms is not None and (value is None or value > max_ms):
+                value = max_ms
+            return round(value, 3) if value is not None else None
+    return max_ms
+
+
+class _Rollup:
+    __slots__ = ("count", "errors", "client_errors", "total_ms", "max_ms", "histogram", "dirty")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.client_errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram: Dict[int, int] = {}
+        self.dirty = False  # cambios sin volcar
+
+    def add(self, status: int, duration_ms: float) -> None:
+        self.count += 1
+        if not status or status >= 500:
+            self.errors += 1
+        elif status >= 400:
+            self.client_errors += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+        idx = latency_bucket(duration_ms)
+        self.histogram[idx] = self.histogram.get(idx, 0) + 1
+        self.dirty = True
+
+    def row(self, key: RollupKey, worker: str) -> dict:
+        minute, method, route = key
+        return {
+            "bucket": datetime.fromtimestamp(minute * 60, tz=timezone.utc),
+            "method": method,
+            "route": route[:255],
+            "worker": worker,
+            "count": self.count,
+            "error_count": self.errors,
+            "client_error_count": self.client_errors,
+            "total_ms": round(self.total_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": histogram_percentile(self.histogram, 0.50, self.max_ms),
+            "p95_ms": histogram_percentile(self.histogram, 0.95, self.max_ms),
+            "p99_ms": histogram_percentile(self.histogram, 0.99, self.max_ms),
+            # Claves str: el JSON de Postgres no admite claves numéricas
+            "histogram": {str(k): v for k, v in self.histogram.items()},
+        }
+
+
+def merge_rollups(rows: Iterable[Any]) -> dict:
+    """Combina filas de `marine_request_rollup` (varios workers/minutos) en un resumen."""
+    histogram: Dict[int, int] = {}
+    count = errors = client_errors = 0
+    total_ms = max_ms = 0.0
+    for r in rows:
+        count += r.count or 0
+        errors += r.error_count or 0
+        client_errors += r.client_error_count or 0
+        total_ms += r.total_ms or 0.0
+        max_ms = max(max_ms, r.max_ms or 0.0)
+        for k, v in (r.histogram or {}).items():
+            histogram[int(k)] = histogram.get(int(k), 0) + int(v)
+    return {
+        "count": count,
+        "error_count": errors,
+        "client_error_count": client_errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "avg_ms": round(total_ms / count, 3) if count else None,
+        "max_ms": round(max_ms, 3) if count else None,
+        "p50_ms": histogram_percentile(histogram, 0.50, max_ms),
+        "p95_ms": histogram_percentile(histogram, 0.95, max_ms),
+        "p99_ms": histogram_percentile(histogram, 0.99, max_ms),
+    }
+
+
+class AuditWriter:
+    def __init__(self, flush_interval: float = 5.0, max_events: int = 10000):
+        self.flush_interval = max(0.5, flush_interval)
+        self.max_events = max_events
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"[:64]
+        self._lock = threading.Lock()
+        self._rollups: Dict[RollupKey, _Rollup] = {}
+        self._events: List[dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._retention_checked_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Entrada (camino de la request: sólo memoria) ---
+
+    def observe(self, method: str, route: Optional[str], status: int, duration_ms: float) -> None:
+        if self._thread is None:
+            return
+        key = (int(time.time() // 60), method, route or UNMATCHED_ROUTE)
+        with self._lock:
+            rollup = self._rollups.get(key)
+            if rollup is None:
+                rollup = self._rollups[key] = _Rollup()
+            rollup.add(status, duration_ms)
+
+    def record_event(self, action: str, details: Dict[str, Any], actor_id: Optional[int] = None) -> None:
+        if self._thread is None:
+            return
+        event = {
+            "actor_id": actor_id,
+            "action": action[:100],
+            "details": json.dumps(details, ensure_ascii=False, default=str),
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                from app.utils.metrics import increment
+                increment("audit.events.dropped")
+                return
+            self._events.append(event)
+
+    # --- Volcado ---
+
+    def _write(self, rollup_rows: List[dict], events: List[dict]) -> None:
+        from sqlalchemy import delete, insert
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        from app.db.database import SessionLocal
+        from app.db.models import MarineAudit, MarineRequestRollup
+
+        with SessionLocal() as db:
+            if rollup_rows:
+                table = MarineRequestRollup.__table__
+                stmt = pg_insert(table).values(rollup_rows)
+                stmt = stmt.on_conflict_do_update(
+                    constraint="uq_marine_request_rollup_key",
+                    set_={
+                        col: stmt.excluded[col]
+                        for col in ("count", "error_count", "client_error_count", "total_ms", "max_ms",
+                                    "p50_ms", "p95_ms", "p99_ms", "histogram")
+                    } | {"updated_at": datetime.now(timezone.utc)},
+                )
+                db.execute(stmt)
+            if events:
+                db.execute(insert(MarineAudit), events)
+            now = time.monotonic()
+            if AUDIT_ROLLUP_RETENTION_DAYS > 0 and now - self._retention_checked_at >= RETENTION_CHECK_SECONDS:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=AUDIT_ROLLUP_RETENTION_DAYS)
+                db.execute(delete(MarineRequestRollup).where(MarineRequestRollup.bucket < cutoff))
+                self._retention_checked_at = now
+            db.commit()
+
+    def flush(self) -> None:
+        current_minute = int(time.time() // 60)
+        with self._lock:
+            events, self._events = self._events, []
+            dirty = [key for key, rollup in self._rollups.items() if rollup.dirty]
+            rows = []
+            for key in dirty:
+                rows.append(self._rollups[key].row(key, self.worker))
+                self._rollups[key].dirty = False
+            closed = [key for key in self._rollups if key[0] < current_minute]
+        if not rows and not events:
+            return
+        try:
+            self._write(rows, events)
+        except Exception as e:
+            logger.warning(f"Audit flush failed ({len(rows)} rollups, {len(events)} events): {e}")
+            with self._lock:
+                # Reintentar en el siguiente volcado sin superar el límite del buffer
+                self._events = (events + self._events)[: self.max_events]
+                for key in dirty:
+                    if key in self._rollups:
+                        self._rollups[key].dirty = True
+                # Con la base caída no se acumulan minutos cerrados indefinidamente
+                for key in [k for k in self._rollups if k[0] < current_minute - 60]:
+                    self._rollups.pop(key, None)
+            return
+        with self._lock:
+            for key in closed:
+                self._rollups.pop(key, None)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        self._thread = None
+
+
+audit_writer = AuditWriter(AUDIT_FLUSH_SECONDS, AUDIT_EVENT_BUFFER_MAX)
+
+
+def start_audit_writer() -> None:
+    if AUDIT_ROLLUP_ENABLED:
+        audit_writer.start()
+
+
+def stop_audit_writer() -> None:
+    audit_writer.stop()
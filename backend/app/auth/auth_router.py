@@ -3,6 +3,7 @@ from typing import cast
 from sqlalchemy.orm import Session
 from jose import jwt
 from app.db.database import get_db
+from app.db.routing import get_read_db, mark_write
 from app.db import models
 from app.auth.auth_schemas import RegisterRequest, RegisterResponse, LoginRequest, TokenResponse, UserInfo, RefreshRequest, ProfileResponse, ProfileUpdate, SessionEntry, UserUpdateAdmin, PaginatedUsersResponse
 from app.auth.security_jwt import (
@@ -336,6 +337,8 @@ def login(body: LoginRequest, request: Request, response: Response, db: Session
             expires_at=refresh_expiry(),
         ))
         db.commit()
+        # /auth/sessions justo después del login debe ver la sesión nueva
+        mark_write(sub=persona.id)
         try:
             diag_logger.info("login: created session token", extra={"user_id": persona.id, "token_hash": refresh_h})
         except Exception:
@@ -571,6 +574,7 @@ def logout(request: Request, response: Response, body: LogoutRequest | None = No
     except Exception:
         db.rollback()
 
+    mark_write(request)
     _clear_auth_cookies(response)
     return {"success": True}
 
@@ -621,6 +625,7 @@ def refresh_token(body: RefreshRequest, request: Request, response: Response, db
         db.add(new_st)
         # Commit una sola vez para hacer la rotación atómica
         db.commit()
+        mark_write(sub=st.user_id)
         db.refresh(new_st)
         try:
             invalidate_session_cache(hashed)
@@ -800,20 +805,20 @@ def _build_session_list(db: Session, user_id: int, limit: int | None = None) ->
 
 
 @router.get("/sessions", response_model=list[SessionEntry])
-def sessions(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)) -> list[SessionEntry]:
+def sessions(user: models.User = Depends(get_current_user), db: Session = Depends(get_read_db)) -> list[SessionEntry]:
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     return _build_session_list(db, user.id)
 
 
 @router.get("/sessions/{user_id}", response_model=list[SessionEntry])
-def sessions_for_user(user_id: int, admin: models.User = Depends(require_admin), db: Session = Depends(get_db), limit: int | None = None) -> list[SessionEntry]:
+def sessions_for_user(user_id: int, admin: models.User = Depends(require_admin), db: Session = Depends(get_read_db), limit: int | None = None) -> list[SessionEntry]:
     # Admin-only: list sessions for a specific user
     return _build_session_list(db, user_id, limit)
 
 
 @router.get("/users/search", response_model=list[UserInfo])
-def search_users(q: str, admin: models.User = Depends(require_admin), db: Session = Depends(get_db), limit: int | None = 20) -> list[UserInfo]:
+def search_users(q: str, admin: models.User = Depends(require_admin), db: Session = Depends(get_read_db), limit: int | None = 20) -> list[UserInfo]:
     query = db.query(models.User)
     if q:
         like = f"%{q.strip()}%"
@@ -884,6 +889,7 @@ def update_user_admin(
     try:
         db.add(user)
         db.commit()
+        mark_write(sub=admin.id)
         db.refresh(user)
         
         # Invalidate cache
@@ -904,7 +910,7 @@ def list_users_admin(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     admin: models.User = Depends(require_superadmin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> PaginatedUsersResponse:
     """Administrative endpoint to list all users with pagination."""
     query = db.query(models.User)
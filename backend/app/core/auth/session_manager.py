@@ -1,14 +1,20 @@
 from __future__ import annotations
 
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 from app.config.settings import (
     AUTH_COOKIES_ENABLED,
+    AUTH_TOKEN_CACHE_SIZE,
     JWT_AUDIENCE,
     JWT_ALGORITHM,
     JWT_SECRET_KEY,
@@ -52,12 +58,129 @@ def extract_token_from_request(request: Request, creds: HTTPAuthorizationCredent
     return None
 
 
+def extract_token_from_environ(environ: dict, auth: dict | None = None) -> Optional[str]:
+    """Get JWT for a Socket.IO handshake: `auth.token`, Authorization header or cookie fallback."""
+    if isinstance(auth, dict):
+        token = auth.get("token") or auth.get("access_token")
+        if token:
+            return str(token)
+    header = environ.get("HTTP_AUTHORIZATION") or ""
+    if header.lower().startswith("bearer "):
+        return header.split(" ", 1)[1].strip()
+    if AUTH_COOKIES_ENABLED:
+        from http.cookies import SimpleCookie
+        try:
+            cookie = SimpleCookie(environ.get("HTTP_COOKIE") or "")
+        except Exception:
+            return None
+        if "access_token" in cookie:
+            return cookie["access_token"].value
+    return None
+
+
+class _VerifiedTokenCache:
+    """LRU de JWT ya verificados, por firma; cada entrada vale hasta el `exp` del token.
+
+    Un hit evita repetir la verificación HMAC + validación de claims en cada request del
+    mismo cliente. Se compara el token completo, así que una firma sólo devuelve el payload
+    del token con el que se verificó. Los tokens sin `exp` no se guardan.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._entries: "OrderedDict[str, tuple[str, float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token.rpartition(".")[2]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_token, exp, payload = entry
+            if cached_token != token or time.time() >= exp:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        exp = payload.get("exp")
+        if not self.maxsize or not isinstance(exp, (int, float)):
+            return
+        key = token.rpartition(".")[2]
+        with self._lock:
+            self._entries[key] = (token, float(exp), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+_verified_tokens = _VerifiedTokenCache(AUTH_TOKEN_CACHE_SIZE)
+
+
 def decode_token(token: str) -> dict:
     """Decode and validate JWT; raises HTTP 401 on error."""
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
-        return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM], audience=JWT_AUDIENCE)
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM], audience=JWT_AUDIENCE)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    _verified_tokens.put(token, payload)
+    return payload
+
+
+def verify_token(token: str) -> dict:
+    """`decode_token` + MASTER_TOKEN (payload virtual de superadmin)."""
+    from app.config.settings import MASTER_TOKEN
+    if MASTER_TOKEN and token == MASTER_TOKEN:
+        return {"sub": "master", "role": "admin", "is_superadmin": True}
+    return decode_token(token)
+
+
+class AuthContext(NamedTuple):
+    token: Optional[str]
+    payload: Optional[dict]
+
+
+def extract_token_from_scope(scope) -> Optional[str]:
+    """Como `extract_token_from_request`, directamente sobre el scope ASGI."""
+    headers = Headers(scope=scope)
+    auth = headers.get("authorization")
+    if auth and auth.lower().startswith("bearer "):
+        return auth.split(" ", 1)[1].strip()
+    if AUTH_COOKIES_ENABLED:
+        cookie = headers.get("cookie")
+        if cookie:
+            return cookie_parser(cookie).get("access_token") or None
+    return None
+
+
+def authenticate_scope(scope) -> AuthContext:
+    """Verifica el token del request una única vez y deja el resultado en el scope.
+
+    Lo ejecuta la primera etapa de `RequestPipelineMiddleware`; auditoría, RequireAuth y `get_token_payload` leen `scope["state"]["auth_context"]` en vez de
+    volver a decodificar. También rellena `request.state.token_payload` / `.sub`.
+    """
+    state = scope.setdefault("state", {})
+    ctx = state.get("auth_context")
+    if ctx is not None:
+        return ctx
+    token = extract_token_from_scope(scope)
+    payload = None
+    if token:
+        try:
+            payload = verify_token(token)
+        except HTTPException:
+            payload = None
+    ctx = AuthContext(token, payload)
+    state["auth_context"] = ctx
+    if payload is not None:
+        state["token_payload"] = payload
+        state["sub"] = payload.get("sub")
+    return ctx
 
 
 def get_token_payload(request: Request, creds: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> dict:
@@ -66,6 +189,13 @@ def get_token_payload(request: Request, creds: HTTPAuthorizationCredentials | No
     payload = getattr(request.state, "token_payload", None)
     if isinstance(payload, dict) and payload.get("sub") is not None:
         return payload
+    # Ya verificado por el middleware de contexto (sin token o inválido): no repetir
+    ctx = getattr(request.state, "auth_context", None)
+    if isinstance(ctx, AuthContext) and (creds is None or creds.credentials == ctx.token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Falta token" if not ctx.token else "Token inválido",
+        )
 
     # 2) Extract token
     token = extract_token_from_request(request, creds)
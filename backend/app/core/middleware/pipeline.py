@@ -0,0 +1,246 @@
+"""
+Pipeline ASGI de requests: auth context, auditoría, RequireAuth, interruptor remoto y
+correlation-id en un solo middleware ASGI puro.
+
+Sustituye a los `BaseHTTPMiddleware` que había por etapa (cada uno añadía un task group,
+re-envolvía la respuesta y rompía el streaming). Aquí cada request pasa una vez por las
+etapas, en el mismo orden que tenía la pila anterior:
+
+1. auth context: verifica el token una vez (`authenticate_scope`) y lo deja en el scope;
+2. auditoría: mide la request y la registra al terminar (`record_request_timing`);
+3. RequireAuth: 401 en prefijos protegidos sin token válido (salvo rutas públicas);
+4. interruptor remoto (`REMOTE_STATUS_URL`): 503 si la app está deshabilitada;
+5. correlation-id: `X-Request-ID` entrante o nuevo, en `request.state` y en la respuesta.
+
+Cada request alimenta además el histograma `http.request.duration.seconds` (ruta, método, status).
+
+Las listas de prefijos se compilan a una expresión regular al arrancar (`PrefixMatcher`).
+"""
+from __future__ import annotations
+
+import re
+import time
+import uuid
+from typing import Iterable, Optional, Tuple
+
+import httpx
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.audit.audit_logger import record_request_timing
+from app.config.settings import (
+    ROOT_PATH,
+    REMOTE_STATUS_URL,
+    REMOTE_STATUS_CACHE_TTL,
+    REMOTE_STATUS_FAIL_OPEN,
+)
+from app.core.auth.session_manager import AuthContext, authenticate_scope
+from app.utils.metrics import observe
+
+# Rutas que nunca exigen token
+PUBLIC_PREFIXES = (
+    "/healthz",
+    "/docs",
+    "/openapi",
+    "/redoc",
+    "/auth/login",
+    "/auth/register",
+    "/auth/refresh",
+    "/google_login/google/authorized",
+    "/auth/google/",
+    "/auth/forgot-password",
+    "/auth/reset-password",
+    "/auth/verify-reset-token",
+    "/whoami",
+)
+# Defaults: guard typical authenticated modules
+PROTECTED_PREFIXES = (
+    "/rpc",
+    "/auth/me",
+    "/auth/profile",
+)
+# Rutas que siguen disponibles aunque el interruptor remoto deshabilite la app
+APP_SWITCH_WHITELIST = (
+    "/",
+    "/healthz",
+    "/docs",
+    "/openapi",
+    "/redoc",
+    "/auth/login",
+    "/auth/register",
+    "/auth/refresh",
+    "/google_login/google/authorized",
+    "/auth/google/",
+)
+
+
+class PrefixMatcher:
+    """Coincidencia por prefijo de ruta con una sola regex precompilada.
+
+    Misma semántica que antes: `path == p` o `path` empieza por `p` + '/'. Un prefijo que
+    acaba en '/' coincide con todo lo que empiece por él; '/' sólo coincide exactamente.
+    """
+
+    def __init__(self, prefixes: Iterable[str]):
+        self.prefixes = tuple(prefixes)
+        alternatives = []
+        for p in self.prefixes:
+            if p == "/":
+                alternatives.append(r"/\Z")
+            elif p.endswith("/"):
+                alternatives.append(re.escape(p))
+            else:
+                alternatives.append(re.escape(p) + r"(?:/|\Z)")
+        self._regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def __call__(self, path: str) -> bool:
+        return self._regex is not None and self._regex.match(path) is not None
+
+
+class AppSwitch:
+    """Interruptor remoto (`REMOTE_STATUS_URL`): permite/bloquea temporalmente las rutas
+    no whitelisteadas sin reiniciar el backend. El estado se cachea `REMOTE_STATUS_CACHE_TTL` s.
+    """
+
+    def __init__(self, url: Optional[str] = REMOTE_STATUS_URL, whitelist: Iterable[str] = APP_SWITCH_WHITELIST):
+        self.url = url
+        self.whitelisted = PrefixMatcher(whitelist)
+        self._cached: Optional[Tuple[float, bool]] = None  # (exp, enabled)
+        self._timeout = httpx.Timeout(3.0, connect=2.0)
+
+    async def _fetch(self) -> bool:
+        try:
+            async with httpx.AsyncClient(timeout=self._timeout, follow_redirects=True) as client:
+                r = await client.get(self.url)
+                if r.status_code == 200:
+                    return bool(r.json().get("enabled", False))
+                return bool(REMOTE_STATUS_FAIL_OPEN)
+        except Exception:
+            return bool(REMOTE_STATUS_FAIL_OPEN)
+
+    async def allows(self, path: str) -> bool:
+        if not self.url or self.whitelisted(path):
+            return True
+        cached = self._cached
+        if cached is not None and time.time() < cached[0]:
+            return cached[1]
+        enabled = await self._fetch()
+        self._cached = (time.time() + max(1, REMOTE_STATUS_CACHE_TTL), enabled)
+        return enabled
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client_ip(scope: Scope) -> str:
+    # Respeta ProxyHeadersMiddleware: usa X-Forwarded-For si existe (el primero)
+    xff = _header(scope, b"x-forwarded-for")
+    if xff:
+        return xff.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "-"
+
+
+class RequestPipelineMiddleware:
+    """Middleware ASGI puro con las etapas de la request (ver docstring del módulo).
+
+    Los lifespan y websockets pasan directos. Las respuestas (incluidas las de streaming)
+    no se re-envuelven: sólo se observa `http.response.start` para el status y la cabecera.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        protected_prefixes: Iterable[str] | None = None,
+        public_prefixes: Iterable[str] | None = None,
+        request_id_header: str = "X-Request-ID",
+        app_switch: Optional[AppSwitch] = None,
+    ):
+        self.app = app
+        self.protected = PrefixMatcher(protected_prefixes or PROTECTED_PREFIXES)
+        self.public = PrefixMatcher(public_prefixes or PUBLIC_PREFIXES)
+        self.app_switch = app_switch or AppSwitch()
+        self.request_id_header = request_id_header
+        self._request_id_key = request_id_header.lower().encode("latin-1")
+        self._root_path = ROOT_PATH or ""
+
+    def _short_path(self, path: str) -> str:
+        # Support apps mounted with root_path by also checking without it
+        rp = self._root_path
+        if rp and path.startswith(rp):
+            return path[len(rp):] or "/"
+        return path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        # 1. Auth context (nunca rompe la request)
+        try:
+            ctx = authenticate_scope(scope)
+        except Exception:
+            ctx = AuthContext(None, None)
+        payload = ctx.payload
+
+        # 5. Correlation-ID (se fija antes para que también lo lleven los 401/503)
+        cid = _header(scope, self._request_id_key) or uuid.uuid4().hex
+        scope.setdefault("state", {})["correlation_id"] = cid
+
+        status = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).setdefault(self.request_id_header, cid)
+            await send(message)
+
+        path = scope["path"]
+        try:
+            short = self._short_path(path)
+            response = None
+            # 3. RequireAuth (sin consultar DB; el token ya está verificado)
+            if not self.public(short) and self.protected(short):
+                if not ctx.token:
+                    response = JSONResponse({"detail": "Falta token"}, status_code=401)
+                elif payload is None:
+                    response = JSONResponse({"detail": "Token inválido"}, status_code=401)
+            # 4. Interruptor remoto
+            if response is None and not await self.app_switch.allows(short):
+                response = JSONResponse(
+                    status_code=503,
+                    content={"error": "service_unavailable", "message": "Application temporarily disabled"},
+                )
+            if response is not None:
+                await response(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            # Plantilla de la ruta resuelta por el router (None si no hubo match)
+            route = getattr(scope.get("route"), "path", None)
+            observe(
+                "http.request.duration.seconds",
+                elapsed,
+                tags={"route": route or "-", "method": scope["method"], "status": status},
+            )
+            # 2. Auditoría privada de requests
+            query = scope.get("query_string", b"")
+            sub = payload.get("sub") if payload else None
+            record_request_timing(
+                method=scope["method"],
+                path=f"{path}?{query.decode('latin-1')}" if query else path,
+                status=status,
+                duration_ms=elapsed * 1000.0,
+                user_id=str(sub) if sub is not None else None,
+                ip=_client_ip(scope),
+                ua=_header(scope, b"user-agent") or "-",
+                route=route,
+            )
@@ -0,0 +1,55 @@
+#
+# script.py.mako
+#
+# Alembic migration script template
+#
+
+"""
+Revision ID: a3e9d2c7f5b1
+Revises: d8a2f5c1e3b7
+Create Date: 2026-10-19 14:00:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9d2c7f5b1'
+down_revision = 'd8a2f5c1e3b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'marine_request_rollup',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('route', sa.String(length=255), nullable=False),
+        sa.Column('worker', sa.String(length=64), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('client_error_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_ms', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('max_ms', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('p50_ms', sa.Float(), nullable=True),
+        sa.Column('p95_ms', sa.Float(), nullable=True),
+        sa.Column('p99_ms', sa.Float(), nullable=True),
+        sa.Column('histogram', sa.JSON(), nullable=False, server_default='{}'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bucket', 'method', 'route', 'worker', name='uq_marine_request_rollup_key'),
+    )
+    op.create_index('ix_marine_request_rollup_bucket', 'marine_request_rollup', ['bucket'])
+    op.create_index('ix_marine_request_rollup_route_bucket', 'marine_request_rollup', ['route', 'bucket'])
+    # Consultas de eventos recientes por acción (auditoría de login/logout)
+    op.create_index('ix_marine_audit_action_created_at', 'marine_audit', ['action', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_marine_audit_action_created_at', table_name='marine_audit')
+    op.drop_index('ix_marine_request_rollup_route_bucket', table_name='marine_request_rollup')
+    op.drop_index('ix_marine_request_rollup_bucket', table_name='marine_request_rollup')
+    op.drop_table('marine_request_rollup')
@@ -0,0 +1,48 @@
+#
+# script.py.mako
+#
+# Alembic migration script template
+#
+
+"""
+Revision ID: b7c41e2d9a10
+Revises: ed03fcda63ea
+Create Date: 2026-10-19 09:30:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c41e2d9a10'
+down_revision = 'ed03fcda63ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('marine_vessel', sa.Column('destination_port_number', sa.Integer(), nullable=True))
+    op.create_index(
+        op.f('ix_marine_vessel_destination_port_number'),
+        'marine_vessel',
+        ['destination_port_number'],
+        unique=False,
+    )
+    # Backfill inicial por UN/LOCODE exacto; la resolución completa (nombres, "A>B", etc.)
+    # la hacen el bridge al ingerir y /ports/sync.
+    op.execute(
+        """
+        UPDATE marine_vessel AS v
+        SET destination_port_number = p.port_number
+        FROM marine_port AS p
+        WHERE p.unlocode IS NOT NULL
+          AND p.port_number IS NOT NULL
+          AND upper(replace(v.ext_refs->>'destination', ' ', '')) = upper(replace(p.unlocode, ' ', ''))
+        """
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_marine_vessel_destination_port_number'), table_name='marine_vessel')
+    op.drop_column('marine_vessel', 'destination_port_number')
@@ -0,0 +1,48 @@
+#
+# script.py.mako
+#
+# Alembic migration script template
+#
+
+"""
+Revision ID: c41f0e7b2a93
+Revises: b7c41e2d9a10
+Create Date: 2026-10-19 11:00:00.000000+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f0e7b2a93'
+down_revision = 'b7c41e2d9a10'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, expresión) — ver app/services/search_service.py
+TRGM_INDEXES = [
+    ('ix_marine_vessel_name_trgm', 'marine_vessel', 'name gin_trgm_ops'),
+    ('ix_marine_port_name_trgm', 'marine_port', 'name gin_trgm_ops'),
+    ('ix_marine_port_alternate_name_trgm', 'marine_port', 'alternate_name gin_trgm_ops'),
+]
+BTREE_INDEXES = [
+    # Prefijos numéricos (LIKE 'q%') de MMSI/IMO y prefijos cortos de nombre
+    ('ix_marine_vessel_mmsi_prefix', 'marine_vessel', 'mmsi text_pattern_ops'),
+    ('ix_marine_vessel_imo_prefix', 'marine_vessel', 'imo text_pattern_ops'),
+    ('ix_marine_vessel_name_upper_prefix', 'marine_vessel', 'upper(name) text_pattern_ops'),
+    ('ix_marine_vessel_call_sign_upper', 'marine_vessel', "upper(ext_refs->>'call_sign')"),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, expr in TRGM_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({expr})')
+    for name, table, expr in BTREE_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({expr})')
+
+
+def downgrade():
+    for name, _, _ in TRGM_INDEXES + BTREE_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
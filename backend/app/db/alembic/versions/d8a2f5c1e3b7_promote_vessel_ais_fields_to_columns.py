@@ -0,0 +1,87 @@
+#
+# script.py.mako
+#
+# Alembic migration script template
+#
+
+"""
+Revision ID: d8a2f5c1e3b7
+Revises: c41f0e7b2a93
+Create Date: 2026-10-19 12:30:00.000000+00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2f5c1e3b7'
+down_revision = 'c41f0e7b2a93'
+branch_labels = None
+depends_on = None
+
+# Filas por lote del backfill; cada lote se confirma por separado (sin bloqueos largos)
+BACKFILL_BATCH = 5000
+
+# Valores que el bridge guarda como texto en ext_refs -> columnas tipadas
+BACKFILL_SQL = r"""
+    UPDATE marine_vessel
+    SET destination = NULLIF(NULLIF(btrim(ext_refs->>'destination'), ''), 'N/A'),
+        call_sign = NULLIF(NULLIF(btrim(ext_refs->>'call_sign'), ''), 'N/A'),
+        draught = CASE WHEN ext_refs->>'draught' ~ '^[0-9]+(\.[0-9]+)?$'
+                       THEN (ext_refs->>'draught')::double precision END,
+        eta = CASE WHEN ext_refs->>'eta' ~ '^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$'
+                   THEN ((ext_refs->>'eta')::timestamp AT TIME ZONE 'UTC') END,
+        ais_timestamp = CASE WHEN ext_refs->>'timestamp' ~ '^\d{4}-\d{2}-\d{2}T'
+                             THEN (ext_refs->>'timestamp')::timestamptz END
+    WHERE id > :lo AND id <= :hi AND ext_refs IS NOT NULL
+"""
+
+
+def upgrade():
+    op.add_column('marine_vessel', sa.Column('destination', sa.String(length=64), nullable=True))
+    op.add_column('marine_vessel', sa.Column('eta', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('marine_vessel', sa.Column('draught', sa.Float(), nullable=True))
+    op.add_column('marine_vessel', sa.Column('call_sign', sa.String(length=16), nullable=True))
+    op.add_column('marine_vessel', sa.Column('ais_timestamp', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill por rangos de id, confirmando cada lote (la tabla sigue disponible)
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM marine_vessel')).scalar()
+    with op.get_context().autocommit_block():
+        for lo in range(0, max_id, BACKFILL_BATCH):
+            bind.execute(sa.text(BACKFILL_SQL), {'lo': lo, 'hi': lo + BACKFILL_BATCH})
+
+        # Índices CONCURRENTLY (fuera de transacción): no bloquean los upserts del bridge AIS
+        op.create_index(
+            op.f('ix_marine_vessel_eta'), 'marine_vessel', ['eta'], unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            op.f('ix_marine_vessel_ais_timestamp'), 'marine_vessel', ['ais_timestamp'], unique=False,
+            postgresql_concurrently=True,
+        )
+        # Llegadas a un puerto ordenadas por ETA
+        op.create_index(
+            'ix_marine_vessel_destination_port_eta', 'marine_vessel', ['destination_port_number', 'eta'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_marine_vessel_destination_trgm '
+            'ON marine_vessel USING gin (destination gin_trgm_ops)'
+        )
+        # El índice de call sign pasa de la expresión sobre ext_refs a la columna
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_marine_vessel_call_sign_upper')
+        op.execute('CREATE INDEX CONCURRENTLY ix_marine_vessel_call_sign_upper ON marine_vessel (upper(call_sign))')
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_marine_vessel_call_sign_upper')
+    op.execute("CREATE INDEX ix_marine_vessel_call_sign_upper ON marine_vessel (upper(ext_refs->>'call_sign'))")
+    op.execute('DROP INDEX IF EXISTS ix_marine_vessel_destination_trgm')
+    op.drop_index('ix_marine_vessel_destination_port_eta', table_name='marine_vessel')
+    op.drop_index(op.f('ix_marine_vessel_ais_timestamp'), table_name='marine_vessel')
+    op.drop_index(op.f('ix_marine_vessel_eta'), table_name='marine_vessel')
+    op.drop_column('marine_vessel', 'ais_timestamp')
+    op.drop_column('marine_vessel', 'call_sign')
+    op.drop_column('marine_vessel', 'draught')
+    op.drop_column('marine_vessel', 'eta')
+    op.drop_column('marine_vessel', 'destination')
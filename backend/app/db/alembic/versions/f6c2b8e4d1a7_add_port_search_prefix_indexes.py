@@ -0,0 +1,37 @@
+#
+# script.py.mako
+#
+# Alembic migration script template
+#
+
+"""
+Revision ID: f6c2b8e4d1a7
+Revises: a3e9d2c7f5b1
+Create Date: 2026-10-19 16:00:00.000000+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c2b8e4d1a7'
+down_revision = 'a3e9d2c7f5b1'
+branch_labels = None
+depends_on = None
+
+
+# Prefijos (upper(col) LIKE 'Q%') de la búsqueda de puertos — ver app/services/search_service.py
+BTREE_INDEXES = [
+    ('ix_marine_port_unlocode_upper_prefix', 'marine_port', 'upper(unlocode) text_pattern_ops'),
+    ('ix_marine_port_name_upper_prefix', 'marine_port', 'upper(name) text_pattern_ops'),
+]
+
+
+def upgrade():
+    for name, table, expr in BTREE_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({expr})')
+
+
+def downgrade():
+    for name, _, _ in BTREE_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
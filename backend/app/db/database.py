@@ -2,10 +2,12 @@ import logging
 
 from sqlalchemy import create_engine, event, text, MetaData
 from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.config.settings import (
     POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD,
-    POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW
+    POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW,
+    POSTGRES_ASYNC_POOL_SIZE, POSTGRES_ASYNC_MAX_OVERFLOW,
 )
 
 NAMING_CONVENTION = {
@@ -45,11 +47,23 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
 
+# Engine async (psycopg 3 en modo async, mismo DSN) para handlers `async def`: las consultas
+# se esperan en el event loop en vez de bloquearlo (ni ocupar un hilo del threadpool).
+async_engine = create_async_engine(
+    _url,
+    pool_size=POSTGRES_ASYNC_POOL_SIZE,
+    max_overflow=POSTGRES_ASYNC_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 logger = logging.getLogger(__name__)
 DB_INIT_LOCK_ID = 926114673215
 
 
 @event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
 def _set_time_zone(dbapi_connection, connection_record):  # noqa: ANN001
     """Ensure DB sessions operate in UTC when permissions allow."""
     try:
@@ -71,6 +85,16 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """Sesión async para rutas `async def` (no bloquea el event loop)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    await async_engine.dispose()
+
 # Simple init helper
 def init_db():
     from app.db import models  # noqa: F401 ensure models imported
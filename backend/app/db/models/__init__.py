@@ -32,6 +32,7 @@ from .marine_watchlist import MarineWatchlist
 from .marine_alert import MarineAlert
 from .marine_provider_contract import MarineProviderContract
 from .marine_audit import MarineAudit
+from .marine_request_rollup import MarineRequestRollup
 
 __all__ = [
     "User",
@@ -65,4 +66,5 @@ __all__ = [
     "MarineAlert",
     "MarineProviderContract",
     "MarineAudit",
+    "MarineRequestRollup",
 ]
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, String, UniqueConstraint, func
+from sqlalchemy.types import JSON
+
+from app.db.database import Base
+
+
+class MarineRequestRollup(Base):
+    """Agregado por minuto, ruta y worker de las requests (ver `app/audit/audit_writer.py`)."""
+
+    __tablename__ = "marine_request_rollup"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True)
+    method = Column(String(10), nullable=False)
+    # Plantilla de la ruta (`/details/{query}`), no la URL concreta
+    route = Column(String(255), nullable=False)
+    worker = Column(String(64), nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)  # 5xx o sin respuesta
+    client_error_count = Column(Integer, nullable=False, default=0)  # 4xx
+    total_ms = Column(Float, nullable=False, default=0.0)
+    max_ms = Column(Float, nullable=False, default=0.0)
+    p50_ms = Column(Float)
+    p95_ms = Column(Float)
+    p99_ms = Column(Float)
+    # {índice de bucket: count} sobre `LATENCY_BOUNDS_MS`; permite combinar workers/minutos
+    histogram = Column(JSON, nullable=False, default=dict)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "method", "route", "worker", name="uq_marine_request_rollup_key"),
+    )
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, func, ForeignKey, Index
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import relationship, validates
 
 from app.db.database import Base
+from app.services.country_index import mid_from_mmsi
 
 
 class MarineVessel(Base):
@@ -19,8 +20,21 @@ class MarineVessel(Base):
     length = Column(Integer, nullable=True)
     width = Column(Integer, nullable=True)
     ext_refs = Column(postgresql.JSONB, nullable=True)
+    # Destino AIS resuelto a marine_port.port_number (ver app/services/destination_resolver.py)
+    destination_port_number = Column(Integer, nullable=True, index=True)
+    # Campos AIS consultados con frecuencia (copia tipada de ext_refs, ver _upsert_vessels_to_db)
+    destination = Column(String(64), nullable=True)
+    eta = Column(DateTime(timezone=True), nullable=True, index=True)
+    draught = Column(Float, nullable=True)
+    call_sign = Column(String(16), nullable=True)
+    ais_timestamp = Column(DateTime(timezone=True), nullable=True, index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __table_args__ = (
+        # Llegadas a un puerto ordenadas por ETA
+        Index("ix_marine_vessel_destination_port_eta", "destination_port_number", "eta"),
+    )
+
     # Relationships
     country = relationship("MarineCountry", foreign_keys=[flag])
     watchlist_items = relationship("MarineWatchlist", back_populates="vessel")
@@ -31,27 +45,8 @@ class MarineVessel(Base):
         if not value or not isinstance(value, str):
             return value
 
-        mid = None
-        # Robust parsing based on ITU MMSI structure
-        if value.startswith("111"):  # SAR Aircraft
-            if len(value) >= 6:
-                mid = value[3:6]
-        elif value.startswith("00"):  # Coast Stations
-            if len(value) >= 5:
-                mid = value[2:5]
-        elif value.startswith("0"):  # Group MMSI
-            if len(value) >= 4:
-                mid = value[1:4]
-        elif value.startswith("99") or value.startswith("98"):  # AtoN or craft associated with parent
-            if len(value) >= 5:
-                mid = value[2:5]
-        elif len(value) >= 3:  # Standard Vessel
-            mid = value[:3]
-
-        if mid:
-            try:
-                self.flag = int(mid)
-            except (ValueError, TypeError):
-                pass
+        mid = mid_from_mmsi(value)
+        if mid is not None:
+            self.flag = mid
         return value
 
@@ -0,0 +1,300 @@
+"""
+Enrutado de lecturas a réplicas de Postgres (opcional, `POSTGRES_REPLICA_URLS`).
+
+Las rutas de sólo lectura piden la sesión con `get_read_db` / `get_async_read_db`; el
+resto sigue con `get_db` / `get_async_db` (primario). Una lectura va a una réplica sólo si:
+
+- hay réplicas configuradas y alguna está sana: su retraso de replicación, medido cada
+  `POSTGRES_REPLICA_CHECK_SECONDS` por un hilo en segundo plano (`start_replica_monitor`),
+  no supera `POSTGRES_REPLICA_MAX_LAG_SECONDS`. Las requests nunca esperan a una medición:
+  usan el último conjunto sano conocido;
+- el usuario no ha hecho una escritura marcada con `mark_write` en los últimos
+  `POSTGRES_READ_YOUR_WRITES_SECONDS` (read-your-writes; la marca se comparte entre workers
+  por el caché).
+
+Si no, la sesión es del primario. Cada target (primary, replica-N) cuenta checkouts y
+conexiones en `app.utils.metrics` y `pool_status()` da el estado de sus pools.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app.config.settings import (
+    POSTGRES_REPLICA_URLS,
+    POSTGRES_REPLICA_POOL_SIZE,
+    POSTGRES_REPLICA_MAX_OVERFLOW,
+    POSTGRES_REPLICA_MAX_LAG_SECONDS,
+    POSTGRES_REPLICA_CHECK_SECONDS,
+    POSTGRES_READ_YOUR_WRITES_SECONDS,
+)
+from app.db.database import AsyncSessionLocal, SessionLocal, _set_time_zone, async_engine, engine
+from app.utils.adapters.cache_adapter import get_cache, set_cache
+from app.utils.metrics import increment, register_gauge
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "primary"
+RECENT_WRITE_KEY = "db:recent_write:{sub}"
+
+# 0 si la réplica ya aplicó todo lo recibido (un primario inactivo no cuenta como retraso)
+_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def _instrument(target: str, sync_engine) -> None:
+    """Contadores de pool por target (checkouts y conexiones nuevas) y gauges de ocupación."""
+    tags = {"target": target}
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):  # noqa: ANN001
+        increment("db.pool.checkout", tags=tags)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):  # noqa: ANN001
+        increment("db.pool.connect", tags=tags)
+
+    # Ocupación del pool en `/metrics` (se lee al exportar)
+    pool = sync_engine.pool
+    if callable(getattr(pool, "checkedout", None)):
+        register_gauge("db.pool.checked_out", pool.checkedout, tags=tags)
+    if callable(getattr(pool, "size", None)):
+        register_gauge("db.pool.size", pool.size, tags=tags)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        url_obj = make_url(url).set(drivername="postgresql+psycopg")
+        kwargs = dict(
+            pool_size=POSTGRES_REPLICA_POOL_SIZE,
+            max_overflow=POSTGRES_REPLICA_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            # Una réplica caída no debe colgar las lecturas: se salta tras el timeout
+            connect_args={"connect_timeout": 3},
+        )
+        self.engine = create_engine(url_obj, **kwargs)
+        self.async_engine = create_async_engine(url_obj, **kwargs)
+        for sync_engine in (self.engine, self.async_engine.sync_engine):
+            event.listen(sync_engine, "connect", _set_time_zone)
+        _instrument(name, self.engine)
+        _instrument(f"{name}-async", self.async_engine.sync_engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.AsyncSession = async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+        self.lag: Optional[float] = None  # None = desconocido o no responde
+
+    def probe(self) -> Optional[float]:
+        try:
+            with self.engine.connect() as conn:
+                self.lag = float(conn.execute(_LAG_SQL).scalar() or 0.0)
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Read replica {self.name} unavailable: {e}")
+            self.lag = None
+        return self.lag
+
+
+class ReadRouter:
+    def __init__(self, urls: List[str], max_lag: float, check_interval: float, ryw_seconds: int):
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.ryw_seconds = ryw_seconds
+        self._healthy: List[Replica] = []
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rr = itertools.count()
+        # Marcas read-your-writes de este worker (evitan ir al caché compartido en el mismo proceso)
+        self._recent_writes: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() - self._checked_at < self.check_interval
+
+    @property
+    def monitoring(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _probe_all(self) -> None:
+        # Cada sonda puede tardar hasta connect_timeout: sólo desde el monitor o con el lock libre
+        healthy = []
+        for replica in self.replicas:
+            lag = replica.probe()
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(replica)
+            else:
+                increment("db.replica.skipped", tags={"target": replica.name})
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+
+    def refresh(self, blocking: bool = False) -> None:
+        """Mide el retraso si el dato caducó. Sin `blocking`, si otro hilo ya está midiendo
+        vuelve enseguida y se sigue usando el último `_healthy`."""
+        if self.fresh:
+            return
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            if not self.fresh:
+                self._probe_all()
+        finally:
+            self._lock.release()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self._lock:
+                    self._probe_all()
+            except Exception as e:
+                logger.warning(f"Replica lag check failed: {e}")
+            self._stop.wait(self.check_interval)
+
+    def start(self) -> None:
+        if not self.enabled or self.monitoring:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=5)
+        self._thread = None
+
+    def pick(self) -> Optional[Replica]:
+        healthy = self._healthy
+        if not healthy:
+            return None
+        return healthy[next(self._rr) % len(healthy)]
+
+    # --- read-your-writes ---
+
+    def mark_write(self, sub) -> None:
+        if not self.enabled or sub is None:
+            return
+        sub = str(sub)
+        self._recent_writes[sub] = time.monotonic() + self.ryw_seconds
+        set_cache(RECENT_WRITE_KEY.format(sub=sub), 1, self.ryw_seconds)
+
+    def wrote_recently(self, sub) -> bool:
+        if sub is None:
+            return False
+        sub = str(sub)
+        until = self._recent_writes.get(sub)
+        if until is not None:
+            if until > time.monotonic():
+                return True
+            self._recent_writes.pop(sub, None)
+        return get_cache(RECENT_WRITE_KEY.format(sub=sub)) is not None
+
+    def target_for(self, sub) -> Optional[Replica]:
+        """Réplica para la lectura, o None si debe ir al primario."""
+        if not self.enabled:
+            return None
+        if not self.monitoring:
+            # Sin monitor (scripts, tests): medición en línea, nunca esperando a otro hilo
+            self.refresh()
+        if self.wrote_recently(sub):
+            increment("db.read_route", tags={"target": PRIMARY, "reason": "read_your_writes"})
+            return None
+        replica = self.pick()
+        increment("db.read_route", tags={
+            "target": replica.name if replica else PRIMARY,
+            "reason": "replica" if replica else "no_healthy_replica",
+        })
+        return replica
+
+    def pool_status(self) -> Dict[str, dict]:
+        targets = {PRIMARY: engine, f"{PRIMARY}-async": async_engine.sync_engine}
+        for replica in self.replicas:
+            targets[replica.name] = replica.engine
+            targets[f"{replica.name}-async"] = replica.async_engine.sync_engine
+        out = {}
+        for name, sync_engine in targets.items():
+            pool = sync_engine.pool
+            stats = {}
+            for attr in ("size", "checkedin", "checkedout", "overflow"):
+                fn: Optional[Callable[[], int]] = getattr(pool, attr, None)
+                if callable(fn):
+                    stats[attr] = fn()
+            out[name] = stats
+        for replica in self.replicas:
+            out[replica.name]["lag_seconds"] = replica.lag
+            out[replica.name]["healthy"] = replica in self._healthy
+        return out
+
+
+read_router = ReadRouter(
+    POSTGRES_REPLICA_URLS,
+    max_lag=POSTGRES_REPLICA_MAX_LAG_SECONDS,
+    check_interval=POSTGRES_REPLICA_CHECK_SECONDS,
+    ryw_seconds=POSTGRES_READ_YOUR_WRITES_SECONDS,
+)
+_instrument(PRIMARY, engine)
+_instrument(f"{PRIMARY}-async", async_engine.sync_engine)
+
+
+def _request_sub(request: Optional[Request]):
+    return getattr(request.state, "sub", None) if request is not None else None
+
+
+def mark_write(request: Optional[Request] = None, sub=None) -> None:
+    """Marca una escritura del usuario: sus lecturas irán al primario durante un rato."""
+    read_router.mark_write(sub if sub is not None else _request_sub(request))
+
+
+def pool_status() -> Dict[str, dict]:
+    return read_router.pool_status()
+
+
+def get_read_db(request: Request):
+    """Como `get_db`, pero en una réplica sana cuando la hay (rutas de sólo lectura)."""
+    replica = read_router.target_for(_request_sub(request))
+    db = replica.Session() if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    """Como `get_async_db`, pero en una réplica sana cuando la hay."""
+    replica = None
+    if read_router.enabled:
+        # Chequeo de retraso y marca compartida son síncronos: fuera del event loop
+        replica = await asyncio.to_thread(read_router.target_for, _request_sub(request))
+    factory = replica.AsyncSession if replica else AsyncSessionLocal
+    async with factory() as db:
+        yield db
+
+
+def start_replica_monitor() -> None:
+    read_router.start()
+
+
+async def dispose_replica_engines() -> None:
+    await asyncio.to_thread(read_router.stop)
+    for replica in read_router.replicas:
+        await replica.async_engine.dispose()
+        replica.engine.dispose()
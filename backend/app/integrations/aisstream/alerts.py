@@ -0,0 +1,277 @@
+# alerts.py
+"""
+Motor de alertas geofence/puerto sobre el stream AIS.
+
+Las alertas activas (`marine_alert`) se cargan en un STRtree de geometrías Shapely 2
+preparadas: polígonos para `geofence` y círculos geodésicos alrededor del puerto para
+`port`. Cada frame de posiciones se evalúa de una vez: `STRtree.query` devuelve los pares
+(punto, alerta) candidatos por bbox y `shapely.intersects` (vectorizado, con la geometría
+preparada) confirma cuáles están dentro. El coste depende de los aciertos, no del número
+de alertas.
+
+`params_json` admitido:
+- geofence: `{"geojson": {...}}` (Polygon/MultiPolygon), `{"polygon": [[lon, lat], ...]}`
+  o `{"bbox": [west, south, east, north]}`
+- port: `{"port_number": N, "radius_km": 10}` o `{"lat": .., "lon": .., "radius_km": ..}`
+- opcionales: `"mmsi": [...]` para limitar a ciertos barcos, `"events": ["enter", "exit"]`
+"""
+from __future__ import annotations
+
+import logging
+import math
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, box, shape
+from sqlalchemy import DateTime, Integer, column, select, update, values
+from sqlalchemy.orm import Session
+
+from app.db import models as m
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_PORT_RADIUS_KM = 10.0
+CIRCLE_SEGMENTS = 64
+
+
+def geodesic_circle(lat: float, lon: float, radius_km: float, segments: int = CIRCLE_SEGMENTS) -> Polygon:
+    """Polígono (lon/lat) que aproxima el círculo de `radius_km` sobre la esfera."""
+    p1 = math.radians(lat)
+    l1 = math.radians(lon)
+    d = radius_km / EARTH_RADIUS_KM
+    coords = []
+    for i in range(segments):
+        brg = 2 * math.pi * i / segments
+        p2 = math.asin(math.sin(p1) * math.cos(d) + math.cos(p1) * math.sin(d) * math.cos(brg))
+        l2 = l1 + math.atan2(math.sin(brg) * math.sin(d) * math.cos(p1), math.cos(d) - math.sin(p1) * math.sin(p2))
+        coords.append((math.degrees(l2), math.degrees(p2)))
+    return Polygon(coords)
+
+
+def _geofence_geometry(params: dict):
+    if params.get("geojson"):
+        geom = shape(params["geojson"])
+    elif params.get("polygon"):
+        geom = Polygon([(float(x), float(y)) for x, y in params["polygon"]])
+    elif params.get("bbox"):
+        west, south, east, north = (float(v) for v in params["bbox"])
+        geom = box(west, south, east, north)
+    else:
+        return None
+    if not geom.is_valid:
+        geom = shapely.make_valid(geom)
+    return None if geom.is_empty else geom
+
+
+class AlertRule:
+    __slots__ = ("alert_id", "user_id", "type", "geometry", "mmsis", "events")
+
+    def __init__(self, alert_id: int, user_id: Optional[int], type_: str, geometry, mmsis, events):
+        self.alert_id = alert_id
+        self.user_id = user_id
+        self.type = type_
+        self.geometry = geometry
+        self.mmsis: Optional[Set[str]] = mmsis
+        self.events: Set[str] = events
+
+
+def load_alert_rules(db: Session) -> List[AlertRule]:
+    """Alertas activas con su usuario de la app (res_user -> user por email)."""
+    rows = db.execute(
+        select(m.MarineAlert.id, m.MarineAlert.type, m.MarineAlert.params_json, m.User.id)
+        .join(m.ResUser, m.ResUser.id == m.MarineAlert.user_id)
+        .outerjoin(m.User, m.User.email == m.ResUser.email)
+        .where(m.MarineAlert.active.is_(True), m.MarineAlert.type.in_(("geofence", "port")))
+    ).all()
+
+    port_numbers = set()
+    for _, type_, params, _ in rows:
+        if type_ == "port" and isinstance(params, dict) and params.get("port_number") is not None:
+            try:
+                port_numbers.add(int(params["port_number"]))
+            except (TypeError, ValueError):
+                pass
+    port_coords: Dict[int, Tuple[float, float]] = {}
+    if port_numbers:
+        for number, lat, lon in db.execute(
+            select(m.MarinePort.port_number, m.MarinePort.ycoord, m.MarinePort.xcoord)
+            .where(m.MarinePort.port_number.in_(port_numbers))
+        ):
+            if lat is not None and lon is not None:
+                port_coords[number] = (lat, lon)
+
+    rules: List[AlertRule] = []
+    for alert_id, type_, params, user_id in rows:
+        params = params if isinstance(params, dict) else {}
+        try:
+            if type_ == "geofence":
+                geom = _geofence_geometry(params)
+            else:
+                if params.get("port_number") is not None:
+                    latlon = port_coords.get(int(params["port_number"]))
+                else:
+                    latlon = (float(params["lat"]), float(params["lon"])) if "lat" in params and "lon" in params else None
+                radius = float(params.get("radius_km") or DEFAULT_PORT_RADIUS_KM)
+                geom = geodesic_circle(latlon[0], latlon[1], radius) if latlon else None
+        except (TypeError, ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"Alert {alert_id}: invalid params_json ({e})")
+            continue
+        if geom is None:
+            continue
+        mmsis = {str(x) for x in params["mmsi"]} if params.get("mmsi") else None
+        events = set(params.get("events") or ("enter", "exit"))
+        rules.append(AlertRule(alert_id, user_id, type_, geom, mmsis, events))
+    return rules
+
+
+class AlertEngine:
+    """Estado dentro/fuera por (alerta, barco) con confirmación y cooldown por evento.
+
+    `evaluate` corre en un hilo (`asyncio.to_thread`): es el único que toca el estado.
+    `forget` sólo encola el MMSI y la poda de cooldowns ocurre dentro de `evaluate`.
+    """
+
+    def __init__(self, confirm_reports: int = 2, cooldown_seconds: float = 300.0):
+        self.confirm_reports = max(1, int(confirm_reports))
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.rules: List[AlertRule] = []
+        self._tree: Optional[shapely.STRtree] = None
+        self._geoms = np.empty(0, dtype=object)
+        # Estado confirmado: mmsi -> índices de reglas en las que está dentro
+        self._inside: Dict[str, Set[int]] = {}
+        # Observaciones consecutivas que contradicen el estado confirmado: mmsi -> {regla: n}
+        self._streak: Dict[str, Dict[int, int]] = {}
+        # Último disparo por (alert_id, mmsi, evento) para el cooldown
+        self._last_fired: Dict[Tuple[int, str, str], float] = {}
+        self._pruned_at = 0.0
+        # Barcos expulsados pendientes de olvidar (deque: append/popleft seguros entre hilos)
+        self._forget_queue: deque = deque()
+
+    def load(self, rules: Sequence[AlertRule]) -> None:
+        old_ids = [r.alert_id for r in self.rules]
+        self.rules = list(rules)
+        new_index = {r.alert_id: i for i, r in enumerate(self.rules)}
+        geoms = np.array([r.geometry for r in self.rules], dtype=object)
+        shapely.prepare(geoms)
+        self._geoms = geoms
+        self._tree = shapely.STRtree(geoms) if len(geoms) else None
+        # Conservar el estado de alertas que siguen activas (los índices pueden cambiar)
+        remap = {old_idx: new_index[oid] for old_idx, oid in enumerate(old_ids) if oid in new_index}
+        self._inside = {
+            mmsi: {remap[i] for i in idxs if i in remap} for mmsi, idxs in self._inside.items()
+        }
+        self._inside = {k: v for k, v in self._inside.items() if v}
+        self._streak = {}
+
+    def evaluate(self, updates: Iterable[dict], now: Optional[float] = None) -> List[dict]:
+        """Evalúa un frame de posiciones `{id, lat, lon}` y devuelve los eventos enter/exit."""
+        self._apply_forgets()
+        if self._tree is None:
+            return []
+        updates = list(updates)
+        if not updates:
+            return []
+        now = datetime.now(timezone.utc).timestamp() if now is None else now
+        if now - self._pruned_at >= self.cooldown_seconds:
+            self._prune_cooldowns(now)
+        coords = np.array([(u["lon"], u["lat"]) for u in updates], dtype=float)
+        points = shapely.points(coords)
+        pt_idx, geom_idx = self._tree.query(points)
+        if len(pt_idx):
+            hit = shapely.intersects(self._geoms[geom_idx], points[pt_idx])
+            pt_idx, geom_idx = pt_idx[hit], geom_idx[hit]
+
+        inside_now: Dict[int, Set[int]] = {}
+        for p, g in zip(pt_idx.tolist(), geom_idx.tolist()):
+            inside_now.setdefault(p, set()).add(g)
+
+        events: List[dict] = []
+        for i, u in enumerate(updates):
+            mmsi = u["id"]
+            new = inside_now.get(i, set())
+            old = self._inside.get(mmsi, set())
+            streak = self._streak.get(mmsi)
+            changed = new ^ old
+            if not changed:
+                if streak:
+                    del self._streak[mmsi]
+                continue
+            if streak is None:
+                streak = self._streak[mmsi] = {}
+            for g in list(streak):
+                if g not in changed:
+                    del streak[g]
+            for g in changed:
+                rule = self.rules[g]
+                if rule.mmsis is not None and mmsi not in rule.mmsis:
+                    continue
+                count = streak.get(g, 0) + 1
+                if count < self.confirm_reports:
+                    streak[g] = count
+                    continue
+                streak.pop(g, None)
+                entering = g in new
+                if entering:
+                    old.add(g)
+                else:
+                    old.discard(g)
+                event = "enter" if entering else "exit"
+                if event not in rule.events:
+                    continue
+                key = (rule.alert_id, mmsi, event)
+                last = self._last_fired.get(key)
+                if last is not None and now - last < self.cooldown_seconds:
+                    continue
+                self._last_fired[key] = now
+                events.append({
+                    "alert_id": rule.alert_id,
+                    "user_id": rule.user_id,
+                    "type": rule.type,
+                    "event": event,
+                    "mmsi": mmsi,
+                    "lat": u["lat"],
+                    "lon": u["lon"],
+                    "ts": now,
+                })
+            if old:
+                self._inside[mmsi] = old
+            else:
+                self._inside.pop(mmsi, None)
+            if not streak:
+                self._streak.pop(mmsi, None)
+        return events
+
+    def forget(self, mmsi: str) -> None:
+        """Olvida el estado de un barco expulsado por inactividad (en la próxima evaluación)."""
+        self._forget_queue.append(mmsi)
+
+    def _apply_forgets(self) -> None:
+        while self._forget_queue:
+            mmsi = self._forget_queue.popleft()
+            self._inside.pop(mmsi, None)
+            self._streak.pop(mmsi, None)
+
+    def _prune_cooldowns(self, now: float) -> None:
+        cutoff = now - self.cooldown_seconds
+        self._last_fired = {k: v for k, v in self._last_fired.items() if v >= cutoff}
+        self._pruned_at = now
+
+
+def write_last_triggered(db: Session, triggered: Dict[int, float]) -> int:
+    """UPDATE ... FROM (VALUES ...) único para `last_triggered` de todas las alertas disparadas."""
+    if not triggered:
+        return 0
+    rows = values(
+        column("id", Integer), column("ts", DateTime(timezone=True)), name="v"
+    ).data([(alert_id, datetime.fromtimestamp(ts, tz=timezone.utc)) for alert_id, ts in triggered.items()])
+    result = db.execute(
+        update(m.MarineAlert)
+        .where(m.MarineAlert.id == rows.c.id)
+        .values(last_triggered=rows.c.ts)
+    )
+    db.commit()
+    return result.rowcount or 0
@@ -0,0 +1,166 @@
+# demand.py
+"""
+Suscripción dinámica a AISStream según la demanda real.
+
+Los viewports de los clientes (Socket.IO `ais_viewport`, consultas REST con bbox) y las
+áreas de demanda (p. ej. watchlists) se combinan con una región base fija en un conjunto
+pequeño de bounding boxes: se ajustan a una rejilla, se fusionan y se limita su número.
+La histéresis evita renegociar la suscripción con cada pequeño movimiento del mapa:
+ampliar es inmediato, reducir sólo ocurre si el área cae claramente y de forma sostenida.
+
+Cajas internas: (south, west, north, east) en grados. Formato AISStream: [[[lat, lon], [lat, lon]], ...].
+"""
+from __future__ import annotations
+
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Box = Tuple[float, float, float, float]
+
+# Suscripción "vacía": AISStream exige al menos una caja; un punto en (0, 0) no recibe tráfico
+IDLE_BOXES = [[[0.0, 0.0], [0.0, 0.0]]]
+
+
+def normalize_boxes(raw) -> List[Box]:
+    """Acepta una caja [[lat1, lon1], [lat2, lon2]] o una lista de ellas (formato AISStream)."""
+    if not raw:
+        return []
+    if len(raw) == 2 and all(isinstance(p, (list, tuple)) and len(p) == 2 and not isinstance(p[0], (list, tuple)) for p in raw):
+        raw = [raw]
+    boxes: List[Box] = []
+    for item in raw:
+        try:
+            (lat1, lon1), (lat2, lon2) = item
+            boxes.append((min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)))
+        except (TypeError, ValueError):
+            continue
+    return boxes
+
+
+def viewport_to_boxes(west: float, south: float, east: float, north: float) -> List[Box]:
+    """Viewport del mapa (lon/lat) a cajas; si cruza el antimeridiano se parte en dos."""
+    south, north = max(-90.0, min(south, north)), min(90.0, max(south, north))
+    if west <= east:
+        return [(south, max(-180.0, west), north, min(180.0, east))]
+    return [(south, max(-180.0, west), north, 180.0), (south, -180.0, north, min(180.0, east))]
+
+
+def snap_box(box: Box, grid_deg: float) -> Box:
+    """Expande la caja hacia fuera hasta la rejilla de `grid_deg` grados."""
+    if grid_deg <= 0:
+        return box
+    s, w, n, e = box
+    return (
+        max(-90.0, math.floor(s / grid_deg) * grid_deg),
+        max(-180.0, math.floor(w / grid_deg) * grid_deg),
+        min(90.0, math.ceil(n / grid_deg) * grid_deg),
+        min(180.0, math.ceil(e / grid_deg) * grid_deg),
+    )
+
+
+def box_area(box: Box) -> float:
+    s, w, n, e = box
+    return max(0.0, n - s) * max(0.0, e - w)
+
+
+def _union(a: Box, b: Box) -> Box:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _touches(a: Box, b: Box) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def contains(outer: Box, inner: Box) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def merge_boxes(boxes: Iterable[Box], max_boxes: int = 8) -> List[Box]:
+    """Fusiona cajas que se tocan y, si quedan más de `max_boxes`, las de menor coste en área."""
+    merged: List[Box] = []
+    for box in boxes:
+        merged.append(box)
+        # Absorber transitivamente todo lo que toque a la caja nueva
+        changed = True
+        while changed:
+            changed = False
+            current = merged[-1]
+            for i in range(len(merged) - 1):
+                if _touches(current, merged[i]):
+                    merged[-1] = _union(current, merged.pop(i))
+                    changed = True
+                    break
+    while len(merged) > max(1, max_boxes):
+        best: Optional[Tuple[float, int, int]] = None
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                cost = box_area(_union(merged[i], merged[j])) - box_area(merged[i]) - box_area(merged[j])
+                if best is None or cost < best[0]:
+                    best = (cost, i, j)
+        _, i, j = best
+        union = _union(merged[i], merged[j])
+        merged = [b for k, b in enumerate(merged) if k not in (i, j)]
+        merged = merge_boxes(merged + [union], max_boxes)
+    return sorted(merged)
+
+
+def to_aisstream(boxes: Sequence[Box]) -> list:
+    if not boxes:
+        return [list(map(list, b)) for b in IDLE_BOXES]
+    return [[[s, w], [n, e]] for s, w, n, e in boxes]
+
+
+class DemandTracker:
+    """Calcula la suscripción a partir de la región base y las áreas de demanda vigentes."""
+
+    def __init__(
+        self,
+        base_boxes: Optional[Sequence[Box]] = None,
+        grid_deg: float = 5.0,
+        max_boxes: int = 8,
+        shrink_ratio: float = 1.5,
+        shrink_delay: float = 60.0,
+    ):
+        self.base_boxes = [snap_box(b, grid_deg) for b in (base_boxes or [])]
+        self.grid_deg = grid_deg
+        self.max_boxes = max_boxes
+        self.shrink_ratio = shrink_ratio
+        self.shrink_delay = shrink_delay
+        self.current: Optional[List[Box]] = None
+        self._shrink_since: Optional[float] = None
+
+    def candidate(self, areas: Iterable[Box]) -> List[Box]:
+        snapped = [snap_box(b, self.grid_deg) for b in areas]
+        return merge_boxes(self.base_boxes + snapped, self.max_boxes)
+
+    def decide(self, areas: Iterable[Box], now: Optional[float] = None) -> Optional[List[Box]]:
+        """Devuelve la nueva suscripción si hay que renegociar, o None si se mantiene la actual."""
+        now = time.monotonic() if now is None else now
+        candidate = self.candidate(areas)
+        current = self.current
+        if current is None:
+            return self._apply(candidate)
+        if candidate == current:
+            self._shrink_since = None
+            return None
+        covered = all(any(contains(c, b) for c in current) for b in candidate)
+        if not covered:
+            # Ampliar: inmediato, nadie debe quedarse sin datos
+            return self._apply(candidate)
+        current_area = sum(box_area(b) for b in current)
+        candidate_area = sum(box_area(b) for b in candidate)
+        if current_area <= candidate_area * self.shrink_ratio:
+            self._shrink_since = None
+            return None
+        if self._shrink_since is None:
+            self._shrink_since = now
+            return None
+        if now - self._shrink_since < self.shrink_delay:
+            return None
+        return self._apply(candidate)
+
+    def _apply(self, boxes: List[Box]) -> List[Box]:
+        self.current = boxes
+        self._shrink_since = None
+        return boxes
@@ -0,0 +1,119 @@
+# details.py
+"""
+Documentos de detalle de barco listos para servir (`GET /details/{query}`).
+
+El bridge mantiene por MMSI un dict con la forma de `VesselData`: datos estáticos AIS,
+nombre del país de bandera (`country_index`) y dimensiones. Se reconstruye cuando llega un
+ShipStaticData (o cambia la tabla de países) y se publica en el hash Redis `ais:details`
+junto con el resto del frame. La posición no forma parte del documento: ya está en
+`ais:positions` y se añade al leerlo (`with_position`), así una posición nueva no reescribe
+el documento entero. El endpoint hace una única búsqueda por clave y nunca espera al stream.
+
+Los barcos que sólo han enviado posiciones (sin ShipStaticData) no tienen documento:
+`/details` usa para ellos la base de datos, con la posición en vivo.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+
+def parse_timestamp(ts_val) -> str:
+    """
+    Intenta parsear un timestamp en varios formatos y devolver ISO 8601 string.
+    Si falla o es nulo, devuelve la fecha actual en UTC.
+    """
+    if not ts_val:
+        return datetime.now(timezone.utc).isoformat()
+
+    if isinstance(ts_val, datetime):
+        return ts_val.isoformat()
+
+    ts_str = str(ts_val).strip()
+    if not ts_str:
+        return datetime.now(timezone.utc).isoformat()
+
+    # Intentar formatos comunes
+    formats = [
+        "%Y-%m-%dT%H:%M:%S.%f%z",  # ISO con timezone
+        "%Y-%m-%dT%H:%M:%S%z",     # ISO sin microsegundos
+        "%Y-%m-%d %H:%M:%S%z",     # Espacio en vez de T
+        "%Y-%m-%d %H:%M:%S",       # Sin timezone (asumir UTC)
+        "%Y-%m-%dT%H:%M:%S",       # ISO naive
+    ]
+
+    for fmt in formats:
+        try:
+            dt = datetime.strptime(ts_str, fmt)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.isoformat()
+        except ValueError:
+            continue
+
+    # Si todo falla, devolver el string original: puede que JS sí lo entienda nativamente
+    return ts_str
+
+
+def _dimensions(dims: dict, length=None, width=None) -> dict:
+    dims = dims or {}
+    return {
+        "a": int(dims.get("a", 0) or 0),
+        "b": int(dims.get("b", 0) or 0),
+        "c": int(dims.get("c", 0) or 0),
+        "d": int(dims.get("d", 0) or 0),
+        "length": float(length or dims.get("length", 0) or 0),
+        "width": float(width or dims.get("width", 0) or 0),
+    }
+
+
+def _str_or_na(value) -> str:
+    return str(value) if value is not None else "N/A"
+
+
+def build_detail_doc(static: dict, flag: str, position: Optional[Tuple[float, float]] = None) -> dict:
+    """Datos estáticos del stream (ver `_process_static_data`) -> dict con la forma de `VesselData`."""
+    imo = static.get("imo_number")
+    return {
+        "ship_name": static.get("ship_name", "Unknown"),
+        "imo_number": str(imo) if imo is not None else None,
+        "call_sign": static.get("call_sign", "N/A"),
+        "ship_type": static.get("ship_type", "Unknown"),
+        "flag": flag,
+        "dimensions": _dimensions(static.get("dimensions")),
+        "fix_type": _str_or_na(static.get("fix_type", "N/A")),
+        "eta": str(static.get("eta", "N/A")),
+        "draught": _str_or_na(static.get("draught", "N/A")),
+        "destination": str(static.get("destination", "N/A")),
+        "timestamp": parse_timestamp(static.get("timestamp")),
+        "latitude": position[0] if position else None,
+        "longitude": position[1] if position else None,
+    }
+
+
+def with_position(doc: dict, position: Optional[Tuple[float, float]]) -> dict:
+    """Copia del documento con la última posición conocida (si la hay)."""
+    if not position:
+        return doc
+    return {**doc, "latitude": position[0], "longitude": position[1]}
+
+
+def detail_doc_from_vessel(vessel, flag: str, position: Optional[Tuple[float, float]] = None) -> dict:
+    """Fila `MarineVessel` (fallback a base de datos) -> dict con la forma de `VesselData`."""
+    ext_refs = vessel.ext_refs or {}
+    # Columnas tipadas primero; ext_refs cubre filas anteriores a su backfill
+    return {
+        "ship_name": vessel.name or "Unknown",
+        "imo_number": str(vessel.imo),
+        "call_sign": vessel.call_sign or ext_refs.get("call_sign", "N/A"),
+        "ship_type": vessel.type or "Unknown",
+        "flag": flag,
+        "dimensions": _dimensions(ext_refs.get("dimensions"), vessel.length, vessel.width),
+        "fix_type": _str_or_na(ext_refs.get("fix_type", "N/A")),
+        "eta": vessel.eta.strftime("%Y-%m-%d %H:%M") if vessel.eta else ext_refs.get("eta", "N/A"),
+        "draught": _str_or_na(vessel.draught if vessel.draught is not None else ext_refs.get("draught", "N/A")),
+        "destination": vessel.destination or ext_refs.get("destination", "N/A"),
+        "timestamp": parse_timestamp(vessel.ais_timestamp or ext_refs.get("timestamp") or vessel.updated_at),
+        "latitude": position[0] if position else None,
+        "longitude": position[1] if position else None,
+    }
@@ -0,0 +1,130 @@
+# name_index.py
+"""
+Índice de prefijos en memoria para el typeahead de barcos en vivo.
+
+Cubre los barcos que el bridge ya conoce por AIS (datos estáticos) aunque todavía no
+estén en `marine_vessel`. Cada barco aporta varias claves normalizadas: nombre completo,
+cada palabra del nombre, call sign, IMO y MMSI. Las claves viven en una lista ordenada,
+así que un prefijo se resuelve con `bisect` y un recorrido corto.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z ]+")
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDERS = {"", "N/A", "NA", "0", "NONE", "UNKNOWN"}
+
+# Peso de cada tipo de clave (se combina con exacto/prefijo en `search`)
+KIND_WEIGHT = {"name": 1.0, "id": 1.0, "call_sign": 0.95, "word": 0.9}
+
+
+def normalize_label(value) -> str:
+    if value is None:
+        return ""
+    text = _NON_ALNUM.sub(" ", str(value).upper())
+    return _SPACES.sub(" ", text).strip()
+
+
+def vessel_keys(mmsi: str, data: dict) -> Tuple[Tuple[str, str], ...]:
+    """(clave, tipo) que indexan un barco a partir de sus datos estáticos."""
+    keys = {(mmsi, "id")}
+    name = normalize_label(data.get("ship_name") or data.get("name"))
+    if name not in _PLACEHOLDERS:
+        keys.add((name, "name"))
+        words = name.split(" ")
+        if len(words) > 1:
+            keys.update((w, "word") for w in words[1:] if len(w) >= 2)
+    call_sign = normalize_label(data.get("call_sign")).replace(" ", "")
+    if call_sign not in _PLACEHOLDERS:
+        keys.add((call_sign, "call_sign"))
+    imo = str(data.get("imo_number") or data.get("imo") or "").strip()
+    if imo.isdigit() and imo != "0":
+        keys.add((imo, "id"))
+    return tuple(sorted(keys))
+
+
+def _label(mmsi: str, data: dict, keys) -> dict:
+    return {
+        "name": normalize_label(data.get("ship_name") or data.get("name")) or None,
+        "imo": next((k for k, kind in keys if kind == "id" and k != mmsi), None),
+        "call_sign": next((k for k, kind in keys if kind == "call_sign"), None),
+    }
+
+
+class VesselNameIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Entradas (clave, mmsi, tipo) ordenadas por clave
+        self._entries: List[Tuple[str, str, str]] = []
+        self._keys_by_id: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        self._labels: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys_by_id)
+
+    def update(self, mmsi: str, data: dict) -> None:
+        keys = vessel_keys(mmsi, data)
+        label = _label(mmsi, data, keys)
+        with self._lock:
+            self._labels[mmsi] = label
+            if self._keys_by_id.get(mmsi) == keys:
+                return
+            self._remove_locked(mmsi)
+            for key, kind in keys:
+                insort(self._entries, (key, mmsi, kind))
+            self._keys_by_id[mmsi] = keys
+
+    def remove(self, mmsi: str) -> None:
+        with self._lock:
+            self._remove_locked(mmsi)
+            self._labels.pop(mmsi, None)
+
+    def _remove_locked(self, mmsi: str) -> None:
+        for key, kind in self._keys_by_id.pop(mmsi, ()):
+            i = bisect_left(self._entries, (key, mmsi, kind))
+            if i < len(self._entries) and self._entries[i] == (key, mmsi, kind):
+                del self._entries[i]
+
+    def load(self, items: Iterable[Tuple[str, dict]]) -> None:
+        """Reconstrucción completa (una ordenación en vez de N inserciones)."""
+        entries: List[Tuple[str, str, str]] = []
+        keys_by_id: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+        labels: Dict[str, dict] = {}
+        for mmsi, data in items:
+            keys = vessel_keys(mmsi, data)
+            keys_by_id[mmsi] = keys
+            labels[mmsi] = _label(mmsi, data, keys)
+            entries.extend((key, mmsi, kind) for key, kind in keys)
+        entries.sort()
+        with self._lock:
+            self._entries, self._keys_by_id, self._labels = entries, keys_by_id, labels
+
+    def search(self, query: str, limit: int = 10, max_scan: Optional[int] = None) -> List[dict]:
+        """Barcos cuyo nombre/palabra/call sign/IMO/MMSI empieza por `query`, por relevancia."""
+        prefix = normalize_label(query)
+        if not prefix:
+            return []
+        max_scan = max_scan or max(64, limit * 16)
+        best: Dict[str, float] = {}
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (prefix,))
+            scanned = 0
+            while i < len(entries) and scanned < max_scan:
+                key, mmsi, kind = entries[i]
+                if not key.startswith(prefix):
+                    break
+                # Exacto > prefijo; los prefijos cortos respecto a la clave puntúan menos
+                score = 1.0 if key == prefix else 0.6 + 0.3 * len(prefix) / len(key)
+                score *= KIND_WEIGHT[kind]
+                if score > best.get(mmsi, 0.0):
+                    best[mmsi] = score
+                i += 1
+                scanned += 1
+            labels = self._labels
+            ranked = sorted(best.items(), key=lambda kv: (-kv[1], labels.get(kv[0], {}).get("name") or ""))[:limit]
+            return [{"mmsi": mmsi, "score": round(score, 4), **labels.get(mmsi, {})} for mmsi, score in ranked]
@@ -2,7 +2,7 @@
 """
 Router para exponer posiciones AIS actuales vía API REST.
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from app.integrations.aisstream.service import AISBridgeService
 from fastapi.responses import JSONResponse
 
@@ -15,6 +15,7 @@ def get_ais_bridge_service():
 
 @router.get("/aisstream/positions", response_class=JSONResponse)
 def get_positions(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(1000, ge=1, le=5000),
     # Bounding box opcional: west,south,east,north (lon/lat)
@@ -29,6 +30,9 @@ def get_positions(
     bbox = None
     if all(v is not None for v in (west, south, east, north)):
         bbox = (west or 0.0, south or 0.0, east or 0.0, north or 0.0)
+        # El bbox consultado también cuenta como demanda para la suscripción dinámica
+        client = request.client.host if request.client else "unknown"
+        service.register_viewport(f"rest:{client}", *bbox)
     result = service.get_positions_page(page=page, page_size=page_size, bbox=bbox)
     return JSONResponse(content=result)
 
@@ -52,3 +56,36 @@ def get_single_position(
         "lat": pos[0],
         "lon": pos[1]
     })
+
+
+@router.get("/aisstream/positions/{mmsi}/history", response_class=JSONResponse)
+def get_position_history(
+    mmsi: str,
+    service: AISBridgeService = Depends(get_ais_bridge_service),
+):
+    """
+    Historial reciente (hasta 100 puntos) de un barco, con su número de secuencia actual.
+    """
+    if not service:
+        return JSONResponse(content={"error": "AISBridgeService not running"}, status_code=503)
+
+    history = service.get_ship_history(mmsi)
+    if not history:
+        return JSONResponse(content={"error": "History not found"}, status_code=404)
+
+    return JSONResponse(content=history)
+
+@router.get("/aisstream/stats", response_class=JSONResponse)
+def get_stats(service: AISBridgeService = Depends(get_ais_bridge_service)):
+    """
+    Tamaño de la flota activa en memoria y conteos del barrido de barcos inactivos.
+    """
+    if not service:
+        return JSONResponse(content={"error": "AISBridgeService not running"}, status_code=503)
+
+    return JSONResponse(content={
+        "active_vessels": len(service._last_pos),
+        "static_entries": len(service._ship_static_data),
+        "position_reports": service.ingest_stats,
+        "evictions": service.eviction_stats,
+    })
@@ -3,6 +3,8 @@ import asyncio
 import websockets
 import json
 import logging
+import threading
+import time
 from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Optional, Iterable
 from collections import defaultdict
@@ -10,24 +12,176 @@ from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import select
 from app.db.database import SessionLocal
 from app.db.models.marine_vessel import MarineVessel
+from app.db.models.marine_watchlist import MarineWatchlist
+from app.db.models.res_user import ResUser
+from app.db.models.user import User
+from app.utils.metrics import increment, observe, register_gauge, unregister_gauge
+from app.services.destination_resolver import destination_resolver, load_port_rows
+from app.services.country_index import country_index
+from app.integrations.aisstream.thinning import AcceptedPoint, ThinningPolicy, report_heading
+from app.integrations.aisstream.demand import Box, DemandTracker, to_aisstream, viewport_to_boxes
+from app.integrations.aisstream.alerts import AlertEngine, load_alert_rules, write_last_triggered
+from app.integrations.aisstream.name_index import VesselNameIndex
+from app.integrations.aisstream.details import build_detail_doc, with_position
+
+DEFAULT_AISSTREAM_URL = "wss://stream.aisstream.io/v0/stream"
+# Puntos de historial por barco (memoria y Redis)
+HISTORY_MAX_POINTS = 100
+# NavigationalStatus AIS: 1 = fondeado, 5 = amarrado
+MOORED_NAV_STATUSES = (1, 5)
+MOORED_MAX_SOG = 0.5
+# Workers pasivos: cada cuánto se recarga desde Redis el índice de nombres para búsquedas
+NAME_INDEX_REFRESH_SECONDS = 30.0
+
+
+def _parse_point(raw) -> Optional[Tuple[float, float]]:
+    """Posición guardada en Redis como "lat,lon"."""
+    if not raw:
+        return None
+    try:
+        val = raw.decode('utf-8') if isinstance(raw, bytes) else str(raw)
+        lat_s, lon_s = val.split(',')
+        return (float(lat_s), float(lon_s))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _ais_text(value, max_len: int) -> Optional[str]:
+    """Texto AIS sin relleno; "N/A" y vacío -> None."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text[:max_len] if text and text != "N/A" else None
+
+
+def _ais_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "", "N/A") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _ais_datetime(value, fmt: Optional[str] = None) -> Optional[datetime]:
+    """ISO 8601 (o `fmt`) -> datetime con zona (UTC si no trae)."""
+    if not value or value == "N/A":
+        return None
+    try:
+        dt = datetime.strptime(value, fmt) if fmt else datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
 
 class AISBridgeService:
-    def __init__(self, sio_server, api_key, bounding_boxes=None, redis_client=None):
+    def __init__(
+        self,
+        sio_server,
+        api_key,
+        bounding_boxes=None,
+        redis_client=None,
+        url=None,
+        frame_ms=100,
+        stale_moving_seconds=1800,
+        stale_moored_seconds=21600,
+        sweep_interval_seconds=60,
+        thinning: Optional[ThinningPolicy] = None,
+        dynamic_bbox: bool = False,
+        demand: Optional[DemandTracker] = None,
+        dynamic_bbox_interval_seconds: float = 5.0,
+        viewport_ttl_seconds: float = 60.0,
+        alerts: Optional[AlertEngine] = None,
+        alert_reload_seconds: float = 60.0,
+        watchlist_poll_seconds: float = 5.0,
+        port_data_refresh_seconds: float = 60.0,
+    ):
         self.sio_server = sio_server
         self.api_key = api_key
+        self.url = url or DEFAULT_AISSTREAM_URL
         self.bounding_boxes = bounding_boxes or [[[-90, -180], [90, 180]]]
         self.redis_client = redis_client
         self._task = None
         self._running = False
         self.redis_positions_key = "ais:positions"
+        self.redis_history_prefix = "ais:history:"
+        self.redis_seq_key = "ais:seq"
+        self.redis_last_seen_moving_key = "ais:last_seen:moving"
+        self.redis_last_seen_moored_key = "ais:last_seen:moored"
 
         
         # Para datos de posición (existente)
         self._ships: Dict[str, List[List[float]]] = {}
         self._last_pos: Dict[str, Tuple[float, float]] = {}
+        # Número de secuencia por barco: se incrementa con cada punto añadido al historial.
+        # El cliente detecta huecos (seq != anterior + 1) y pide el historial completo bajo demanda.
+        self._seq: Dict[str, int] = {}
+
+        # Micro-batching: los puntos nuevos se acumulan y se emiten/persisten en frames de ~frame_ms
+        self.frame_interval = max(0.01, (frame_ms or 100) / 1000.0)
+        self._frame_updates: List[dict] = []
+        self._frame_task = None
+        # Último volcado de frame a Redis completado (epoch), para el gauge de retraso
+        self._last_redis_flush: Optional[float] = None
+
+        # Expiración de barcos inactivos: último reporte (epoch) y si estaba amarrado/fondeado
+        self.stale_moving_seconds = stale_moving_seconds
+        self.stale_moored_seconds = stale_moored_seconds
+        self.sweep_interval = max(1.0, float(sweep_interval_seconds))
+        self._last_seen: Dict[str, float] = {}
+        self._moored: Dict[str, bool] = {}
+        # MMSI -> (ts, moored) pendientes de ZADD; se coalescen por frame
+        self._seen_dirty: Dict[str, Tuple[float, bool]] = {}
+        self._sweeper_task = None
+
+        # Thinning en ingesta: último punto aceptado por barco y contadores raw/aceptados/descartados
+        self.thinning = thinning or ThinningPolicy()
+        self._thin_state: Dict[str, AcceptedPoint] = {}
+        self.ingest_stats = {"raw": 0, "accepted": 0, "thinned": 0}
+        self._ingest_reported: Dict[str, int] = {}
+
+        # Suscripción dinámica: viewports/áreas de demanda compartidos entre workers vía Redis
+        self.dynamic_bbox = dynamic_bbox
+        self.demand = demand or DemandTracker()
+        self.dynamic_bbox_interval = max(1.0, float(dynamic_bbox_interval_seconds))
+        self.viewport_ttl = float(viewport_ttl_seconds)
+        self.redis_viewports_key = "ais:viewports"
+        self._demand_areas: Dict[str, Tuple[List[Box], float]] = {}
+
+        # Alertas geofence/puerto: se evalúan por frame; last_triggered se escribe en bloque
+        self.alerts = alerts
+        self.alert_reload_seconds = max(5.0, float(alert_reload_seconds))
+        self.alert_flush_interval = 10.0
+        self._alert_rules_pending = None
+        self._alert_triggers: Dict[int, float] = {}
+        self._alert_task = None
+
+        # Watchlists: índice inverso MMSI -> ids de usuario (app) que lo siguen.
+        # Se recarga cuando cambia la versión (`ais:watchlist:version` en Redis o local).
+        self.redis_watchlist_version_key = "ais:watchlist:version"
+        self.watchlist_poll_interval = max(1.0, float(watchlist_poll_seconds))
+        self._watchers: Dict[str, frozenset] = {}
+        self._watchlist_version = None
+        self._watchlist_local_version = 0
+        self._watchlist_task = None
+
+        # Destino AIS resuelto a port_number: índice puerto -> barcos (memoria y sets Redis)
+        self.redis_arrivals_prefix = "ais:arrivals:"
+        self.port_data_refresh_seconds = max(5.0, float(port_data_refresh_seconds))
+        self._dest_port: Dict[str, int] = {}
+        self._arrivals: Dict[int, set] = defaultdict(set)
+        self._port_data_task = None
+        self.eviction_stats = {"last_sweep": None, "memory": 0, "redis": 0, "total_memory": 0, "total_redis": 0}
         
         # NUEVO: Para datos estáticos de barcos
         self._ship_static_data: Dict[str, dict] = {}
+        # Typeahead de barcos en vivo (nombre/call sign/IMO/MMSI), aunque aún no estén en DB
+        self.name_index = VesselNameIndex()
+        # Workers pasivos: hilo que reconstruye el índice desde Redis (las búsquedas sólo leen)
+        self._name_index_stop = threading.Event()
+        self._name_index_thread: Optional[threading.Thread] = None
+        # Documentos de detalle listos para servir (memoria + hash Redis `ais:details`)
+        self.redis_details_key = "ais:details"
+        self._details: Dict[str, dict] = {}
+        self._details_dirty: set = set()
         self._static_data_listeners: Dict[str, asyncio.Future] = {}
         self._message_queue: asyncio.Queue = asyncio.Queue()
         self._syncer_task = None
@@ -36,16 +190,74 @@ class AISBridgeService:
     async def start(self):
         self._running = True
         self._syncer_running = True
+        if self.redis_client:
+            try:
+                await asyncio.to_thread(self._load_seq)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Could not load AIS sequences from Redis: {e}")
         self._task = asyncio.create_task(self._run())
+        self._frame_task = asyncio.create_task(self._frame_flush_loop())
+        self._sweeper_task = asyncio.create_task(self._stale_sweeper_loop())
+        if self.alerts is not None:
+            self._alert_task = asyncio.create_task(self._alert_loop())
+        self._watchlist_task = asyncio.create_task(self._watchlist_loop())
+        self._port_data_task = asyncio.create_task(self._port_data_loop())
         self._syncer_task = asyncio.create_task(self._static_data_syncer_loop())
+        self._last_redis_flush = time.time()
+        self._register_gauges()
+
+    def _load_seq(self) -> None:
+        # Las secuencias continúan las ya publicadas (ais:seq): los clientes descartan seq <= la suya
+        raw = self.redis_client.hgetall(self.redis_seq_key) or {}
+        for mmsi, seq in raw.items():
+            mmsi = mmsi.decode() if isinstance(mmsi, bytes) else str(mmsi)
+            try:
+                self._seq[mmsi] = max(self._seq.get(mmsi, 0), int(seq))
+            except (TypeError, ValueError):
+                continue
+
+    # Gauges de estado para `/metrics` (se calculan al exportar, sin coste por mensaje)
+    _GAUGES = ("ais.vessels", "ais.frame_queue_depth", "ais.details_pending", "ais.static_pending", "ais.redis_flush_lag_seconds")
+
+    def _register_gauges(self) -> None:
+        register_gauge("ais.vessels", lambda: len(self._last_pos))
+        register_gauge("ais.frame_queue_depth", lambda: len(self._frame_updates))
+        register_gauge("ais.details_pending", lambda: len(self._details_dirty))
+        if self.redis_client:
+            register_gauge("ais.static_pending", lambda: self.redis_client.scard("ais:pending_static_updates"))
+            register_gauge("ais.redis_flush_lag_seconds", self._redis_flush_lag)
+
+    def _redis_flush_lag(self) -> Optional[float]:
+        # Antigüedad de lo que aún no está en Redis: 0 si no hay nada pendiente
+        if not self._frame_updates and not self._seen_dirty and not self._details_dirty:
+            return 0.0
+        if self._last_redis_flush is None:
+            return None
+        return max(0.0, time.time() - self._last_redis_flush)
 
     async def stop(self):
         self._running = False
+        thread = self._name_index_thread
+        if thread is not None:
+            self._name_index_stop.set()
+            await asyncio.to_thread(thread.join, 5)
+            self._name_index_thread = None
+        for name in self._GAUGES:
+            unregister_gauge(name)
         if self._task:
             self._task.cancel()
             try:
                 await self._task
-            except Exception:
+            except (asyncio.CancelledError, Exception):
+                pass
+
+        for task in (self._frame_task, self._sweeper_task, self._alert_task, self._watchlist_task, self._port_data_task):
+            if not task:
+                continue
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
                 pass
         
         self._syncer_running = False
@@ -53,11 +265,11 @@ class AISBridgeService:
             self._syncer_task.cancel()
             try:
                 await self._syncer_task
-            except Exception:
+            except (asyncio.CancelledError, Exception):
                 pass
 
     async def _run(self):
-        url = "wss://stream.aisstream.io/v0/stream"
+        url = self.url
         
         async def batch_sender():
             while self._running:
@@ -81,108 +293,701 @@ class AISBridgeService:
 
         while self._running:
             try:
-                # Limpiar barcos al reconectar para evitar duplicados
-                self._ships.clear()
-                self._last_pos.clear()
-                
+                self._reset_stream_state()
+
                 async with websockets.connect(url) as websocket:
-                    # Suscribirse a ambos tipos de mensajes
-                    subscribe_message = {
-                        "APIKey": self.api_key, 
-                        "BoundingBoxes": self.bounding_boxes,
-                        "FilterMessageTypes": ["PositionReport", "ShipStaticData"]  # Añadimos ShipStaticData
-                    }
-                    
-                    await websocket.send(json.dumps(subscribe_message))
+                    if self.dynamic_bbox:
+                        # Suscripción inicial según la demanda actual (sin histéresis)
+                        self.demand.current = None
+                        areas = await asyncio.to_thread(self._collect_demand_areas)
+                        self.bounding_boxes = to_aisstream(self.demand.decide(areas))
+
+                    await websocket.send(json.dumps(self._subscribe_message()))
                     print("✓ Servicio AISBridge conectado y suscrito a PositionReport + ShipStaticData")
                     
                     # Lanzar el batch sender en paralelo
                     batch_task = asyncio.create_task(batch_sender())
+                    subscription_task = (
+                        asyncio.create_task(self._subscription_loop(websocket)) if self.dynamic_bbox else None
+                    )
                     try:
                         async for message_json in websocket:
                             if not self._running:
                                 break
                             try:
-                                message = json.loads(message_json)
-                                
-                                # Procesar PositionReport (existente)
-                                if message.get("MessageType") == "PositionReport":
-                                    ais_message = message['Message']['PositionReport']
-                                    ship_id = str(ais_message['UserID'])
-                                    lat = float(ais_message['Latitude'])
-                                    lon = float(ais_message['Longitude'])
-                                    
-                                    # Mantener historial (código existente)
-                                    emitir = False
-                                    if ship_id not in self._ships:
-                                        self._ships[ship_id] = []
-                                        emitir = True
-                                    else:
-                                        last_pos = self._ships[ship_id][-1] if self._ships[ship_id] else None
-                                        if last_pos is None or last_pos[0] != lat or last_pos[1] != lon:
-                                            emitir = True
-                                    
-                                    self._ships[ship_id].append([lat, lon])
-                                    if len(self._ships[ship_id]) > 100:
-                                        self._ships[ship_id] = self._ships[ship_id][-100:]
-                                    self._last_pos[ship_id] = (lat, lon)
-                                    
-                                    # Sync to Redis if client is available
-                                    if self.redis_client:
-                                        try:
-                                            # Store as "lat,lon" string for efficiency
-                                            self.redis_client.hset(
-                                                self.redis_positions_key, 
-                                                ship_id, 
-                                                f"{lat},{lon}"
-                                            )
-                                        except Exception as rx:
-                                            logging.getLogger(__name__).warning(f"Redis write error: {rx}")
-                                    
-                                    if emitir:
-                                        await self.sio_server.emit("ais_position", {
-                                            "id": ship_id,
-                                            "lat": lat,
-                                            "lon": lon,
-                                            "positions": self._ships[ship_id],
-                                        })
-                                
-                                # NUEVO: Procesar ShipStaticData
-                                elif message.get("MessageType") == "ShipStaticData":
-                                    ais_message = message['Message']['ShipStaticData']
-                                    ship_id = str(ais_message['UserID'])
-                                    
-                                    
-                                    # Almacenar datos estáticos
-                                    metadata = message.get("MetaData", {})
-                                    processed_data = self._process_static_data(ais_message, metadata)
-                                    self._ship_static_data[ship_id] = processed_data
-                                    
-                                    # Notificar a cualquier listener esperando este MMSI
-                                    if ship_id in self._static_data_listeners:
-                                        future = self._static_data_listeners[ship_id]
-                                        if not future.done():
-                                            future.set_result(processed_data)
-                                        del self._static_data_listeners[ship_id]
-                                    
-                                    # Caching en Redis y agendar a DB
-                                    if self.redis_client:
-                                        self._buffer_static_data(ship_id, processed_data)
-                                    
-                                    # print(f"✓ Datos estáticos recibidos para MMSI: {ship_id}")
-                                    
+                                await self._handle_message(json.loads(message_json))
                             except Exception as e:
                                 logging.error(f"Error procesando mensaje AISSTREAM: {e}")
                     finally:
-                        batch_task.cancel()
-                        try:
-                            await batch_task
-                        except Exception:
-                            pass
+                        for task in (batch_task, subscription_task):
+                            if not task:
+                                continue
+                            task.cancel()
+                            try:
+                                await task
+                            except (asyncio.CancelledError, Exception):
+                                pass
             except Exception as e:
                 logging.getLogger(__name__).error("AISSTREAM connection error: %s", e)
                 await asyncio.sleep(5)
 
+    def _subscribe_message(self) -> dict:
+        # Suscribirse a ambos tipos de mensajes
+        return {
+            "APIKey": self.api_key,
+            "BoundingBoxes": self.bounding_boxes,
+            "FilterMessageTypes": ["PositionReport", "ShipStaticData"],  # Añadimos ShipStaticData
+        }
+
+    async def _subscription_loop(self, websocket):
+        """Renegocia la suscripción en el mismo websocket cuando cambia la demanda."""
+        log = logging.getLogger(__name__)
+        while self._running:
+            await asyncio.sleep(self.dynamic_bbox_interval)
+            try:
+                areas = await asyncio.to_thread(self._collect_demand_areas)
+                boxes = self.demand.decide(areas)
+                if boxes is None:
+                    continue
+                self.bounding_boxes = to_aisstream(boxes)
+                await websocket.send(json.dumps(self._subscribe_message()))
+                increment("ais.subscription_updates")
+                log.info(f"AISSTREAM subscription updated: {len(boxes)} boxes from {len(areas)} demand areas")
+            except websockets.ConnectionClosed:
+                return
+            except Exception as e:
+                log.warning(f"Error updating AISSTREAM subscription: {e}")
+
+    def register_viewport(self, key: str, west: float, south: float, east: float, north: float) -> None:
+        """Registra el viewport de un cliente (lon/lat). Expira si no se refresca en `viewport_ttl`."""
+        if not self.dynamic_bbox:
+            return
+        self.set_demand_area(key, viewport_to_boxes(west, south, east, north), self.viewport_ttl)
+
+    def set_demand_area(self, key: str, boxes: List[Box], ttl: float) -> None:
+        expires_at = time.time() + ttl
+        self._demand_areas[key] = (list(boxes), expires_at)
+        if self.redis_client:
+            try:
+                self.redis_client.hset(
+                    self.redis_viewports_key, key, json.dumps({"b": list(boxes), "exp": expires_at})
+                )
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis write error (viewport): {e}")
+
+    def remove_demand_area(self, key: str) -> None:
+        if not self.dynamic_bbox:
+            return
+        self._demand_areas.pop(key, None)
+        if self.redis_client:
+            try:
+                self.redis_client.hdel(self.redis_viewports_key, key)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis write error (viewport): {e}")
+
+    def _collect_demand_areas(self) -> List[Box]:
+        """Áreas vigentes de todos los workers; purga las expiradas."""
+        now = time.time()
+        entries = dict(self._demand_areas)
+        expired = [k for k, (_, exp) in entries.items() if exp < now]
+        for key in expired:
+            self._demand_areas.pop(key, None)
+        if self.redis_client:
+            try:
+                raw = self.redis_client.hgetall(self.redis_viewports_key) or {}
+                redis_expired = []
+                for k, v in raw.items():
+                    key = k.decode('utf-8') if isinstance(k, bytes) else str(k)
+                    try:
+                        doc = json.loads(v)
+                        boxes, exp = [tuple(b) for b in doc["b"]], float(doc["exp"])
+                    except (ValueError, KeyError, TypeError):
+                        redis_expired.append(key)
+                        continue
+                    if exp < now:
+                        redis_expired.append(key)
+                    else:
+                        entries[key] = (boxes, exp)
+                if redis_expired:
+                    self.redis_client.hdel(self.redis_viewports_key, *redis_expired)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis read error (viewports): {e}")
+        areas: List[Box] = []
+        for boxes, exp in entries.values():
+            if exp >= now:
+                areas.extend(boxes)
+        return areas
+
+    async def _handle_message(self, message: dict) -> None:
+        """Procesa un mensaje ya decodificado del feed (hot path de ingesta)."""
+        message_type = message.get("MessageType")
+        if message_type == "PositionReport":
+            await self._handle_position_report(message)
+        elif message_type == "ShipStaticData":
+            self._handle_static_data(message)
+
+    async def _handle_position_report(self, message: dict) -> None:
+        ais_message = message['Message']['PositionReport']
+        ship_id = str(ais_message['UserID'])
+        lat = float(ais_message['Latitude'])
+        lon = float(ais_message['Longitude'])
+
+        # Último reporte: se refresca aunque la posición no cambie (barcos amarrados)
+        moored = (
+            ais_message.get('NavigationalStatus') in MOORED_NAV_STATUSES
+            or float(ais_message.get('Sog') or 0.0) < MOORED_MAX_SOG
+        )
+        now = self._mark_seen(ship_id, moored)
+        self.ingest_stats["raw"] += 1
+
+        # Thinning: sólo los reportes aceptados llegan al historial, Redis y Socket.IO
+        heading = report_heading(ais_message)
+        if not self.thinning.accept(self._thin_state.get(ship_id), now, lat, lon, heading):
+            self.ingest_stats["thinned"] += 1
+            return
+        self._thin_state[ship_id] = (now, lat, lon, heading)
+        self.ingest_stats["accepted"] += 1
+
+        history = self._ships.get(ship_id)
+        if history is None:
+            history = self._ships[ship_id] = []
+        history.append([lat, lon])
+        if len(history) > HISTORY_MAX_POINTS:
+            del history[:-HISTORY_MAX_POINTS]
+        self._last_pos[ship_id] = (lat, lon)
+        seq = self._seq.get(ship_id, 0) + 1
+        self._seq[ship_id] = seq
+
+        # Emisión y escritura en Redis diferidas al siguiente frame
+        self._frame_updates.append({"id": ship_id, "lat": lat, "lon": lon, "seq": seq})
+
+    def _handle_static_data(self, message: dict) -> None:
+        ais_message = message['Message']['ShipStaticData']
+        ship_id = str(ais_message['UserID'])
+        
+        # Almacenar datos estáticos
+        metadata = message.get("MetaData", {})
+        processed_data = self._process_static_data(ais_message, metadata)
+        processed_data["destination_port_number"] = destination_resolver.resolve(processed_data.get("destination"))
+        self._ship_static_data[ship_id] = processed_data
+        self._index_destination(ship_id, processed_data["destination_port_number"])
+        self.name_index.update(ship_id, processed_data)
+        self._details[ship_id] = build_detail_doc(processed_data, country_index.name(ship_id))
+        self._details_dirty.add(ship_id)
+        self._mark_seen(ship_id, self._moored.get(ship_id, False))
+        
+        # Notificar a cualquier listener esperando este MMSI
+        if ship_id in self._static_data_listeners:
+            future = self._static_data_listeners[ship_id]
+            if not future.done():
+                future.set_result(processed_data)
+            del self._static_data_listeners[ship_id]
+        
+        # Caching en Redis y agendar a DB
+        if self.redis_client:
+            self._buffer_static_data(ship_id, processed_data)
+
+    def _mark_seen(self, ship_id: str, moored: bool) -> float:
+        now = time.time()
+        self._last_seen[ship_id] = now
+        self._moored[ship_id] = moored
+        self._seen_dirty[ship_id] = (now, moored)
+        return now
+
+    async def _frame_flush_loop(self):
+        """Vacía el buffer de puntos nuevos cada `frame_interval` segundos.
+
+        Por frame: un único emit `ais_position_delta` con sólo los puntos nuevos (+ seq) y un
+        único pipeline a Redis con posiciones, historial y secuencias.
+        """
+        while self._running:
+            await asyncio.sleep(self.frame_interval)
+            self._flush_ingest_metrics()
+            if not self._frame_updates and not self._seen_dirty and not self._details_dirty:
+                continue
+            updates, self._frame_updates = self._frame_updates, []
+            seen, self._seen_dirty = self._seen_dirty, {}
+            dirty, self._details_dirty = self._details_dirty, set()
+            # Copia superficial: el hilo serializa mientras el loop puede actualizar la bandera
+            details = {m: dict(self._details[m]) for m in dirty if m in self._details}
+            if updates:
+                try:
+                    await self.sio_server.emit("ais_position_delta", {"updates": updates})
+                except Exception as e:
+                    logging.getLogger("socketio.server").warning("Error sending AIS frame: %s", e)
+                if self._watchers:
+                    await self._emit_watchlist_updates(updates)
+                if self.alerts is not None:
+                    await self._evaluate_alerts(updates)
+            if self.redis_client:
+                try:
+                    t0 = time.perf_counter()
+                    await asyncio.to_thread(self._write_frame_to_redis, updates, seen, details)
+                    observe("ais.redis_frame_write.seconds", time.perf_counter() - t0)
+                    self._last_redis_flush = time.time()
+                except Exception as rx:
+                    logging.getLogger(__name__).warning(f"Redis write error: {rx}")
+
+    async def _emit_watchlist_updates(self, updates: List[dict]) -> None:
+        # Coste proporcional a los barcos seguidos presentes en el frame, no al total de usuarios
+        per_user: Dict[int, List[dict]] = defaultdict(list)
+        watchers = self._watchers
+        for u in updates:
+            for uid in watchers.get(u["id"], ()):
+                per_user[uid].append(u)
+        for uid, items in per_user.items():
+            try:
+                await self.sio_server.emit("ais_watchlist_delta", {"updates": items}, room=f"user:{uid}")
+            except Exception as e:
+                logging.getLogger("socketio.server").warning("Error sending watchlist frame: %s", e)
+
+    def bump_watchlist_version(self) -> None:
+        """Marca las watchlists como modificadas para que el writer recargue el índice inverso."""
+        self._watchlist_local_version += 1
+        if self.redis_client:
+            try:
+                self.redis_client.incr(self.redis_watchlist_version_key)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis write error (watchlist version): {e}")
+
+    def _current_watchlist_version(self):
+        if self.redis_client:
+            try:
+                return self.redis_client.get(self.redis_watchlist_version_key), self._watchlist_local_version
+            except Exception:
+                pass
+        return None, self._watchlist_local_version
+
+    async def _watchlist_loop(self):
+        log = logging.getLogger(__name__)
+        while self._running:
+            try:
+                version = await asyncio.to_thread(self._current_watchlist_version)
+                if version != self._watchlist_version:
+                    self._watchers = await asyncio.to_thread(self._load_watchers)
+                    self._watchlist_version = version
+                    log.info(f"Watchlist index reloaded: {len(self._watchers)} watched vessels")
+                if self.dynamic_bbox:
+                    self._refresh_watchlist_demand()
+            except Exception as e:
+                log.warning(f"Error reloading watchlist index: {e}")
+            await asyncio.sleep(self.watchlist_poll_interval)
+
+    def _load_watchers(self) -> Dict[str, frozenset]:
+        index: Dict[str, set] = defaultdict(set)
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(MarineVessel.mmsi, User.id)
+                .join(MarineWatchlist, MarineWatchlist.vessel_id == MarineVessel.id)
+                .join(ResUser, ResUser.id == MarineWatchlist.user_id)
+                .join(User, User.email == ResUser.email)
+            ).all()
+        for mmsi, uid in rows:
+            index[str(mmsi)].add(uid)
+        return {mmsi: frozenset(uids) for mmsi, uids in index.items()}
+
+    def _refresh_watchlist_demand(self) -> None:
+        # Los barcos seguidos mantienen su zona en la suscripción dinámica aunque nadie la mire
+        ttl = self.watchlist_poll_interval * 3
+        for mmsi in self._watchers:
+            pos = self._last_pos.get(mmsi)
+            if pos is None:
+                continue
+            lat, lon = pos
+            self._demand_areas[f"watch:{mmsi}"] = (
+                [(max(-90.0, lat - 1.0), max(-180.0, lon - 1.0), min(90.0, lat + 1.0), min(180.0, lon + 1.0))],
+                time.time() + ttl,
+            )
+
+    async def _evaluate_alerts(self, updates: List[dict]) -> None:
+        # Las reglas recargadas se aplican aquí para no cruzarse con una evaluación en curso
+        if self._alert_rules_pending is not None:
+            rules, self._alert_rules_pending = self._alert_rules_pending, None
+            self.alerts.load(rules)
+        try:
+            events = await asyncio.to_thread(self.alerts.evaluate, updates)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error evaluating alerts: {e}")
+            return
+        for event in events:
+            self._alert_triggers[event["alert_id"]] = event["ts"]
+            if event["user_id"] is None:
+                continue
+            try:
+                await self.sio_server.emit("ais_alert", event, room=f"user:{event['user_id']}")
+            except Exception as e:
+                logging.getLogger("socketio.server").warning("Error sending AIS alert: %s", e)
+        if events:
+            increment("ais.alerts_triggered", len(events))
+
+    async def _alert_loop(self):
+        """Recarga periódica de alertas activas y volcado en bloque de `last_triggered`."""
+        log = logging.getLogger(__name__)
+        last_reload = 0.0
+        while self._running:
+            if time.monotonic() - last_reload >= self.alert_reload_seconds:
+                try:
+                    self._alert_rules_pending = await asyncio.to_thread(self._load_alert_rules)
+                    last_reload = time.monotonic()
+                except Exception as e:
+                    log.warning(f"Error loading alerts: {e}")
+                    last_reload = time.monotonic()
+            if self._alert_triggers:
+                triggered, self._alert_triggers = self._alert_triggers, {}
+                try:
+                    await asyncio.to_thread(self._write_alert_triggers, triggered)
+                except Exception as e:
+                    log.warning(f"Error writing alert last_triggered: {e}")
+            await asyncio.sleep(self.alert_flush_interval)
+
+    def _load_alert_rules(self):
+        with SessionLocal() as db:
+            rules = load_alert_rules(db)
+        logging.getLogger(__name__).info(f"Loaded {len(rules)} active AIS alerts")
+        return rules
+
+    def _write_alert_triggers(self, triggered: Dict[int, float]) -> None:
+        with SessionLocal() as db:
+            write_last_triggered(db, triggered)
+
+    def _flush_ingest_metrics(self) -> None:
+        # Vuelca a metrics los deltas de contadores desde el último frame (evita un increment por mensaje)
+        reported = self._ingest_reported
+        for key, value in self.ingest_stats.items():
+            delta = value - reported.get(key, 0)
+            if delta:
+                increment("ais.position_reports", delta, tags={"result": key})
+                reported[key] = value
+
+    def _write_frame_to_redis(
+        self,
+        updates: List[dict],
+        seen: Optional[Dict[str, Tuple[float, bool]]] = None,
+        details: Optional[Dict[str, dict]] = None,
+    ) -> None:
+        positions: Dict[str, str] = {}
+        seqs: Dict[str, int] = {}
+        pipe = self.redis_client.pipeline(transaction=False)
+        for u in updates:
+            # Store as "lat,lon" string for efficiency
+            point = f"{u['lat']},{u['lon']}"
+            positions[u["id"]] = point
+            seqs[u["id"]] = u["seq"]
+            pipe.rpush(f"{self.redis_history_prefix}{u['id']}", point)
+        for ship_id in seqs:
+            pipe.ltrim(f"{self.redis_history_prefix}{ship_id}", -HISTORY_MAX_POINTS, -1)
+        if positions:
+            pipe.hset(self.redis_positions_key, mapping=positions)
+            pipe.hset(self.redis_seq_key, mapping=seqs)
+        if seen:
+            moving = {mmsi: ts for mmsi, (ts, moored) in seen.items() if not moored}
+            moored = {mmsi: ts for mmsi, (ts, moored) in seen.items() if moored}
+            # Un barco vive en un único zset: al cambiar de estado se retira del otro
+            if moving:
+                pipe.zadd(self.redis_last_seen_moving_key, moving)
+                pipe.zrem(self.redis_last_seen_moored_key, *moving)
+            if moored:
+                pipe.zadd(self.redis_last_seen_moored_key, moored)
+                pipe.zrem(self.redis_last_seen_moving_key, *moored)
+        if details:
+            pipe.hset(self.redis_details_key, mapping={m: json.dumps(doc) for m, doc in details.items()})
+        pipe.execute()
+
+    async def _stale_sweeper_loop(self):
+        """Expulsa periódicamente los barcos sin reportes recientes (memoria y Redis)."""
+        log = logging.getLogger(__name__)
+        while self._running:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep_stale_vessels()
+            except Exception as e:
+                log.warning(f"Error sweeping stale vessels: {e}")
+
+    async def sweep_stale_vessels(self) -> dict:
+        """Elimina barcos cuyo último reporte supera el umbral (moving/moored). Devuelve los conteos."""
+        now = time.time()
+        moving_cutoff = now - self.stale_moving_seconds
+        moored_cutoff = now - self.stale_moored_seconds
+
+        stale = [
+            mmsi for mmsi, ts in self._last_seen.items()
+            if ts < (moored_cutoff if self._moored.get(mmsi) else moving_cutoff)
+        ]
+        for mmsi in stale:
+            self._evict_from_memory(mmsi)
+
+        evicted_redis = 0
+        if self.redis_client:
+            candidates = await asyncio.to_thread(self._stale_redis_candidates, moving_cutoff, moored_cutoff)
+            # Un barco que volvió a reportar (aún sin volcar a Redis) no se toca
+            candidates = [
+                m for m in candidates
+                if self._last_seen.get(m, 0.0) < (moored_cutoff if self._moored.get(m) else moving_cutoff)
+            ]
+            if candidates:
+                await asyncio.to_thread(self._evict_from_redis, candidates)
+            evicted_redis = len(candidates)
+
+        stats = self.eviction_stats
+        stats["last_sweep"] = datetime.now(timezone.utc).isoformat()
+        stats["memory"] = len(stale)
+        stats["redis"] = evicted_redis
+        stats["total_memory"] += len(stale)
+        stats["total_redis"] += evicted_redis
+        if stale or evicted_redis:
+            increment("ais.stale_evicted", len(stale), tags={"store": "memory"})
+            increment("ais.stale_evicted", evicted_redis, tags={"store": "redis"})
+            logging.getLogger(__name__).info(
+                f"Stale vessel sweep: evicted memory={len(stale)} redis={evicted_redis} "
+                f"(active={len(self._last_seen)})"
+            )
+        return dict(stats)
+
+    def _evict_from_memory(self, mmsi: str) -> None:
+        self._ships.pop(mmsi, None)
+        self._last_pos.pop(mmsi, None)
+        self._seq.pop(mmsi, None)
+        self._ship_static_data.pop(mmsi, None)
+        self.name_index.remove(mmsi)
+        self._details.pop(mmsi, None)
+        self._details_dirty.discard(mmsi)
+        self._last_seen.pop(mmsi, None)
+        self._moored.pop(mmsi, None)
+        self._seen_dirty.pop(mmsi, None)
+        self._thin_state.pop(mmsi, None)
+        self._index_destination_memory_only(mmsi)
+        if self.alerts is not None:
+            self.alerts.forget(mmsi)
+
+    def _index_destination_memory_only(self, mmsi: str) -> None:
+        # Los sets Redis de llegadas se limpian en _evict_from_redis
+        old = self._dest_port.pop(mmsi, None)
+        if old is not None:
+            self._arrivals[old].discard(mmsi)
+            if not self._arrivals[old]:
+                del self._arrivals[old]
+
+    def _stale_redis_candidates(self, moving_cutoff: float, moored_cutoff: float) -> List[str]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrangebyscore(self.redis_last_seen_moving_key, "-inf", moving_cutoff)
+        pipe.zrangebyscore(self.redis_last_seen_moored_key, "-inf", moored_cutoff)
+        moving, moored = pipe.execute()
+        return [m.decode('utf-8') if isinstance(m, bytes) else str(m) for m in (moving or []) + (moored or [])]
+
+    def _evict_from_redis(self, mmsis: List[str], chunk_size: int = 500) -> None:
+        for i in range(0, len(mmsis), chunk_size):
+            chunk = mmsis[i:i + chunk_size]
+            # Puerto de destino de cada barco, para retirarlo de su set de llegadas
+            arrival_keys: Dict[str, List[str]] = defaultdict(list)
+            for mmsi, raw in zip(chunk, self.redis_client.hmget("ais:static_data", chunk)):
+                try:
+                    port_number = json.loads(raw).get("destination_port_number") if raw else None
+                except (ValueError, TypeError, AttributeError):
+                    port_number = None
+                if port_number is not None:
+                    arrival_keys[f"{self.redis_arrivals_prefix}{port_number}"].append(mmsi)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, members in arrival_keys.items():
+                pipe.srem(key, *members)
+            pipe.hdel(self.redis_positions_key, *chunk)
+            pipe.hdel(self.redis_seq_key, *chunk)
+            pipe.hdel("ais:static_data", *chunk)
+            pipe.hdel(self.redis_details_key, *chunk)
+            pipe.srem("ais:pending_static_updates", *chunk)
+            pipe.zrem(self.redis_last_seen_moving_key, *chunk)
+            pipe.zrem(self.redis_last_seen_moored_key, *chunk)
+            pipe.delete(*[f"{self.redis_history_prefix}{m}" for m in chunk])
+            pipe.execute()
+
+    def _reset_stream_state(self) -> None:
+        """Estado ligado a la conexión upstream, descartado al reconectar.
+
+        `_ships` y `_seq` se conservan para que historial y secuencia sigan siendo coherentes
+        con `ais:history:*` / `ais:seq`; `_last_seen`/`_moored` también, así el sweeper sigue
+        envejeciendo (y liberando datos estáticos, detalle, índice de nombres y destinos de)
+        los barcos que no vuelvan a reportar.
+        """
+        self._last_pos.clear()
+        self._frame_updates.clear()
+        self._thin_state.clear()
+
+    def get_ship_history(self, mmsi: str) -> Optional[dict]:
+        """Historial completo de un barco bajo demanda: {id, seq, positions: [[lat, lon], ...]}."""
+        history = self._ships.get(mmsi)
+        seq = self._seq.get(mmsi, 0)
+        # La memoria sólo basta si tiene toda la ventana; tras un reinicio (seq cargada de
+        # ais:seq) la lista en memoria empieza a mitad y el historial completo está en Redis
+        if history is not None and (len(history) >= min(seq, HISTORY_MAX_POINTS) or not self.redis_client):
+            return {"id": mmsi, "seq": seq, "positions": list(history)}
+        if not self.redis_client:
+            return None
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lrange(f"{self.redis_history_prefix}{mmsi}", 0, -1)
+            pipe.hget(self.redis_seq_key, mmsi)
+            raw_points, raw_seq = pipe.execute()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching history from Redis for {mmsi}: {e}")
+            raw_points, raw_seq = None, None
+        if not raw_points:
+            return {"id": mmsi, "seq": seq, "positions": list(history)} if history is not None else None
+        positions = []
+        for raw in raw_points:
+            try:
+                val = raw.decode('utf-8') if isinstance(raw, bytes) else str(raw)
+                lat_s, lon_s = val.split(',')
+                positions.append([float(lat_s), float(lon_s)])
+            except (ValueError, AttributeError):
+                continue
+        try:
+            stored_seq = int(raw_seq) if raw_seq is not None else len(positions)
+        except (TypeError, ValueError):
+            stored_seq = len(positions)
+        return {"id": mmsi, "seq": max(seq, stored_seq), "positions": positions}
+
+    def _index_destination(self, ship_id: str, port_number: Optional[int]) -> None:
+        old = self._dest_port.get(ship_id)
+        if old == port_number:
+            return
+        if old is not None:
+            self._arrivals[old].discard(ship_id)
+            if not self._arrivals[old]:
+                del self._arrivals[old]
+            del self._dest_port[ship_id]
+        if port_number is not None:
+            self._dest_port[ship_id] = port_number
+            self._arrivals[port_number].add(ship_id)
+        if self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                if old is not None:
+                    pipe.srem(f"{self.redis_arrivals_prefix}{old}", ship_id)
+                if port_number is not None:
+                    pipe.sadd(f"{self.redis_arrivals_prefix}{port_number}", ship_id)
+                pipe.execute()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis write error (arrivals): {e}")
+
+    async def _port_data_loop(self):
+        """Mantiene el resolvedor de destinos (dataset de puertos) y la tabla de países al día."""
+        log = logging.getLogger(__name__)
+        while self._running:
+            await self._refresh_country_names()
+            try:
+                rebuilt = await asyncio.to_thread(destination_resolver.ensure, self._load_port_rows)
+                if rebuilt:
+                    # Dataset nuevo: re-resolver los destinos ya conocidos
+                    for ship_id, data in list(self._ship_static_data.items()):
+                        port_number = destination_resolver.resolve(data.get("destination"))
+                        data["destination_port_number"] = port_number
+                        self._index_destination(ship_id, port_number)
+                    log.info(f"Destinations re-resolved: {len(self._dest_port)} vessels with a known port")
+            except Exception as e:
+                log.warning(f"Error refreshing destination resolver: {e}")
+            await asyncio.sleep(self.port_data_refresh_seconds)
+
+    async def _refresh_country_names(self) -> None:
+        """Tabla MID -> país (bandera de los documentos de detalle); recarga sólo si cambió."""
+        try:
+            rebuilt = await asyncio.to_thread(country_index.ensure)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error loading country names: {e}")
+            return
+        if not rebuilt or not self._details:
+            return
+        # Documentos construidos con la tabla anterior (o antes de tenerla)
+        mmsis = list(self._details)
+        for mmsi, flag in zip(mmsis, country_index.names(mmsis)):
+            doc = self._details.get(mmsi)
+            if doc is not None and doc.get("flag") != flag:
+                doc["flag"] = flag
+                self._details_dirty.add(mmsi)
+
+    def get_ship_details(self, mmsi: str) -> Optional[dict]:
+        """Documento de detalle materializado con la última posición: memoria del bridge o un
+        pipeline (HGET `ais:details` + HGET `ais:positions`)."""
+        doc = self._details.get(mmsi)
+        if doc is not None:
+            return with_position(doc, self._last_pos.get(mmsi))
+        if not self.redis_client:
+            return None
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hget(self.redis_details_key, mmsi)
+            pipe.hget(self.redis_positions_key, mmsi)
+            raw, raw_pos = pipe.execute()
+            return with_position(json.loads(raw), _parse_point(raw_pos)) if raw else None
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching vessel details from Redis for {mmsi}: {e}")
+            return None
+
+    @staticmethod
+    def _load_port_rows():
+        with SessionLocal() as db:
+            return load_port_rows(db)
+
+    def get_arriving(self, port_number: int) -> List[dict]:
+        """Datos estáticos de los barcos cuyo destino resuelto es `port_number`."""
+        if self._running or not self.redis_client:
+            out = []
+            for mmsi in self._arrivals.get(port_number, ()):
+                data = self._ship_static_data.get(mmsi)
+                if data:
+                    out.append({**data, "mmsi": mmsi})
+            return out
+        try:
+            members = self.redis_client.smembers(f"{self.redis_arrivals_prefix}{port_number}")
+            mmsis = [x.decode('utf-8') if isinstance(x, bytes) else str(x) for x in members or ()]
+            if not mmsis:
+                return []
+            raw_list = self.redis_client.hmget("ais:static_data", mmsis)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching arrivals from Redis: {e}")
+            return []
+        out = []
+        for mmsi, raw in zip(mmsis, raw_list):
+            if not raw:
+                continue
+            try:
+                out.append({**json.loads(raw), "mmsi": mmsi})
+            except (ValueError, TypeError):
+                continue
+        return out
+
+    def search_live(self, query: str, limit: int = 10) -> List[dict]:
+        """Typeahead sobre los barcos vistos en el stream (prefijo de nombre, call sign, IMO o MMSI)."""
+        return self.name_index.search(query, limit)
+
+    def start_passive(self) -> None:
+        """Modo pasivo: mantiene el índice de nombres al día desde Redis en un hilo propio."""
+        if not self.redis_client or self._name_index_thread is not None:
+            return
+        self._name_index_stop.clear()
+        self._name_index_thread = threading.Thread(
+            target=self._name_index_loop, name="ais-name-index", daemon=True
+        )
+        self._name_index_thread.start()
+
+    def _name_index_loop(self) -> None:
+        while not self._name_index_stop.is_set():
+            self._refresh_name_index_from_redis()
+            self._name_index_stop.wait(NAME_INDEX_REFRESH_SECONDS)
+
+    def _refresh_name_index_from_redis(self) -> None:
+        # En workers sin bridge activo el índice se reconstruye desde `ais:static_data`
+        items = []
+        try:
+            for mmsi, raw in self.redis_client.hscan_iter("ais:static_data", count=1000):
+                try:
+                    mmsi = mmsi.decode() if isinstance(mmsi, bytes) else str(mmsi)
+                    items.append((mmsi, json.loads(raw)))
+                except (ValueError, TypeError):
+                    continue
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error loading vessel name index from Redis: {e}")
+            return
+        self.name_index.load(items)
+
     # NUEVO: Método para solicitar datos estáticos de un barco
     async def get_ship_static_data(self, mmsi: str, timeout: float = 30.0) -> Optional[dict]:
         """
@@ -211,19 +1016,6 @@ class AISBridgeService:
                 del self._static_data_listeners[mmsi]
             raise e
 
-    def get_vessels_by_destination(self, search_query: str) -> list[dict]:
-        """Busca barcos en memoria cuyo destino coincida parcialmente con el query."""
-        results = []
-        query_lower = search_query.lower().strip()
-        for mmsi, data in self._ship_static_data.items():
-            dest = data.get("destination", "").lower()
-            if query_lower in dest and dest != "n/a":
-                # Agregar MMSI al diccionario para conveniencia
-                vessel_info = data.copy()
-                vessel_info["mmsi"] = mmsi
-                results.append(vessel_info)
-        return results
-
     def get_ship_position(self, mmsi: str) -> Optional[Tuple[float, float]]:
         """Devuelve la última posición (lat, lon) conocida en memoria, o Redis si hay fallback."""
         # 1. Intentar memoria local
@@ -244,6 +1036,50 @@ class AISBridgeService:
                 
         return None
 
+    def get_positions_bulk(self, mmsis: List[str]) -> Dict[str, Tuple[float, float]]:
+        """Últimas posiciones de varios barcos: memoria o un único HMGET en Redis."""
+        if not mmsis:
+            return {}
+        if self._running or not self.redis_client:
+            return {m: self._last_pos[m] for m in mmsis if m in self._last_pos}
+        out: Dict[str, Tuple[float, float]] = {}
+        try:
+            raw_values = self.redis_client.hmget(self.redis_positions_key, mmsis)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching positions from Redis: {e}")
+            return out
+        for mmsi, raw in zip(mmsis, raw_values):
+            point = _parse_point(raw)
+            if point:
+                out[mmsi] = point
+        return out
+
+    def get_details_bulk(self, mmsis: List[str]) -> Tuple[Dict[str, dict], Dict[str, Tuple[float, float]]]:
+        """Documentos de detalle (con su posición) y posiciones de varios barcos: memoria + un único pipeline (2 HMGET)."""
+        docs = {m: self._details[m] for m in mmsis if m in self._details}
+        positions = {m: self._last_pos[m] for m in mmsis if m in self._last_pos}
+        missing = [m for m in mmsis if m not in docs]
+        if not missing or not self.redis_client:
+            return {m: with_position(d, positions.get(m)) for m, d in docs.items()}, positions
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hmget(self.redis_details_key, missing)
+            pipe.hmget(self.redis_positions_key, missing)
+            raw_docs, raw_positions = pipe.execute()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Error fetching vessel details from Redis: {e}")
+            return docs, positions
+        for mmsi, raw_doc, raw_pos in zip(missing, raw_docs, raw_positions):
+            if raw_doc:
+                try:
+                    docs[mmsi] = json.loads(raw_doc)
+                except (ValueError, TypeError):
+                    pass
+            point = _parse_point(raw_pos)
+            if point and mmsi not in positions:
+                positions[mmsi] = point
+        return {m: with_position(d, positions.get(m)) for m, d in docs.items()}, positions
+
     # NUEVO: Procesar datos estáticos
     def _process_static_data(self, ais_message, metadata=None):
         """Procesa datos estáticos del barco"""
@@ -520,14 +1356,14 @@ class AISBridgeService:
             
         session = SessionLocal()
         try:
-            # 1. Obtener todos los MIDs válidos para evitar ForeignKeyViolation
-            from app.db.models.marine_country import MarineCountry
-            valid_mids = {mid for (mid,) in session.query(MarineCountry.mid).all()}
+            # Bandera por MID, sólo si existe en marine_country (evita ForeignKeyViolation)
+            country_index.ensure()
+            flags = country_index.flags([item["mmsi"] for item in vessel_batch])
 
             # Preparar datos para insert
             # MarineVessel: mmsi, imo, name, type, ext_refs
             rows = []
-            for item in vessel_batch:
+            for item, flag_mid in zip(vessel_batch, flags):
                 mmsi = item["mmsi"]
                 d = item["data"]
                 
@@ -558,31 +1394,10 @@ class AISBridgeService:
                     "destination": d.get("destination"),
                     "timestamp": d.get("timestamp")
                 }
+                destination_port_number = d.get("destination_port_number")
+                if destination_port_number is None and destination_resolver.ready:
+                    destination_port_number = destination_resolver.resolve(d.get("destination"))
                 
-                # Extract MID from MMSI for the flag field (handling special formats)
-                flag_mid = None
-                if mmsi and isinstance(mmsi, str):
-                    mid_str = None
-                    if mmsi.startswith("111"):  # SAR Aircraft
-                        if len(mmsi) >= 6: mid_str = mmsi[3:6]
-                    elif mmsi.startswith("00"):  # Coast Stations
-                        if len(mmsi) >= 5: mid_str = mmsi[2:5]
-                    elif mmsi.startswith("0"):   # Group MMSI
-                        if len(mmsi) >= 4: mid_str = mmsi[1:4]
-                    elif mmsi.startswith("99") or mmsi.startswith("98"):
-                        if len(mmsi) >= 5: mid_str = mmsi[2:5]
-                    elif len(mmsi) >= 3:
-                        mid_str = mmsi[:3]
-                    
-                    if mid_str:
-                        try:
-                            possible_mid = int(mid_str)
-                            # SAFETY CHECK: Only set if it exists in marine_country
-                            if possible_mid in valid_mids:
-                                flag_mid = possible_mid
-                        except (ValueError, TypeError):
-                            flag_mid = None
-
                 rows.append({
                     "mmsi": mmsi,
                     "imo": imo_str,
@@ -591,7 +1406,14 @@ class AISBridgeService:
                     "length": length,
                     "width": width,
                     "flag": flag_mid,  # Auto-assigned from MMSI
-                    "ext_refs": ext_refs
+                    "ext_refs": ext_refs,
+                    "destination_port_number": destination_port_number,
+                    # Copia tipada de los campos consultados (indexados)
+                    "destination": _ais_text(d.get("destination"), 64),
+                    "eta": _ais_datetime(d.get("eta"), "%Y-%m-%d %H:%M"),
+                    "draught": _ais_float(d.get("draught")),
+                    "call_sign": _ais_text(d.get("call_sign"), 16),
+                    "ais_timestamp": _ais_datetime(d.get("timestamp")),
                 })
 
 
@@ -607,6 +1429,12 @@ class AISBridgeService:
                     "width": stmt.excluded.width,
                     "flag": stmt.excluded.flag,
                     "ext_refs": stmt.excluded.ext_refs,
+                    "destination_port_number": stmt.excluded.destination_port_number,
+                    "destination": stmt.excluded.destination,
+                    "eta": stmt.excluded.eta,
+                    "draught": stmt.excluded.draught,
+                    "call_sign": stmt.excluded.call_sign,
+                    "ais_timestamp": stmt.excluded.ais_timestamp,
                     "updated_at": datetime.now(timezone.utc)
 
                 }
@@ -0,0 +1,83 @@
+# thinning.py
+"""
+Adelgazamiento (thinning) de posiciones AIS en la ingesta.
+
+Los buques clase A en navegación reportan cada 2-10 s; el mapa refresca cada ~2 s, así que
+la mayoría de esos puntos no aportan nada visible. La política decide, por barco, si un
+reporte se acepta (historial, Redis, emit) o se descarta antes del fan-out.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+# TrueHeading = 511 significa "no disponible" en AIS
+HEADING_NOT_AVAILABLE = 511
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de círculo máximo en metros."""
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def heading_delta(h1: Optional[float], h2: Optional[float]) -> float:
+    """Diferencia angular mínima (0-180) entre dos rumbos; 0 si alguno falta."""
+    if h1 is None or h2 is None:
+        return 0.0
+    d = abs(h1 - h2) % 360.0
+    return 360.0 - d if d > 180.0 else d
+
+
+def report_heading(ais_message: dict) -> Optional[float]:
+    """TrueHeading si está disponible, si no Cog (ambos en grados)."""
+    th = ais_message.get("TrueHeading")
+    if th is not None and th != HEADING_NOT_AVAILABLE:
+        return float(th)
+    cog = ais_message.get("Cog")
+    if cog is None or cog >= 360:
+        return None
+    return float(cog)
+
+
+# Último punto aceptado por barco: (ts, lat, lon, heading)
+AcceptedPoint = Tuple[float, float, float, Optional[float]]
+
+
+@dataclass(frozen=True)
+class ThinningPolicy:
+    """Umbrales de aceptación. Con todo a 0 sólo se descartan posiciones idénticas.
+
+    Un reporte se acepta si es el primero del barco, o si se desplazó más de
+    `min_distance_m` y además pasó `min_interval_s` desde el último aceptado o el
+    rumbo cambió al menos `heading_delta_deg` (giros visibles en el mapa).
+    """
+
+    min_interval_s: float = 0.0
+    min_distance_m: float = 0.0
+    heading_delta_deg: float = 0.0
+
+    def accept(
+        self,
+        last: Optional[AcceptedPoint],
+        ts: float,
+        lat: float,
+        lon: float,
+        heading: Optional[float],
+    ) -> bool:
+        if last is None:
+            return True
+        last_ts, last_lat, last_lon, last_heading = last
+        if last_lat == lat and last_lon == lon:
+            return False
+        if self.min_distance_m > 0 and haversine_m(last_lat, last_lon, lat, lon) < self.min_distance_m:
+            return False
+        if ts - last_ts >= self.min_interval_s:
+            return True
+        return self.heading_delta_deg > 0 and heading_delta(last_heading, heading) >= self.heading_delta_deg
@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 from fastapi import FastAPI
 from app.config.settings import (
@@ -18,23 +19,51 @@ from app.config.settings import (
     REDIS_POOL_RETRY_ON_TIMEOUT,
 )
 from app.utils.logging_config import setup_logging
-from app.db.database import init_db
+from app.db.database import dispose_async_engine, init_db
+from app.db.routing import dispose_replica_engines, start_replica_monitor
+from app.audit.audit_writer import start_audit_writer, stop_audit_writer
+from app.observability.multiprocess import start_metrics_writer, stop_metrics_writer
 from app.utils.exception_handlers import add_global_exception_handler
 import socketio
-from app.config.settings import AISSTREAM_ENABLED, AISSTREAM_API_KEY, AISSTREAM_SINGLETON_LOCK_KEY, AISSTREAM_SINGLETON_LOCK_TTL
+from app.config.settings import (
+    AISSTREAM_ENABLED,
+    AISSTREAM_API_KEY,
+    AISSTREAM_URL,
+    AISSTREAM_FRAME_MS,
+    AISSTREAM_STALE_MOVING_SECONDS,
+    AISSTREAM_STALE_MOORED_SECONDS,
+    AISSTREAM_SWEEP_INTERVAL_SECONDS,
+    AISSTREAM_THIN_MIN_INTERVAL_SECONDS,
+    AISSTREAM_THIN_MIN_DISTANCE_METERS,
+    AISSTREAM_THIN_HEADING_DEGREES,
+    AISSTREAM_DYNAMIC_BBOX,
+    AISSTREAM_DYNAMIC_BBOX_BASE,
+    AISSTREAM_DYNAMIC_BBOX_GRID_DEG,
+    AISSTREAM_DYNAMIC_BBOX_MAX_BOXES,
+    AISSTREAM_DYNAMIC_BBOX_INTERVAL_SECONDS,
+    AISSTREAM_DYNAMIC_BBOX_SHRINK_SECONDS,
+    AISSTREAM_VIEWPORT_TTL_SECONDS,
+    AISSTREAM_ALERTS_ENABLED,
+    AISSTREAM_ALERT_RELOAD_SECONDS,
+    AISSTREAM_ALERT_CONFIRM_REPORTS,
+    AISSTREAM_ALERT_COOLDOWN_SECONDS,
+    AISSTREAM_WATCHLIST_POLL_SECONDS,
+    AISSTREAM_SINGLETON_LOCK_KEY,
+    AISSTREAM_SINGLETON_LOCK_TTL,
+)
 from redis import Redis
 import time
 from app.integrations.aisstream.service import AISBridgeService
+from app.integrations.aisstream.thinning import ThinningPolicy
+from app.integrations.aisstream.demand import DemandTracker, normalize_boxes
+from app.integrations.aisstream.alerts import AlertEngine
+from app.core.auth.session_manager import decode_token, extract_token_from_environ
 
 def add_middlewares(app):
     from starlette.middleware.trustedhost import TrustedHostMiddleware
     from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
     from starlette.middleware.gzip import GZipMiddleware
-    from app.core.middleware.request_id_middleware import RequestIdMiddleware
-    from app.core.middleware.audit_middleware import AuditMiddleware
-    from app.core.middleware.auth_middleware import AuthContextMiddleware
-    from app.core.middleware.require_auth_middleware import RequireAuthMiddleware
-    from app.core.middleware.app_switch_middleware import AppSwitchMiddleware
+    from app.core.middleware.pipeline import RequestPipelineMiddleware
     # NOTA: El orden de adición es importante en Starlette; el último añadido es el más externo.
     # Para que CORS envuelva TODAS las respuestas (incluyendo errores tempranos de otros middlewares
     # y preflight OPTIONS), añadiremos CORSMiddleware al final.
@@ -44,16 +73,9 @@ def add_middlewares(app):
         app.add_middleware(TrustedHostMiddleware, allowed_hosts=ALLOWED_HOSTS)
     app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=["*"])
     app.add_middleware(GZipMiddleware, minimum_size=500)
-    # Correlation-ID para trazabilidad
-    app.add_middleware(RequestIdMiddleware)
-    # Interruptor remoto de disponibilidad (antes de auth para bloquear pronto)
-    app.add_middleware(AppSwitchMiddleware)
-    # Auth context: decode JWT once and attach payload to request.state
-    app.add_middleware(AuthContextMiddleware)
-    # Require auth for protected prefixes while keeping public endpoints open
-    app.add_middleware(RequireAuthMiddleware)
-    # Auditoría privada de requests
-    app.add_middleware(AuditMiddleware)
+    # Pipeline ASGI puro (un solo paso por request): auth context (JWT verificado una vez),
+    # auditoría, require auth en prefijos protegidos, interruptor remoto y correlation-ID
+    app.add_middleware(RequestPipelineMiddleware)
     # Finalmente, CORS como el más externo para asegurar headers en todas las respuestas
     if CORS_ORIGINS:
         from fastapi.middleware.cors import CORSMiddleware
@@ -78,6 +100,12 @@ def add_dispatcher(app):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_logging(LOG_LEVEL)
+    # Rollups de requests y eventos de auditoría a base de datos, en bloque
+    start_audit_writer()
+    # Con varios workers, volcado periódico de métricas para que /metrics las agregue
+    start_metrics_writer()
+    # Retraso de las réplicas medido en segundo plano (fuera del camino de las lecturas)
+    start_replica_monitor()
     # Crear Socket.IO server ASGI y adjuntar a app.state
     sio_kwargs = {
         "async_mode": "asgi",
@@ -114,10 +142,47 @@ async def lifespan(app: FastAPI):
     @sio_server.event
     async def connect(sid, environ, auth=None):  # noqa: ANN001
         logging.getLogger("socketio").info("client connected sid=%s", sid)
+        # Sala por usuario para notificaciones (ais_alert); sin token se recibe sólo el feed público
+        token = extract_token_from_environ(environ, auth)
+        if token:
+            try:
+                payload = decode_token(token)
+            except Exception:  # noqa: BLE001
+                payload = None
+            sub = (payload or {}).get("sub")
+            if sub is not None:
+                await sio_server.enter_room(sid, f"user:{sub}")
 
     @sio_server.event
     async def disconnect(sid):  # noqa: ANN001
         logging.getLogger("socketio").info("client disconnected sid=%s", sid)
+        svc = getattr(app.state, "ais_bridge", None)
+        if svc is not None:
+            svc.remove_demand_area(f"sio:{sid}")
+
+    # Viewport del mapa del cliente: alimenta la suscripción dinámica (AISSTREAM_DYNAMIC_BBOX)
+    @sio_server.event
+    async def ais_viewport(sid, data):  # noqa: ANN001
+        svc = getattr(app.state, "ais_bridge", None)
+        if svc is None or not isinstance(data, dict):
+            return
+        try:
+            svc.register_viewport(
+                f"sio:{sid}",
+                float(data["west"]), float(data["south"]), float(data["east"]), float(data["north"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            return
+
+    # Historial completo bajo demanda (el cliente lo pide al detectar un hueco en `seq`)
+    @sio_server.event
+    async def ais_history(sid, data):  # noqa: ANN001
+        svc = getattr(app.state, "ais_bridge", None)
+        mmsi = str((data or {}).get("id") or "") if isinstance(data, dict) else str(data or "")
+        if svc is None or not mmsi:
+            return None
+        # Puede leer de Redis (pipeline síncrono): fuera del event loop
+        return await asyncio.to_thread(svc.get_ship_history, mmsi)
     try:
         init_db()
     except Exception as e:
@@ -154,18 +219,53 @@ async def lifespan(app: FastAPI):
                 redis_client = None
         
         # Siempre instanciamos el servicio (puede funcionar en modo pasivo leyendo de Redis)
-        bridge = AISBridgeService(sio_server, AISSTREAM_API_KEY, redis_client=redis_client)
+        bridge = AISBridgeService(
+            sio_server,
+            AISSTREAM_API_KEY,
+            redis_client=redis_client,
+            url=AISSTREAM_URL,
+            frame_ms=AISSTREAM_FRAME_MS,
+            stale_moving_seconds=AISSTREAM_STALE_MOVING_SECONDS,
+            stale_moored_seconds=AISSTREAM_STALE_MOORED_SECONDS,
+            sweep_interval_seconds=AISSTREAM_SWEEP_INTERVAL_SECONDS,
+            thinning=ThinningPolicy(
+                min_interval_s=AISSTREAM_THIN_MIN_INTERVAL_SECONDS,
+                min_distance_m=AISSTREAM_THIN_MIN_DISTANCE_METERS,
+                heading_delta_deg=AISSTREAM_THIN_HEADING_DEGREES,
+            ),
+            dynamic_bbox=AISSTREAM_DYNAMIC_BBOX,
+            demand=DemandTracker(
+                base_boxes=normalize_boxes(AISSTREAM_DYNAMIC_BBOX_BASE),
+                grid_deg=AISSTREAM_DYNAMIC_BBOX_GRID_DEG,
+                max_boxes=AISSTREAM_DYNAMIC_BBOX_MAX_BOXES,
+                shrink_delay=AISSTREAM_DYNAMIC_BBOX_SHRINK_SECONDS,
+            ),
+            dynamic_bbox_interval_seconds=AISSTREAM_DYNAMIC_BBOX_INTERVAL_SECONDS,
+            viewport_ttl_seconds=AISSTREAM_VIEWPORT_TTL_SECONDS,
+            alerts=AlertEngine(
+                confirm_reports=AISSTREAM_ALERT_CONFIRM_REPORTS,
+                cooldown_seconds=AISSTREAM_ALERT_COOLDOWN_SECONDS,
+            ) if AISSTREAM_ALERTS_ENABLED else None,
+            alert_reload_seconds=AISSTREAM_ALERT_RELOAD_SECONDS,
+            watchlist_poll_seconds=AISSTREAM_WATCHLIST_POLL_SECONDS,
+        )
         
         # Solo iniciamos la conexión (Websocket writer) si somos dueños del lock o si no hay Redis
         if (redis_client and lock_owner) or (not redis_client):
             await bridge.start()
         else:
+            bridge.start_passive()
             logging.info("AISBridgeService running in PASSIVE mode (reading positions from Redis)")
     app.state.ais_bridge = bridge
     yield
     # Apagado ordenado
     if bridge is not None:
         await bridge.stop()
+    # Último volcado de auditoría antes de cerrar los engines
+    await asyncio.to_thread(stop_audit_writer)
+    await asyncio.to_thread(stop_metrics_writer)
+    await dispose_async_engine()
+    await dispose_replica_engines()
 
 def create_app() -> FastAPI:
     app = FastAPI(
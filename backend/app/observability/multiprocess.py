@@ -0,0 +1,267 @@
+"""
+Agregación de métricas entre workers de Gunicorn.
+
+Cada worker sigue registrando en memoria (`app.utils.metrics`, sin cambios en el camino
+caliente) y un hilo `MetricsFileWriter` vuelca cada `METRICS_MULTIPROC_FLUSH_SECONDS` una
+copia a `METRICS_MULTIPROC_DIR/metrics_<pid>.json` (escritura atómica con `os.replace`).
+Al exportar, `collect()` suma los ficheros de todos los workers:
+
+- counters, timings e histogramas se suman (los valores de cada fichero son acumulados
+  desde el arranque de su worker);
+- los gauges no se vuelcan: sus callbacks (algunos hacen I/O, p. ej. SCARD en Redis) sólo
+  se evalúan al exportar, en el worker que atiende el scrape, y se exponen con su `pid`.
+  Los gauges del bridge AIS sólo existen en el worker que tiene la conexión upstream.
+
+Cuando un worker muere (hook `child_exit` de `gunicorn.conf.py`) `mark_process_dead`
+suma sus counters/timings/histogramas a `metrics_archive.json` y borra su fichero, así los
+totales no retroceden al reiniciarse workers. Se pierde como mucho el último intervalo de
+volcado del worker muerto. `reset_directory` (hook `on_starting`) limpia el directorio al
+arrancar el master.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows (sólo desarrollo; Gunicorn no corre ahí)
+    fcntl = None  # type: ignore[assignment]
+
+from app.config.settings import METRICS_MULTIPROC_DIR, METRICS_MULTIPROC_FLUSH_SECONDS
+from app.utils.metrics import collect_gauges, export_all
+
+logger = logging.getLogger("app.metrics")
+
+FILE_PREFIX = "metrics_"
+ARCHIVE_FILE = "metrics_archive.json"
+LOCK_FILE = ".lock"
+
+
+# --- Serialización (formato de export_all; +Inf se guarda como null) ---
+
+def _encode(data: dict) -> dict:
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in data["counters"].items()],
+        "timings": [
+            [name, list(labels), total, data["timing_counts"].get((name, labels), 0)]
+            for (name, labels), total in data["timings"].items()
+        ],
+        "histograms": [
+            [name, list(labels), [[None if le == float("inf") else le, c] for le, c in h["buckets"]], h["sum"], h["count"]]
+            for (name, labels), h in data["histograms"].items()
+        ],
+    }
+
+
+def _empty() -> dict:
+    return {"counters": {}, "timings": {}, "timing_counts": {}, "histograms": {}, "gauges": {}}
+
+
+def _labels(raw: Iterable) -> tuple:
+    return tuple((str(k), str(v)) for k, v in raw)
+
+
+def _merge_into(acc: dict, payload: dict) -> None:
+    """Suma un fichero decodificado a `acc` (counters, timings e histogramas)."""
+    for name, labels, value in payload.get("counters", ()):
+        key = (name, _labels(labels))
+        acc["counters"][key] = acc["counters"].get(key, 0) + value
+    for name, labels, total, count in payload.get("timings", ()):
+        key = (name, _labels(labels))
+        acc["timings"][key] = acc["timings"].get(key, 0.0) + total
+        acc["timing_counts"][key] = acc["timing_counts"].get(key, 0) + count
+    for name, labels, buckets, total, count in payload.get("histograms", ()):
+        key = (name, _labels(labels))
+        buckets = [(float("inf") if le is None else float(le), c) for le, c in buckets]
+        current = acc["histograms"].get(key)
+        if current is None:
+            acc["histograms"][key] = {"buckets": buckets, "sum": total, "count": count}
+            continue
+        if [le for le, _ in current["buckets"]] != [le for le, _ in buckets]:
+            # Buckets distintos (cambio de configuración entre reinicios): no son sumables
+            continue
+        current["buckets"] = [(le, a + b) for (le, a), (_, b) in zip(current["buckets"], buckets)]
+        current["sum"] += total
+        current["count"] += count
+
+
+# --- Ficheros ---
+
+def _pid_file(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{FILE_PREFIX}{pid}.json")
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable metrics file {path}: {e}")
+        return None
+
+
+def _write_atomic(path: str, payload: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _locked(directory: str):
+    """Lock entre procesos: el archivado de un worker muerto y la lectura no se solapan."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _worker_pids(directory: str) -> List[int]:
+    pids = []
+    for entry in os.listdir(directory):
+        if entry.startswith(FILE_PREFIX) and entry.endswith(".json") and entry != ARCHIVE_FILE:
+            try:
+                pids.append(int(entry[len(FILE_PREFIX):-len(".json")]))
+            except ValueError:
+                continue
+    return pids
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None) -> None:
+    """Pasa los acumulados de un worker terminado al archivo y borra su fichero."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory or not os.path.isdir(directory):
+        return
+    path = _pid_file(directory, pid)
+    with _locked(directory):
+        payload = _read(path)
+        if payload is not None:
+            archive_path = os.path.join(directory, ARCHIVE_FILE)
+            acc = _empty()
+            _merge_into(acc, _read(archive_path) or {})
+            _merge_into(acc, payload)
+            _write_atomic(archive_path, _encode(acc))
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def reset_directory(directory: Optional[str] = None) -> None:
+    """Crea el directorio y borra ficheros de ejecuciones anteriores (arranque del master)."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for entry in os.listdir(directory):
+        if entry.startswith(FILE_PREFIX) or entry.endswith(".tmp"):
+            try:
+                os.unlink(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+class MetricsFileWriter:
+    def __init__(self, directory: str, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = max(0.1, flush_interval)
+        self.pid = os.getpid()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            try:
+                _write_atomic(_pid_file(self.directory, self.pid), _encode(export_all(include_gauges=False)))
+            except OSError as e:
+                logger.warning(f"Metrics flush to {self.directory} failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Sin master de Gunicorn (p. ej. uvicorn --reload) nadie archiva los PIDs muertos
+        for pid in _worker_pids(self.directory):
+            if pid != self.pid and not _pid_alive(pid):
+                mark_process_dead(pid, self.directory)
+        self.flush()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        self._thread = None
+
+
+_writer: Optional[MetricsFileWriter] = None
+
+
+def start_metrics_writer() -> None:
+    global _writer
+    if not METRICS_MULTIPROC_DIR:
+        return
+    if _writer is None or _writer.pid != os.getpid():
+        _writer = MetricsFileWriter(METRICS_MULTIPROC_DIR, METRICS_MULTIPROC_FLUSH_SECONDS)
+    _writer.start()
+
+
+def stop_metrics_writer() -> None:
+    if _writer is not None:
+        _writer.stop()
+
+
+def collect() -> dict:
+    """Métricas a exportar (formato de `export_all`): agregadas entre workers si hay directorio."""
+    if _writer is None or not _writer.running:
+        return export_all()
+    # Los datos del worker que atiende el scrape, al día
+    _writer.flush()
+    acc = _empty()
+    directory = _writer.directory
+    with _locked(directory):
+        _merge_into(acc, _read(os.path.join(directory, ARCHIVE_FILE)) or {})
+        for pid in _worker_pids(directory):
+            payload = _read(_pid_file(directory, pid))
+            if payload is not None:
+                _merge_into(acc, payload)
+    pid = str(os.getpid())
+    acc["gauges"] = {(name, labels + (("pid", pid),)): value for (name, labels), value in collect_gauges().items()}
+    return acc
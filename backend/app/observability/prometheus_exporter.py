@@ -1,11 +1,21 @@
 from __future__ import annotations
 
-from typing import Dict, Tuple
+import math
+import re
+from typing import Dict, List, Tuple
 
 # Exportador simple de Prometheus (formato de texto) a partir de app.utils.metrics
 # Nota: Este exportador no usa prom-client. Es ligero y sin dependencias.
+# Con METRICS_MULTIPROC_DIR agrega las métricas de todos los workers (app.observability.multiprocess).
 
-from app.utils.metrics import export_raw
+from app.observability.multiprocess import collect
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _metric_name(name: str) -> str:
+    # "db.pool.checkout" -> "db_pool_checkout" (Prometheus sólo admite [a-zA-Z0-9_:])
+    return _INVALID_NAME_CHARS.sub("_", name)
 
 
 def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
@@ -14,46 +24,66 @@ def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
     # Escapar comillas y backslashes según referencia de Prometheus exposition format
     def esc(s: str) -> str:
         return s.replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
-    inner = ",".join(f"{k}=\"{esc(v)}\"" for k, v in labels)
+    inner = ",".join(f"{_metric_name(k)}=\"{esc(v)}\"" for k, v in labels)
     return f"{{{inner}}}"
 
 
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.6f}".rstrip("0")
+
+
+def _le(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
 def render_prometheus_text() -> str:
-    counters, timings = export_raw()
+    data = collect()
+    # Cada familia se emite completa (HELP, TYPE y sus muestras) en un bloque
+    families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def family(name: str, kind: str, help_text: str) -> List[str]:
+        if name not in families:
+            families[name] = (kind, help_text, [])
+        return families[name][2]
+
     # counters: Dict[(name, labels_tuple), int]
-    # timings: Dict[(name, labels_tuple), float]  acumulado en segundos
-    lines: list[str] = []
-
-    # Emitir HELP/TYPE para familias detectadas
-    seen_counter: set[str] = set()
-    seen_summary: set[str] = set()
-
-    for (name, _labels), _ in counters.items():
-        if name not in seen_counter:
-            lines.append(f"# HELP {name} Counter metric")
-            lines.append(f"# TYPE {name} counter")
-            seen_counter.add(name)
-
-    for (name, _labels), _ in timings.items():
-        # Usaremos sufijos: _seconds_total y _seconds_count para una aproximación de summary
-        base = f"{name}_seconds"
-        if base not in seen_summary:
-            lines.append(f"# HELP {base} Total observed seconds (accumulated)")
-            lines.append(f"# TYPE {base}_total counter")
-            lines.append(f"# TYPE {base}_count counter")
-            seen_summary.add(base)
-
-    # Counters
-    for (name, labels), value in counters.items():
+    for (name, labels), value in data["counters"].items():
+        metric = _metric_name(name)
+        family(metric, "counter", "Counter metric").append(f"{metric}{_format_labels(labels)} {int(value)}")
+
+    # timings: total acumulado en segundos (_total, compatible con versiones previas) y observaciones (_count)
+    counts = data["timing_counts"]
+    for (name, labels), total_seconds in data["timings"].items():
+        base = f"{_metric_name(name)}_seconds"
         lbl = _format_labels(labels)
-        lines.append(f"{name}{lbl} {int(value)}")
+        family(f"{base}_total", "counter", "Total observed seconds (accumulated)").append(
+            f"{base}_total{lbl} {float(total_seconds):.6f}"
+        )
+        family(f"{base}_count", "counter", "Number of observations").append(
+            f"{base}_count{lbl} {int(counts.get((name, labels), 0))}"
+        )
 
-    # Timings (como total acumulado y conteo de observaciones si hay contador paralelo)
-    # No llevamos número de observaciones en el util de métricas; expondremos solo total acumulado.
-    # Para compatibilidad con scrapers, añadimos _total como acumulado y omitimos _count.
-    for (name, labels), total_seconds in timings.items():
-        base = f"{name}_seconds"
+    # histograms: buckets acumulativos + _sum + _count
+    for (name, labels), hist in data["histograms"].items():
+        metric = _metric_name(name)
+        lines = family(metric, "histogram", "Histogram metric")
+        for bound, cumulative in hist["buckets"]:
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', _le(bound)),))} {int(cumulative)}")
         lbl = _format_labels(labels)
-        lines.append(f"{base}_total{lbl} {float(total_seconds):.6f}")
+        lines.append(f"{metric}_sum{lbl} {float(hist['sum']):.6f}")
+        lines.append(f"{metric}_count{lbl} {int(hist['count'])}")
+
+    for (name, labels), value in data["gauges"].items():
+        metric = _metric_name(name)
+        family(metric, "gauge", "Gauge metric").append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
 
-    return "\n".join(lines) + "\n"
+    out: List[str] = []
+    for name, (kind, help_text, lines) in families.items():
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class PortListEntry(BaseModel):
@@ -12,3 +12,30 @@ class PortListResponse(BaseModel):
 class PortDetailsResponse(BaseModel):
     # just return the model object directly in the route and let FastAPI serialize it.
     pass
+
+class NearestPort(BaseModel):
+    port_number: int
+    name: Optional[str] = None
+    unlocode: Optional[str] = None
+    lat: float
+    lon: float
+    distance_km: float
+
+class NearestPortsResponse(BaseModel):
+    lat: float
+    lon: float
+    ports: List[NearestPort]
+
+class BulkNearestRequest(BaseModel):
+    mmsis: List[str] = Field(..., min_length=1, max_length=5000)
+    k: int = Field(1, ge=1, le=50)
+    max_km: Optional[float] = Field(None, gt=0)
+
+class BulkNearestEntry(BaseModel):
+    mmsi: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    ports: List[NearestPort]
+
+class BulkNearestResponse(BaseModel):
+    results: List[BulkNearestEntry]
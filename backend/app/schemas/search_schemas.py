@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class SearchResult(BaseModel):
+    kind: str  # "vessel" | "port"
+    label: Optional[str] = None
+    score: float
+    source: str = "db"  # "db" | "live" (visto en el stream, aún no en la base de datos)
+    # Barcos
+    mmsi: Optional[str] = None
+    imo: Optional[str] = None
+    call_sign: Optional[str] = None
+    # Puertos
+    port_number: Optional[int] = None
+    unlocode: Optional[str] = None
+    country: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    took_ms: float
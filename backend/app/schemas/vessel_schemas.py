@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, List
 
 class VesselDimensions(BaseModel):
     a: int = 0
@@ -28,3 +28,15 @@ class VesselDetailsWrapper(BaseModel):
     mmsi: str
     data: VesselData
     status: str = "success"
+
+class VesselBatchRequest(BaseModel):
+    # MMSI (9 dígitos) o IMO (7 dígitos)
+    ids: List[str] = Field(..., min_length=1, max_length=500)
+
+class VesselBatchItem(BaseModel):
+    status: str  # "success" | "success (db-fallback)" | "not_found" | "invalid" | "error"
+    mmsi: Optional[str] = None
+    data: Optional[VesselData] = None
+
+class VesselBatchResponse(BaseModel):
+    results: Dict[str, VesselBatchItem]
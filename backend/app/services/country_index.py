@@ -0,0 +1,187 @@
+"""
+Tabla MMSI -> MID -> país de bandera, compartida por ingesta, sync y `/details`.
+
+El MID (Maritime Identification Digits) sale del MMSI según la estructura ITU
+(`mid_from_mmsi`). `marine_country` es pequeña (< 1000 filas), así que se carga una vez
+por proceso en dos arrays indexados por MID (0–999): nombre del país y "existe en la
+tabla" (la FK de `marine_vessel.flag`). Resolver una bandera es indexar un array, y
+`flags`/`names` resuelven lotes de MMSI de forma vectorizada (numpy) sin Python por fila.
+
+La tabla se recarga cuando cambia `countries:dataset_version` en el caché compartido,
+que incrementa `scripts/import_countries.py`.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.adapters.cache_adapter import get_cache, set_cache
+
+logger = logging.getLogger(__name__)
+
+MID_COUNT = 1000
+DATASET_VERSION_KEY = "countries:dataset_version"
+DATASET_VERSION_TTL = 30 * 24 * 3600
+# Frecuencia máxima con la que se consulta la versión compartida
+VERSION_CHECK_INTERVAL = 30.0
+# Ancho fijo para la vista numpy de los MMSI (9 dígitos + holgura para valores raros)
+_WIDTH = 12
+
+CountryRow = Tuple[int, Optional[str]]
+
+
+def get_country_dataset_version() -> str:
+    version = get_cache(DATASET_VERSION_KEY)
+    return str(version) if version is not None else "0"
+
+
+def bump_country_dataset_version() -> str:
+    """Marca `marine_country` como modificada (los procesos recargan la tabla)."""
+    version = str(time.time_ns())
+    set_cache(DATASET_VERSION_KEY, version, DATASET_VERSION_TTL)
+    return version
+
+
+def mid_from_mmsi(mmsi) -> Optional[int]:
+    """MID de un MMSI según la estructura ITU (no comprueba que exista en `marine_country`)."""
+    if not mmsi or not isinstance(mmsi, str):
+        return None
+    if mmsi.startswith("111"):  # SAR Aircraft
+        mid = mmsi[3:6] if len(mmsi) >= 6 else None
+    elif mmsi.startswith("00"):  # Coast Stations
+        mid = mmsi[2:5] if len(mmsi) >= 5 else None
+    elif mmsi.startswith("0"):  # Group MMSI
+        mid = mmsi[1:4] if len(mmsi) >= 4 else None
+    elif mmsi.startswith("99") or mmsi.startswith("98"):  # AtoN / craft associated with parent
+        mid = mmsi[2:5] if len(mmsi) >= 5 else None
+    else:  # Standard Vessel
+        mid = mmsi[:3] if len(mmsi) >= 3 else None
+    return int(mid) if mid and mid.isdigit() else None
+
+
+def mids_from_mmsis(mmsis: Sequence) -> np.ndarray:
+    """`mid_from_mmsi` vectorizado: array int16 con -1 donde no hay MID."""
+    n = len(mmsis)
+    if n == 0:
+        return np.empty(0, dtype=np.int16)
+    raw = np.array(
+        [m.encode("ascii", "replace")[:_WIDTH] if isinstance(m, str) else b"" for m in mmsis],
+        dtype=f"S{_WIDTH}",
+    )
+    chars = raw.view(np.uint8).reshape(n, _WIDTH)
+    length = (chars != 0).sum(axis=1)
+    digits = chars.astype(np.int16) - ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+
+    c0, c1, c2 = chars[:, 0], chars[:, 1], chars[:, 2]
+    zero, one, nine, eight = ord("0"), ord("1"), ord("9"), ord("8")
+    sar = (c0 == one) & (c1 == one) & (c2 == one)
+    coast = (c0 == zero) & (c1 == zero)
+    group = (c0 == zero) & ~coast
+    aton = (c0 == nine) & ((c1 == nine) | (c1 == eight))
+    # Mismo orden de reglas que `mid_from_mmsi`
+    offset = np.select([sar, coast, group, aton], [3, 2, 1, 2], default=0)
+    min_len = np.select([sar, coast, group, aton], [6, 5, 4, 5], default=3)
+
+    rows = np.arange(n)
+    d0, d1, d2 = (digits[rows, np.minimum(offset + i, _WIDTH - 1)] for i in range(3))
+    ok = (length >= min_len) & is_digit[rows, np.minimum(offset, _WIDTH - 1)]
+    ok &= is_digit[rows, np.minimum(offset + 1, _WIDTH - 1)] & is_digit[rows, np.minimum(offset + 2, _WIDTH - 1)]
+    return np.where(ok, d0 * 100 + d1 * 10 + d2, -1).astype(np.int16)
+
+
+class CountryIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        # (nombres por MID, MID presente en marine_country); se sustituye entero al recargar
+        self._data = (np.full(MID_COUNT, None, dtype=object), np.zeros(MID_COUNT, dtype=bool))
+
+    def __len__(self) -> int:
+        return int(self._data[1].sum())
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    @property
+    def fresh(self) -> bool:
+        """True si la tabla puede usarse sin consultar la versión compartida."""
+        return self.version is not None and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL
+
+    def build(self, rows: Iterable[CountryRow], version: Optional[str] = None) -> None:
+        names = np.full(MID_COUNT, None, dtype=object)
+        known = np.zeros(MID_COUNT, dtype=bool)
+        for mid, country in rows:
+            if mid is not None and 0 <= int(mid) < MID_COUNT:
+                known[int(mid)] = True
+                names[int(mid)] = country or None
+        self._data = (names, known)
+        self.version = version
+        logger.info(f"Country index built: {int(known.sum())} MIDs (version={version})")
+
+    def ensure(self, loader: Optional[Callable[[], Iterable[CountryRow]]] = None) -> bool:
+        """Recarga si la versión compartida cambió. Devuelve True si se reconstruyó."""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            if self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return False
+            version = get_country_dataset_version()
+            rebuilt = False
+            if version != self.version:
+                try:
+                    self.build((loader or _load_country_rows)(), version)
+                    rebuilt = True
+                except Exception as e:
+                    logger.warning(f"Error loading marine_country: {e}")
+                    return False
+            self._checked_at = time.monotonic()
+        return rebuilt
+
+    # --- Un MMSI ---
+
+    def flag(self, mmsi) -> Optional[int]:
+        """MID válido para `marine_vessel.flag` (existe en `marine_country`) o None."""
+        mid = mid_from_mmsi(mmsi)
+        return mid if mid is not None and self._data[1][mid] else None
+
+    def name(self, mmsi, default: str = "N/A") -> str:
+        mid = mid_from_mmsi(mmsi)
+        if mid is None:
+            return default
+        return self._data[0][mid] or default
+
+    def known(self, mid: Optional[int]) -> bool:
+        return mid is not None and 0 <= mid < MID_COUNT and bool(self._data[1][mid])
+
+    # --- Lotes ---
+
+    def flags(self, mmsis: Sequence) -> List[Optional[int]]:
+        mids = mids_from_mmsis(mmsis)
+        known = self._data[1]
+        valid = (mids >= 0) & known[np.maximum(mids, 0)]
+        return [int(m) if ok else None for m, ok in zip(mids.tolist(), valid.tolist())]
+
+    def names(self, mmsis: Sequence, default: str = "N/A") -> List[str]:
+        mids = mids_from_mmsis(mmsis)
+        looked_up = self._data[0][np.maximum(mids, 0)]
+        return [n if n is not None and m >= 0 else default for m, n in zip(mids.tolist(), looked_up.tolist())]
+
+
+def _load_country_rows() -> List[CountryRow]:
+    # Import diferido: los modelos importan este módulo (`MarineVessel.validate_mmsi_and_set_flag`)
+    from app.db.database import SessionLocal
+    from app.db.models.marine_country import MarineCountry
+
+    with SessionLocal() as db:
+        return [(mid, country) for mid, country in db.query(MarineCountry.mid, MarineCountry.country)]
+
+
+country_index = CountryIndex()
@@ -0,0 +1,157 @@
+"""
+Resolución del destino AIS (texto libre) a `port_number` de MarinePort.
+
+El campo Destination de AIS es texto libre: "US HOU", "USHOU", "HOUSTON TX",
+"NL RTM>US HOU", "ROTTERDAM"... Se normaliza una sola vez (memoizado) y se busca por
+UN/LOCODE compacto y por nombre/nombre alternativo del puerto. El resultado se guarda en
+`marine_vessel.destination_port_number` y en el índice puerto -> barcos del bridge, de
+modo que "barcos que llegan a X" es una búsqueda indexada en lugar de `ILIKE '%x%'`.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, column, select, text, update, values
+from sqlalchemy.orm import Session
+
+from app.db import models as m
+from app.services.port_index import VERSION_CHECK_INTERVAL, get_port_dataset_version
+
+logger = logging.getLogger(__name__)
+
+_SEPARATORS = re.compile(r"[.,_\-\?/\\:;()\[\]'\"*#]+")
+_SPACES = re.compile(r"\s+")
+_LOCODE = re.compile(r"^[A-Z]{2}[A-Z2-9]{3}$")
+# Valores que no identifican un puerto
+_NOT_A_PORT = {"", "NA", "N A", "NONE", "NULL", "UNKNOWN", "FOR ORDERS", "FOR ORDER", "ORDERS", "FISHING", "TBA", "TBN"}
+RESOLVE_CACHE_MAX = 100_000
+
+PortRow = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+
+@lru_cache(maxsize=65536)
+def normalize_destination(raw: Optional[str]) -> str:
+    """Mayúsculas, sin símbolos ni espacios repetidos; en "A>B" se queda con el destino final."""
+    if not raw:
+        return ""
+    value = str(raw).upper()
+    if ">" in value:
+        tail = value.rsplit(">", 1)[1].strip()
+        value = tail or value.split(">", 1)[0]
+    value = _SEPARATORS.sub(" ", value)
+    return _SPACES.sub(" ", value).strip()
+
+
+class DestinationResolver:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        # (locode compacto -> port_number, nombre normalizado -> port_number); se sustituye entero
+        self._maps: Tuple[Dict[str, int], Dict[str, int]] = ({}, {})
+        self._cache: Dict[str, Optional[int]] = {}
+
+    def build(self, rows: Iterable[PortRow], version: Optional[str] = None) -> None:
+        by_locode: Dict[str, int] = {}
+        by_name: Dict[str, int] = {}
+        for port_number, unlocode, name, alternate_name in rows:
+            if port_number is None:
+                continue
+            if unlocode and not unlocode.startswith("PORT_"):
+                by_locode.setdefault(unlocode.replace(" ", "").upper(), int(port_number))
+            for label in (name, alternate_name):
+                key = normalize_destination(label)
+                if key:
+                    by_name.setdefault(key, int(port_number))
+        self._maps = (by_locode, by_name)
+        self._cache = {}
+        self.version = version
+        logger.info(f"Destination resolver built: {len(by_locode)} locodes, {len(by_name)} names (version={version})")
+
+    def ensure(self, loader: Callable[[], Iterable[PortRow]], force: bool = False) -> bool:
+        """Reconstruye si cambió la versión del dataset de puertos. Devuelve True si reconstruyó."""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            version = get_port_dataset_version()
+            rebuilt = force or version != self.version
+            if rebuilt:
+                self.build(loader(), version)
+            self._checked_at = time.monotonic()
+        return rebuilt
+
+    @property
+    def ready(self) -> bool:
+        return self.version is not None
+
+    def resolve(self, raw: Optional[str]) -> Optional[int]:
+        key = normalize_destination(raw)
+        if key in _NOT_A_PORT:
+            return None
+        cache = self._cache
+        if key in cache:
+            return cache[key]
+        result = self._resolve_normalized(key)
+        if len(cache) >= RESOLVE_CACHE_MAX:
+            cache.clear()
+        cache[key] = result
+        return result
+
+    def _resolve_normalized(self, key: str) -> Optional[int]:
+        by_locode, by_name = self._maps
+        compact = key.replace(" ", "")
+        # 1) UN/LOCODE completo ("US HOU", "USHOU")
+        if _LOCODE.match(compact) and compact in by_locode:
+            return by_locode[compact]
+        # 2) Nombre exacto
+        if key in by_name:
+            return by_name[key]
+        tokens = key.split(" ")
+        # 3) LOCODE al principio ("USHOU ETA 12", "US HOU ANCH")
+        for candidate in (tokens[0], "".join(tokens[:2])):
+            if _LOCODE.match(candidate) and candidate in by_locode:
+                return by_locode[candidate]
+        # 4) Nombre con sufijos ("HOUSTON TX", "ROTTERDAM ANCHORAGE")
+        for end in range(len(tokens) - 1, 0, -1):
+            prefix = " ".join(tokens[:end])
+            if prefix in by_name:
+                return by_name[prefix]
+        return None
+
+
+def load_port_rows(db: Session):
+    return db.execute(
+        select(m.MarinePort.port_number, m.MarinePort.unlocode, m.MarinePort.name, m.MarinePort.alternate_name)
+    ).all()
+
+
+def backfill_vessel_destinations(db: Session, resolver: "DestinationResolver", chunk_size: int = 1000) -> int:
+    """Recalcula `destination_port_number` de todos los barcos; sólo escribe los que cambian."""
+    rows = db.execute(
+        text("SELECT id, coalesce(destination, ext_refs->>'destination'), destination_port_number FROM marine_vessel")
+    ).all()
+    changes = []
+    for vessel_id, destination, current in rows:
+        resolved = resolver.resolve(destination)
+        if resolved != current:
+            changes.append((vessel_id, resolved))
+    for i in range(0, len(changes), chunk_size):
+        chunk = values(
+            column("id", Integer), column("port_number", Integer), name="v"
+        ).data(changes[i:i + chunk_size])
+        db.execute(
+            update(m.MarineVessel)
+            .where(m.MarineVessel.id == chunk.c.id)
+            .values(destination_port_number=chunk.c.port_number)
+        )
+    db.commit()
+    return len(changes)
+
+
+destination_resolver = DestinationResolver()
@@ -0,0 +1,146 @@
+"""
+Índice espacial en memoria de puertos (MarinePort.xcoord/ycoord) para búsquedas de cercanía.
+
+Cada puerto se guarda como vector unitario 3D; la cercanía es el producto escalar
+(cos del ángulo central), así que k-vecinos = producto matriz-vector + `argpartition`.
+Con ~3.700 puertos esto es una sola operación BLAS de microsegundos y supera a un
+KD-tree recorrido en Python; las consultas en bloque (muchos barcos) son una matmul.
+
+El índice se reconstruye cuando cambia la versión del dataset de puertos
+(`ports:dataset_version` en el caché compartido), que `/ports/sync` incrementa.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.adapters.cache_adapter import get_cache, set_cache
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+DATASET_VERSION_KEY = "ports:dataset_version"
+DATASET_VERSION_TTL = 30 * 24 * 3600
+# Frecuencia máxima con la que se consulta la versión compartida (evita un GET a Redis por request)
+VERSION_CHECK_INTERVAL = 5.0
+# Filas de consulta por bloque en búsquedas masivas (acota la matriz m x n de productos)
+QUERY_CHUNK = 1024
+
+PortRow = Tuple[int, Optional[str], Optional[str], float, float]
+
+
+def get_port_dataset_version() -> str:
+    version = get_cache(DATASET_VERSION_KEY)
+    return str(version) if version is not None else "0"
+
+
+def bump_port_dataset_version() -> str:
+    """Marca el dataset de puertos como modificado (invalida índices y cachés derivados)."""
+    version = str(time.time_ns())
+    set_cache(DATASET_VERSION_KEY, version, DATASET_VERSION_TTL)
+    return version
+
+
+def _unit_vectors(lat_deg: np.ndarray, lon_deg: np.ndarray) -> np.ndarray:
+    lat = np.radians(lat_deg)
+    lon = np.radians(lon_deg)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class PortIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[str] = None
+        self._checked_at = 0.0
+        # (xyz, port_numbers, lat, lon, names, unlocodes); se sustituye entero al reconstruir
+        self._data = (np.empty((0, 3)), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), [], [])
+
+    def __len__(self) -> int:
+        return len(self._data[1])
+
+    def build(self, rows: Iterable[PortRow], version: Optional[str] = None) -> None:
+        rows = [r for r in rows if r[0] is not None and r[3] is not None and r[4] is not None]
+        lat = np.array([float(r[3]) for r in rows], dtype=float)
+        lon = np.array([float(r[4]) for r in rows], dtype=float)
+        # Se publica todo de golpe: los lectores nunca ven un índice a medias
+        self._data = (
+            _unit_vectors(lat, lon) if rows else np.empty((0, 3)),
+            np.array([int(r[0]) for r in rows], dtype=np.int64),
+            lat,
+            lon,
+            [r[1] for r in rows],
+            [r[2] for r in rows],
+        )
+        self.version = version
+        logger.info(f"Port index built: {len(rows)} ports (version={version})")
+
+    def ensure(self, loader: Callable[[], Iterable[PortRow]]) -> "PortIndex":
+        """Reconstruye si la versión compartida cambió (consultada como mucho cada pocos segundos)."""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return self
+        with self._lock:
+            if self.version is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return self
+            version = get_port_dataset_version()
+            if version != self.version:
+                self.build(loader(), version)
+            self._checked_at = time.monotonic()
+        return self
+
+    def nearest(self, lat: float, lon: float, k: int = 5, max_km: Optional[float] = None) -> List[dict]:
+        return self.nearest_many([(lat, lon)], k=k, max_km=max_km)[0]
+
+    def nearest_many(
+        self, points: Sequence[Tuple[float, float]], k: int = 5, max_km: Optional[float] = None
+    ) -> List[List[dict]]:
+        """k puertos más cercanos para cada (lat, lon), ordenados por distancia."""
+        xyz, numbers, port_lat, port_lon, names, unlocodes = self._data
+        n = len(numbers)
+        if not len(points):
+            return []
+        if n == 0:
+            return [[] for _ in points]
+        k = max(1, min(int(k), n))
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        queries = _unit_vectors(pts[:, 0], pts[:, 1])
+        # Umbral de distancia como umbral de coseno: cos(d / R)
+        min_dot = np.cos(min(max_km / EARTH_RADIUS_KM, np.pi)) if max_km is not None else -2.0
+
+        results: List[List[dict]] = []
+        for start in range(0, len(queries), QUERY_CHUNK):
+            dots = queries[start:start + QUERY_CHUNK] @ xyz.T
+            if k == 1:
+                top = np.argmax(dots, axis=1)[:, None]
+            elif k < n:
+                top = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(n), (len(dots), n))
+            top_dots = np.take_along_axis(dots, top, axis=1)
+            order = np.argsort(-top_dots, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_dots = np.take_along_axis(top_dots, order, axis=1)
+            dist_km = EARTH_RADIUS_KM * np.arccos(np.clip(top_dots, -1.0, 1.0))
+            for row_idx, row_dots, row_km in zip(top, top_dots, dist_km):
+                out = []
+                for i, d, km in zip(row_idx.tolist(), row_dots.tolist(), row_km.tolist()):
+                    if d < min_dot:
+                        break
+                    out.append({
+                        "port_number": int(numbers[i]),
+                        "name": names[i],
+                        "unlocode": unlocodes[i],
+                        "lat": float(port_lat[i]),
+                        "lon": float(port_lon[i]),
+                        "distance_km": round(km, 3),
+                    })
+                results.append(out)
+        return results
+
+
+port_index = PortIndex()
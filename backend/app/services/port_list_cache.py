@@ -0,0 +1,137 @@
+"""
+Payload precalculado de `/ports/list` (capa de puertos del mapa).
+
+El listado sólo cambia cuando `/ports/sync` incrementa `ports:dataset_version`, así que se
+serializa una vez por versión: JSON compacto + variantes gzip/brotli y un ETag fuerte
+(hash del contenido, idéntico en todos los workers). Se guarda en memoria y en el caché
+compartido (`ports:list:{version}`); sólo el primer worker que ve una versión nueva
+consulta la base de datos. Un hit es comprobar la versión (como mucho cada
+`VERSION_CHECK_INTERVAL` segundos) y devolver bytes ya comprimidos.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+from app.services.port_index import VERSION_CHECK_INTERVAL, get_port_dataset_version
+from app.utils.adapters.cache_adapter import get_cache, set_cache
+
+try:  # brotli está en requirements; sin él (entornos locales) sólo se sirve gzip/identity
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "ports:list:{version}"
+CACHE_TTL = 7 * 24 * 3600
+
+PortListRow = Tuple[int, Optional[float], Optional[float]]
+
+
+class PortListPayload:
+    __slots__ = ("version", "etag", "variants")
+
+    def __init__(self, version: str, etag: str, variants: dict):
+        self.version = version
+        self.etag = etag
+        # encoding ("identity" | "gzip" | "br") -> bytes
+        self.variants = variants
+
+    def pick(self, accept_encoding: str) -> Tuple[str, bytes]:
+        """Mejor variante aceptada por el cliente (br > gzip > identity)."""
+        accepted = _parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+def _parse_accept_encoding(header: str) -> dict:
+    out = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[token.strip().lower()] = q
+    return out
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110): admite listas, `*` y prefijo W/."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def build_payload(rows: Iterable[PortListRow], version: str) -> PortListPayload:
+    """Mismo JSON que `PortListResponse`, serializado y comprimido una sola vez."""
+    ports = [{"port_number": n, "lon": lon, "lat": lat} for n, lon, lat in rows if n is not None]
+    raw = json.dumps({"ports": ports}, separators=(",", ":")).encode()
+    variants = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(raw, quality=11)
+    etag = '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+    return PortListPayload(version, etag, variants)
+
+
+class PortListCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._payload: Optional[PortListPayload] = None
+        self._checked_at = 0.0
+
+    def get(self, loader: Callable[[], Iterable[PortListRow]]) -> PortListPayload:
+        """Payload de la versión vigente: memoria -> caché compartido -> base de datos."""
+        payload = self._payload
+        now = time.monotonic()
+        if payload is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return payload
+        with self._lock:
+            version = get_port_dataset_version()
+            payload = self._payload
+            if payload is None or payload.version != version:
+                payload = self._load_shared(version) or self._build(loader, version)
+                self._payload = payload
+            self._checked_at = time.monotonic()
+        return payload
+
+    def _load_shared(self, version: str) -> Optional[PortListPayload]:
+        cached = get_cache(CACHE_KEY.format(version=version))
+        if not isinstance(cached, dict) or "identity" not in cached.get("variants", {}):
+            return None
+        return PortListPayload(version, cached["etag"], cached["variants"])
+
+    def _build(self, loader: Callable[[], Iterable[PortListRow]], version: str) -> PortListPayload:
+        started = time.perf_counter()
+        payload = build_payload(loader(), version)
+        set_cache(CACHE_KEY.format(version=version), {"etag": payload.etag, "variants": payload.variants}, CACHE_TTL)
+        logger.info(
+            f"Port list payload built (version={version}, {len(payload.variants['identity'])} bytes, "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms)"
+        )
+        return payload
+
+    @property
+    def fresh(self) -> bool:
+        """True si el payload en memoria puede servirse sin consultar la versión compartida."""
+        return self._payload is not None and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL
+
+
+port_list_cache = PortListCache()
@@ -0,0 +1,337 @@
+"""
+Sincronización del World Port Index (NGA) con `marine_port`.
+
+El JSON de NGA (`{"ports": [...]}`, varios MB) se lee por trozos y se decodifica puerto a
+puerto con `JSONDecoder.raw_decode`, sin materializar el documento completo. Los puertos se
+proyectan a filas de columnas (`FIELD_MAP`) por lotes y se escriben con
+`INSERT ... ON CONFLICT (port_number) DO UPDATE` por bloques: una sentencia por lote (y por
+conjunto de claves presentes) en vez de un SELECT + ~120 setattr por puerto. Como antes, sólo
+se actualizan las columnas cuya clave viene en el JSON; las ausentes conservan su valor. El `WHERE ... IS DISTINCT FROM` evita reescribir
+filas idénticas y `RETURNING (xmax = 0)` distingue altas de actualizaciones.
+
+La fuente puede ser la URL de NGA o un fichero local (`.json` o `.json.gz`) para
+sincronizar sin conexión. Todo es síncrono: desde el event loop se llama en un hilo.
+"""
+from __future__ import annotations
+
+import codecs
+import gzip
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import case, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db import models as m
+
+logger = logging.getLogger(__name__)
+
+NGA_API_URL = "https://msi.nga.mil/api/publications/world-port-index?output=json"
+
+FIELD_MAP = {
+    "portNumber": "port_number",
+    "portName": "port_name",
+    "regionNumber": "region_number",
+    "regionName": "region_name",
+    "countryCode": "country_code",
+    "countryName": "country_name",
+    "alternateName": "alternate_name",
+    "unloCode": "unlocode",
+    "globalId": "global_id",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "ycoord": "ycoord",
+    "xcoord": "xcoord",
+    "publicationNumber": "publication_number",
+    "chartNumber": "chart_number",
+    "navArea": "nav_area",
+    "dnc": "dnc",
+    "s121WaterBody": "s121_water_body",
+    "s57Enc": "s57_enc",
+    "s101Enc": "s101_enc",
+    "dodWaterBody": "dod_water_body",
+    "harborSize": "harbor_size",
+    "harborType": "harbor_type",
+    "shelter": "shelter",
+    "erTide": "er_tide",
+    "erSwell": "er_swell",
+    "erIce": "er_ice",
+    "erOther": "er_other",
+    "overheadLimits": "overhead_limits",
+    "chDepth": "ch_depth",
+    "anDepth": "an_depth",
+    "cpDepth": "cp_depth",
+    "otDepth": "ot_depth",
+    "tide": "tide",
+    "lngTerminalDepth": "lng_terminal_depth",
+    "maxVesselLength": "max_vessel_length",
+    "maxVesselBeam": "max_vessel_beam",
+    "maxVesselDraft": "max_vessel_draft",
+    "offMaxVesselLength": "off_max_vessel_length",
+    "offMaxVesselBeam": "off_max_vessel_beam",
+    "offMaxVesselDraft": "off_max_vessel_draft",
+    "entranceWidth": "entrance_width",
+    "goodHoldingGround": "good_holding_ground",
+    "turningArea": "turning_area",
+    "firstPortOfEntry": "first_port_of_entry",
+    "usRep": "us_rep",
+    "ptCompulsory": "pt_compulsory",
+    "ptAvailable": "pt_available",
+    "ptLocalAssist": "pt_local_assist",
+    "ptAdvisable": "pt_advisable",
+    "tugsSalvage": "tugs_salvage",
+    "tugsAssist": "tugs_assist",
+    "qtPratique": "qt_pratique",
+    "qtOther": "qt_other",
+    "qtSanitation": "qt_sanitation",
+    "cmTelephone": "cm_telephone",
+    "cmTelegraph": "cm_telegraph",
+    "cmRadio": "cm_radio",
+    "cmRadioTel": "cm_radio_tel",
+    "cmAir": "cm_air",
+    "cmRail": "cm_rail",
+    "loWharves": "lo_wharves",
+    "loAnchor": "lo_anchor",
+    "loMedMoor": "lo_med_moor",
+    "loBeachMoor": "lo_beach_moor",
+    "loIceMoor": "lo_ice_moor",
+    "loRoro": "lo_roro",
+    "loSolidBulk": "lo_solid_bulk",
+    "loContainer": "lo_container",
+    "loBreakBulk": "lo_break_bulk",
+    "loOilTerm": "lo_oil_term",
+    "loLongTerm": "lo_long_term",
+    "loOther": "lo_other",
+    "loDangCargo": "lo_dang_cargo",
+    "loLiquidBulk": "lo_liquid_bulk",
+    "medFacilities": "med_facilities",
+    "garbageDisposal": "garbage_disposal",
+    "degauss": "degauss",
+    "dirtyBallast": "dirty_ballast",
+    "crFixed": "cr_fixed",
+    "crMobile": "cr_mobile",
+    "crFloating": "cr_floating",
+    "cranesContainer": "cranes_container",
+    "lifts100": "lifts_100",
+    "lifts50": "lifts_50",
+    "lifts25": "lifts_25",
+    "lifts0": "lifts_0",
+    "srLongshore": "sr_longshore",
+    "srElectrical": "sr_electrical",
+    "srSteam": "sr_steam",
+    "srNavigEquip": "sr_navig_equip",
+    "srElectRepair": "sr_elect_repair",
+    "srIceBreaking": "sr_ice_breaking",
+    "srDiving": "sr_diving",
+    "suProvisions": "su_provisions",
+    "suWater": "su_water",
+    "suFuel": "su_fuel",
+    "suDiesel": "su_diesel",
+    "suDeck": "su_deck",
+    "suEngine": "su_engine",
+    "suAviationFuel": "su_aviation_fuel",
+    "repairCode": "repair_code",
+    "drydock": "drydock",
+    "railway": "railway",
+    "harborUse": "harbor_use",
+    "ukcMgmtSystem": "ukc_mgmt_system",
+    "portSecurity": "port_security",
+    "etaMessage": "eta_message",
+    "searchAndRescue": "search_and_rescue",
+    "tss": "tss",
+    "vts": "vts",
+    "cht": "cht",
+}
+
+# Lectura del origen y decodificación incremental
+READ_CHUNK_BYTES = 64 * 1024
+# Puertos por lote de mapeo / INSERT (~130 columnas por fila: lejos del límite de 65535 parámetros)
+UPSERT_CHUNK = 400
+
+_ARRAY_START = re.compile(r'"ports"\s*:\s*\[')
+_SKIP = re.compile(r"[\s,]*")
+
+
+def iter_source_chunks(source: str, timeout: float = 60.0) -> Iterator[bytes]:
+    """Bytes del origen: URL http(s) en streaming o fichero local (opcionalmente gzip)."""
+    if source.startswith(("http://", "https://")):
+        with httpx.stream("GET", source, timeout=timeout, follow_redirects=True) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(READ_CHUNK_BYTES)
+        return
+    opener = gzip.open if source.endswith(".gz") else open
+    with opener(source, "rb") as fh:
+        while True:
+            chunk = fh.read(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_ports(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Decodifica uno a uno los elementos de `"ports": [...]` a medida que llegan los bytes."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def more() -> bool:
+        nonlocal buf, pos, exhausted
+        if exhausted:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        return True
+
+    # Avanzar hasta el inicio del array de puertos
+    while True:
+        match = _ARRAY_START.search(buf)
+        if match:
+            pos = match.end()
+            break
+        # Conservar la cola por si la clave quedó partida entre dos trozos
+        pos = max(0, len(buf) - 32)
+        if not more():
+            raise ValueError('"ports" array not found in payload')
+
+    while True:
+        pos = _SKIP.match(buf, pos).end()
+        if pos >= len(buf):
+            if not more():
+                raise ValueError("Unexpected end of payload inside ports array")
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Objeto incompleto: pedir más bytes (si no hay más, el payload está truncado)
+            if not more():
+                raise
+            continue
+        pos = end
+        if isinstance(item, dict):
+            yield item
+
+
+def _batched(items: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_PORT_COLUMNS = {c.name for c in m.MarinePort.__table__.columns}
+# Pares (clave JSON, columna) resueltos una vez; se ignoran claves sin columna en el modelo
+_FIELD_PAIRS = [(j, c) for j, c in FIELD_MAP.items() if c in _PORT_COLUMNS and c != "unlocode"]
+
+
+def _coords_ewkt(x, y) -> Optional[str]:
+    try:
+        return f"SRID=4326;POINT({float(x)} {float(y)})" if x is not None and y is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def map_ports(batch: List[dict]) -> List[Tuple[dict, FrozenSet[str]]]:
+    """Lote de puertos NGA -> (fila de `marine_port`, columnas a actualizar), deduplicadas por
+    `port_number`. Sólo se actualizan las columnas cuya clave está en el JSON."""
+    pairs = _FIELD_PAIRS
+    rows: Dict[int, Tuple[dict, FrozenSet[str]]] = {}
+    for pj in batch:
+        port_num = pj.get("portNumber")
+        if not port_num:
+            continue
+        row = {c: pj[j] for j, c in pairs if j in pj}
+        if "countryName" in pj:
+            row["country"] = pj["countryName"]
+        coords = _coords_ewkt(pj.get("xcoord"), pj.get("ycoord"))
+        if coords is not None:
+            row["coords"] = coords
+        row["unlocode"] = pj.get("unloCode") or f"PORT_{port_num}"
+        # `name` es obligatorio al insertar, pero sin `portName` no se pisa el guardado
+        row["name"] = pj.get("portName") or "Unknown"
+        update = frozenset(c for c in row if c != "name" or "portName" in pj)
+        # ON CONFLICT no admite tocar la misma fila dos veces en una sentencia: gana la última
+        rows[port_num] = (row, update)
+    return list(rows.values())
+
+
+def _upsert_statement(rows: List[dict], update_columns: Iterable[str]):
+    table = m.MarinePort.__table__
+    stmt = insert(table).values(rows)
+    excluded = stmt.excluded
+    columns = sorted(c for c in update_columns if c not in ("unlocode", "port_number"))
+    set_ = {c: excluded[c] for c in columns}
+    # Un LOCODE provisional (`PORT_n`) no pisa uno real ya guardado
+    set_["unlocode"] = case(
+        (excluded.unlocode.like("PORT\\_%"), table.c.unlocode),
+        else_=excluded.unlocode,
+    )
+    changed = or_(
+        *[table.c[c].is_distinct_from(excluded[c]) for c in columns],
+        ~excluded.unlocode.like("PORT\\_%") & table.c.unlocode.is_distinct_from(excluded.unlocode),
+    )
+    return (
+        stmt.on_conflict_do_update(index_elements=[table.c.port_number], set_=set_, where=changed)
+        .returning(literal_column("(xmax = 0)").label("inserted"))
+    )
+
+
+def sync_ports_from_source(db: Session, source: str = NGA_API_URL, chunk_size: int = UPSERT_CHUNK) -> dict:
+    """Sincroniza `marine_port` desde `source` en una única transacción. Devuelve contadores y tiempos."""
+    started = time.perf_counter()
+    db_seconds = 0.0
+    added = updated = unchanged = skipped = 0
+    try:
+        for batch in _batched(iter_ports(iter_source_chunks(source)), chunk_size):
+            mapped = map_ports(batch)
+            skipped += len(batch) - len(mapped)
+            # Un VALUES multi-fila exige las mismas claves: un UPSERT por conjunto de columnas
+            groups: Dict[Tuple[FrozenSet[str], FrozenSet[str]], List[dict]] = defaultdict(list)
+            for row, update in mapped:
+                groups[(frozenset(row), update)].append(row)
+            for (_, update), rows in groups.items():
+                t0 = time.perf_counter()
+                flags = db.execute(_upsert_statement(rows, update)).scalars().all()
+                db_seconds += time.perf_counter() - t0
+                inserted = sum(1 for f in flags if f)
+                added += inserted
+                updated += len(flags) - inserted
+                unchanged += len(rows) - len(flags)
+        t0 = time.perf_counter()
+        db.commit()
+        db_seconds += time.perf_counter() - t0
+    except Exception:
+        db.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    stats = {
+        "source": source,
+        "added": added,
+        "updated": updated,
+        "unchanged": unchanged,
+        "skipped": skipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "db_seconds": round(db_seconds, 3),
+        "parse_seconds": round(elapsed - db_seconds, 3),
+    }
+    logger.info(f"Port sync finished: {stats}")
+    return stats
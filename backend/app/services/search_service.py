@@ -0,0 +1,158 @@
+"""
+Búsqueda unificada (typeahead) de barcos y puertos.
+
+Barcos: nombre, MMSI, IMO y call sign. Puertos: nombre, nombre alternativo y UN/LOCODE.
+Las consultas usan sólo predicados cubiertos por índices (migraciones `c41f0e7b2a93` y
+`f6c2b8e4d1a7`): `ILIKE '%q%'` y `%` (similitud) sobre GIN trigram para textos, y
+`LIKE 'q%'` / `upper(col) LIKE 'Q%'` sobre btree `text_pattern_ops` para identificadores
+(MMSI, IMO, UN/LOCODE) y prefijos cortos de nombre (< 3 caracteres, donde los trigramas no
+filtran). La puntuación (exacto > prefijo > prefijo de palabra > similitud)
+se calcula en la misma consulta y se ordena en SQL.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+MIN_TRGM_LENGTH = 3
+_LOCODE = re.compile(r"^[A-Z]{2}[A-Z2-9]{3}$")
+
+_VESSEL_SCORE = """
+    GREATEST(
+        CASE WHEN v.mmsi = :q OR v.imo = :q THEN 1.0
+             WHEN v.mmsi LIKE :prefix OR v.imo LIKE :prefix THEN 0.8
+             ELSE 0 END,
+        CASE WHEN upper(v.name) = :uq THEN 0.95
+             WHEN upper(v.name) LIKE :uprefix THEN 0.85
+             WHEN upper(v.name) LIKE :word_prefix THEN 0.75
+             ELSE {name_similarity} END,
+        CASE WHEN upper(v.call_sign) = :uq THEN 0.9 ELSE 0 END
+    )
+"""
+
+_PORT_SCORE = """
+    GREATEST(
+        CASE WHEN p.unlocode = :locode THEN 1.0
+             WHEN upper(p.unlocode) LIKE :uprefix THEN 0.8
+             ELSE 0 END,
+        CASE WHEN upper(p.name) = :uq OR upper(p.alternate_name) = :uq THEN 0.95
+             WHEN upper(p.name) LIKE :uprefix THEN 0.85
+             WHEN upper(p.name) LIKE :word_prefix OR upper(p.alternate_name) LIKE :uprefix THEN 0.75
+             ELSE {name_similarity} END
+    )
+"""
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _params(query: str, limit: int) -> dict:
+    q = query.strip()
+    uq = q.upper()
+    compact = re.sub(r"[^A-Z0-9]", "", uq)
+    return {
+        "q": q,
+        "uq": uq,
+        "prefix": _like_escape(q) + "%",
+        "uprefix": _like_escape(uq) + "%",
+        "word_prefix": "% " + _like_escape(uq) + "%",
+        "contains": "%" + _like_escape(q) + "%",
+        # "USHOU" / "us-hou" -> "US HOU" (formato almacenado)
+        "locode": f"{compact[:2]} {compact[2:]}" if _LOCODE.match(compact) else uq,
+        "limit": limit,
+    }
+
+
+def _vessel_search(query: str, limit: int) -> Optional[Tuple[str, dict]]:
+    params = _params(query, limit)
+    q = params["q"]
+    if not q:
+        return None
+    conditions = []
+    if q.isdigit():
+        conditions += ["v.mmsi LIKE :prefix", "v.imo LIKE :prefix"]
+    if len(q) >= MIN_TRGM_LENGTH:
+        conditions += ["v.name ILIKE :contains", "v.name % :q"]
+        similarity = "similarity(v.name, :q) * 0.7"
+    else:
+        conditions.append("upper(v.name) LIKE :uprefix")
+        similarity = "0"
+    conditions.append("upper(v.call_sign) = :uq")
+    sql = f"""
+        SELECT v.mmsi, v.imo, v.name, v.call_sign,
+               v.destination_port_number, {_VESSEL_SCORE.format(name_similarity=similarity)} AS score
+        FROM marine_vessel v
+        WHERE {" OR ".join(conditions)}
+        ORDER BY score DESC, v.name
+        LIMIT :limit
+    """
+    return sql, params
+
+
+def _port_search(query: str, limit: int) -> Optional[Tuple[str, dict]]:
+    params = _params(query, limit)
+    q = params["q"]
+    if not q:
+        return None
+    conditions = ["p.unlocode = :locode", "upper(p.unlocode) LIKE :uprefix"]
+    if len(q) >= MIN_TRGM_LENGTH:
+        conditions += ["p.name ILIKE :contains", "p.alternate_name ILIKE :contains", "p.name % :q"]
+        similarity = "GREATEST(similarity(p.name, :q), similarity(coalesce(p.alternate_name, ''), :q)) * 0.7"
+    else:
+        conditions.append("upper(p.name) LIKE :uprefix")
+        similarity = "0"
+    sql = f"""
+        SELECT p.port_number, p.name, p.alternate_name, p.unlocode, p.country,
+               p.ycoord AS lat, p.xcoord AS lon, {_PORT_SCORE.format(name_similarity=similarity)} AS score
+        FROM marine_port p
+        WHERE p.port_number IS NOT NULL AND ({" OR ".join(conditions)})
+        ORDER BY score DESC, p.name
+        LIMIT :limit
+    """
+    return sql, params
+
+
+def search_vessels(db: Session, query: str, limit: int = 10) -> List[dict]:
+    built = _vessel_search(query, limit)
+    if built is None:
+        return []
+    return [dict(row._mapping) for row in db.execute(text(built[0]), built[1])]
+
+
+def search_ports(db: Session, query: str, limit: int = 10) -> List[dict]:
+    built = _port_search(query, limit)
+    if built is None:
+        return []
+    return [dict(row._mapping) for row in db.execute(text(built[0]), built[1])]
+
+
+def best_vessel_mmsi(db: Session, query: str) -> Optional[str]:
+    """MMSI del barco mejor puntuado para `query` (nombre, IMO, call sign...)."""
+    rows = search_vessels(db, query, limit=1)
+    return rows[0]["mmsi"] if rows else None
+
+
+# --- Variantes async (rutas `async def` con `get_async_db`) ---
+
+async def search_vessels_async(db: AsyncSession, query: str, limit: int = 10) -> List[dict]:
+    built = _vessel_search(query, limit)
+    if built is None:
+        return []
+    return [dict(row._mapping) for row in await db.execute(text(built[0]), built[1])]
+
+
+async def search_ports_async(db: AsyncSession, query: str, limit: int = 10) -> List[dict]:
+    built = _port_search(query, limit)
+    if built is None:
+        return []
+    return [dict(row._mapping) for row in await db.execute(text(built[0]), built[1])]
+
+
+async def best_vessel_mmsi_async(db: AsyncSession, query: str) -> Optional[str]:
+    rows = await search_vessels_async(db, query, limit=1)
+    return rows[0]["mmsi"] if rows else None
@@ -1,14 +1,48 @@
-
 """
 Configuración de logging para la aplicación.
+
+Con `LOG_QUEUE_ENABLED` (por defecto) los handlers de consola no escriben en el hilo que
+loguea: `QueueHandler` encola el record tal cual y un `BatchQueueListener` por handler lo
+formatea y escribe desde un hilo propio, en lotes de hasta `LOG_BATCH_SIZE` líneas con un
+solo write/flush. Si la cola (`LOG_QUEUE_MAX_SIZE`) se llena, el record se descarta y se
+cuenta en `logging.dropped` en lugar de bloquear la request.
+
+`RequestLogSampler` decide qué requests se registran (ver `REQUEST_LOG_SAMPLE_RULES`): los
+endpoints de polling se muestrean y los errores y requests lentas se registran siempre.
+El JSON usa orjson si está instalado.
 """
+import atexit
 import logging
 import logging.config
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config.settings import (
+    LOG_QUEUE_ENABLED,
+    LOG_QUEUE_MAX_SIZE,
+    LOG_BATCH_SIZE,
+    REQUEST_LOG_SAMPLE_RULES,
+    REQUEST_LOG_SLOW_MS,
+    ROOT_PATH,
+)
+
+try:
+    import orjson
+
+    def _dumps(payload: dict) -> str:
+        return orjson.dumps(payload, default=str).decode("utf-8")
+except ImportError:  # pragma: no cover - orjson es opcional
+    import json
+
+    def _dumps(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
-        import json
         payload = {
             "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
             "level": record.levelname,
@@ -19,10 +53,189 @@ class JsonFormatter(logging.Formatter):
         cid = getattr(record, "correlation_id", None)
         if cid:
             payload["correlation_id"] = cid
-        return json.dumps(payload, ensure_ascii=False)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return _dumps(payload)
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler que además sabe escribir un lote de records con un solo write/flush."""
+
+    def handle_batch(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Encola sin formatear (la cola es en proceso) y descarta si está llena."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from app.utils.metrics import increment
+            increment("logging.dropped", tags={"handler": self.name or "-"})
+
+
+class BatchQueueListener(QueueListener):
+    """QueueListener que vacía la cola por lotes y los pasa a `handle_batch` del handler."""
+
+    def __init__(self, log_queue: queue.Queue, handler: logging.Handler, batch_size: int = 256):
+        super().__init__(log_queue, handler, respect_handler_level=True)
+        self.batch_size = max(1, batch_size)
+
+    def _monitor(self) -> None:
+        q = self.queue
+        handler = self.handlers[0]
+        while True:
+            batch: List[logging.LogRecord] = []
+            stop = False
+            record = q.get()
+            while True:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = q.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                if hasattr(handler, "handle_batch"):
+                    handler.handle_batch(batch)
+                else:
+                    for item in batch:
+                        self.handle(item)
+            if stop:
+                break
+
+
+class RequestLogSampler:
+    """Decide si una request se registra y con qué ratio de muestreo.
+
+    Reglas `prefijo=ratio` (coincidencia por prefijo de ruta, gana la más larga) para
+    respuestas 2xx/3xx; los errores (>= 400, o sin status) y las requests de al menos
+    `slow_ms` se registran siempre. Sin regla, ratio 1.
+    """
+
+    def __init__(self, rules: Iterable[str] = (), slow_ms: float = 1000.0, root_path: str = ""):
+        parsed: List[Tuple[str, float]] = []
+        for rule in rules:
+            prefix, _, ratio = rule.partition("=")
+            try:
+                parsed.append((prefix.strip().rstrip("/") or "/", min(1.0, max(0.0, float(ratio)))))
+            except ValueError:
+                continue
+        self.rules = sorted(parsed, key=lambda r: len(r[0]), reverse=True)
+        self.slow_ms = slow_ms
+        self.root_path = root_path or ""
+        self._rates: Dict[str, float] = {}
+
+    def rate_for(self, path: str) -> float:
+        path = path.split("?", 1)[0]
+        if self.root_path and path.startswith(self.root_path):
+            path = path[len(self.root_path):] or "/"
+        rate = self._rates.get(path)
+        if rate is None:
+            rate = 1.0
+            for prefix, ratio in self.rules:
+                if path == prefix or path.startswith(prefix + "/") or prefix == "/":
+                    rate = ratio
+                    break
+            # Acotado: las rutas con parámetros (MMSI, ids) no deben crecer sin límite
+            if len(self._rates) < 4096:
+                self._rates[path] = rate
+        return rate
+
+    def sample(self, path: str, status: int, duration_ms: Optional[float] = None) -> Optional[float]:
+        """Ratio con el que se registra la request, o None si se descarta."""
+        if not status or status >= 400:
+            return 1.0
+        if duration_ms is not None and duration_ms >= self.slow_ms:
+            return 1.0
+        rate = self.rate_for(path)
+        if rate >= 1.0:
+            return 1.0
+        if rate > 0.0 and random.random() < rate:
+            return rate
+        return None
+
+
+request_log_sampler = RequestLogSampler(REQUEST_LOG_SAMPLE_RULES, REQUEST_LOG_SLOW_MS, ROOT_PATH)
+
+
+class AccessLogSamplingFilter(logging.Filter):
+    """Aplica `request_log_sampler` al access log de uvicorn (args: client, method, path, http, status)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        args = record.args
+        if isinstance(args, tuple) and len(args) == 5:
+            try:
+                return request_log_sampler.sample(str(args[2]), int(args[4])) is not None
+            except (TypeError, ValueError):
+                return True
+        return True
+
+
+_listeners: List[QueueListener] = []
+
+
+def _stop_listeners() -> None:
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(_stop_listeners)
+
+
+def _enqueue_handlers(handlers: Dict[str, logging.Handler]) -> None:
+    """Sustituye los handlers configurados por QueueHandlers + un listener por handler."""
+    replacements: Dict[logging.Handler, logging.Handler] = {}
+    for name, target in handlers.items():
+        log_queue: queue.Queue = queue.Queue(maxsize=max(0, LOG_QUEUE_MAX_SIZE))
+        queued = _NonBlockingQueueHandler(log_queue)
+        queued.set_name(name)
+        # Los filtros (p. ej. muestreo del access log) pasan a ejecutarse antes de encolar
+        for f in list(target.filters):
+            queued.addFilter(f)
+            target.removeFilter(f)
+        listener = BatchQueueListener(log_queue, target, LOG_BATCH_SIZE)
+        listener.start()
+        _listeners.append(listener)
+        replacements[target] = queued
+    loggers = [logging.getLogger()] + [
+        lg for lg in logging.Logger.manager.loggerDict.values() if isinstance(lg, logging.Logger)
+    ]
+    for lg in loggers:
+        for i, h in enumerate(lg.handlers):
+            if h in replacements:
+                lg.handlers[i] = replacements[h]
+
 
 def setup_logging(level: str = "INFO") -> None:
     """Configura el logging global de la app y servidores ASGI."""
+    _stop_listeners()
     fmt = os.getenv("LOG_FORMAT", "text").lower()
     is_json = fmt == "json"
     logging.config.dictConfig(
@@ -39,9 +252,12 @@ def setup_logging(level: str = "INFO") -> None:
                     "format": '%(asctime)s %(levelname)s %(name)s - "%(message)s"',
                 },
             },
+            "filters": {
+                "access_sampling": {"()": AccessLogSamplingFilter},
+            },
             "handlers": {
-                "default": {"class": "logging.StreamHandler", "formatter": "default"},
-                "access": {"class": "logging.StreamHandler", "formatter": "access"},
+                "default": {"()": BatchStreamHandler, "formatter": "default"},
+                "access": {"()": BatchStreamHandler, "formatter": "access", "filters": ["access_sampling"]},
             },
             "loggers": {
                 "": {"handlers": ["default"], "level": level},
@@ -57,3 +273,12 @@ def setup_logging(level: str = "INFO") -> None:
             },
         }
     )
+    if LOG_QUEUE_ENABLED:
+        root = logging.getLogger()
+        access = logging.getLogger("uvicorn.access")
+        handlers = {}
+        if root.handlers:
+            handlers["default"] = root.handlers[0]
+        if access.handlers:
+            handlers["access"] = access.handlers[0]
+        _enqueue_handlers(handlers)
@@ -1,22 +1,44 @@
 """
-Métricas ligeras en memoria (counters/durations) con logging opcional.
+Métricas ligeras en memoria (counters, durations, histogramas y gauges) con logging opcional.
 
-Evita dependencias externas. Para producción, puede reemplazarse por Prometheus/StatsD.
+Evita dependencias externas; `app.observability.prometheus_exporter` las expone en `/metrics`.
+
+- `increment`: contador.
+- `record_duration` / `Timer`: tiempo acumulado y número de observaciones.
+- `observe`: histograma con buckets acumulativos (`_bucket`/`_sum`/`_count`); buckets por
+  defecto `METRICS_HISTOGRAM_BUCKETS`, o propios con `register_histogram`.
+- `set_gauge`: valor puntual; `register_gauge`: callback evaluado al exportar (para estado
+  que ya vive en otro sitio, sin coste en el camino caliente).
 """
 from __future__ import annotations
 
-from typing import Dict, Tuple, Optional
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple, Optional, Sequence
 import threading
 import time
 import logging
 
+from app.config.settings import METRICS_HISTOGRAM_BUCKETS
+
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+
 _lock = threading.Lock()
-_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
-_timings: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_counters: Dict[MetricKey, int] = {}
+_timings: Dict[MetricKey, float] = {}
+_timing_counts: Dict[MetricKey, int] = {}
+# name -> límites superiores (sin +Inf)
+_histogram_buckets: Dict[str, Tuple[float, ...]] = {}
+# key -> [conteos por bucket (último = +Inf, no acumulativos), suma, count]
+_histograms: Dict[MetricKey, list] = {}
+_gauges: Dict[MetricKey, float] = {}
+_gauge_callbacks: Dict[MetricKey, Callable[[], Optional[float]]] = {}
 logger = logging.getLogger("app.metrics")
 
+DEFAULT_BUCKETS: Tuple[float, ...] = tuple(sorted(METRICS_HISTOGRAM_BUCKETS))
+
 
-def _normalize_tags(tags: Optional[dict] = None) -> Tuple[Tuple[str, str], ...]:
+def _normalize_tags(tags: Optional[dict] = None) -> Labels:
     if not tags:
         return tuple()
     return tuple(sorted((str(k), str(v)) for k, v in tags.items()))
@@ -34,9 +56,47 @@ def record_duration(name: str, seconds: float, *, tags: Optional[dict] = None) -
     key = (name, _normalize_tags(tags))
     with _lock:
         _timings[key] = _timings.get(key, 0.0) + float(seconds)
+        _timing_counts[key] = _timing_counts.get(key, 0) + 1
     logger.debug("metric.duration", extra={"metric": name, "seconds": seconds, "tags": dict(tags or {})})
 
 
+def register_histogram(name: str, buckets: Sequence[float]) -> None:
+    """Fija los buckets de un histograma (antes de la primera observación)."""
+    with _lock:
+        _histogram_buckets[name] = tuple(sorted(float(b) for b in buckets))
+
+
+def observe(name: str, value: float, *, tags: Optional[dict] = None) -> None:
+    key = (name, _normalize_tags(tags))
+    value = float(value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            bounds = _histogram_buckets.setdefault(name, DEFAULT_BUCKETS)
+            hist = _histograms[key] = [[0] * (len(bounds) + 1), 0.0, 0]
+        else:
+            bounds = _histogram_buckets[name]
+        hist[0][bisect_left(bounds, value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+def set_gauge(name: str, value: float, *, tags: Optional[dict] = None) -> None:
+    with _lock:
+        _gauges[(name, _normalize_tags(tags))] = float(value)
+
+
+def register_gauge(name: str, fn: Callable[[], Optional[float]], *, tags: Optional[dict] = None) -> None:
+    """Gauge calculado al exportar. `fn` devuelve el valor o None para omitirlo."""
+    with _lock:
+        _gauge_callbacks[(name, _normalize_tags(tags))] = fn
+
+
+def unregister_gauge(name: str, *, tags: Optional[dict] = None) -> None:
+    with _lock:
+        _gauge_callbacks.pop((name, _normalize_tags(tags)), None)
+
+
 class Timer:
     def __init__(self, name: str, *, tags: Optional[dict] = None):
         self.name = name
@@ -56,15 +116,66 @@ class Timer:
         return False
 
 
+def collect_gauges() -> Dict[MetricKey, float]:
+    """Valores actuales de los gauges (evalúa los callbacks registrados)."""
+    with _lock:
+        gauges = dict(_gauges)
+        callbacks = list(_gauge_callbacks.items())
+    for key, fn in callbacks:
+        try:
+            value = fn()
+        except Exception as e:
+            logger.debug(f"Gauge {key[0]} failed: {e}")
+            continue
+        if value is not None:
+            gauges[key] = float(value)
+    return gauges
+
+
 def snapshot() -> dict:
     """Devuelve una copia simple de counters y timings para depuración."""
-    with _lock:
-        return {
-            "counters": {str(k): v for k, v in _counters.items()},
-            "timings": {str(k): v for k, v in _timings.items()},
-        }
+    data = export_all()
+    return {
+        "counters": {str(k): v for k, v in data["counters"].items()},
+        "timings": {str(k): v for k, v in data["timings"].items()},
+        "timing_counts": {str(k): v for k, v in data["timing_counts"].items()},
+        "histograms": {
+            str(k): {"sum": h["sum"], "count": h["count"]} for k, h in data["histograms"].items()
+        },
+        "gauges": {str(k): v for k, v in data["gauges"].items()},
+    }
+
 
 def export_raw():
     """Devuelve copias inmutables (shallow) para exportadores de métricas."""
     with _lock:
         return dict(_counters), dict(_timings)
+
+
+def export_all(include_gauges: bool = True) -> dict:
+    """Copia de todas las métricas para exportadores.
+
+    histograms: key -> {"buckets": [(le, conteo acumulado)...] (incluye +Inf), "sum", "count"}
+    Con `include_gauges=False` no se evalúan los callbacks de gauges (pueden hacer I/O).
+    """
+    with _lock:
+        counters = dict(_counters)
+        timings = dict(_timings)
+        timing_counts = dict(_timing_counts)
+        raw_histograms = [(key, list(h[0]), h[1], h[2]) for key, h in _histograms.items()]
+        bounds_by_name = dict(_histogram_buckets)
+    histograms = {}
+    for key, counts, total, count in raw_histograms:
+        bounds: List[float] = list(bounds_by_name[key[0]]) + [float("inf")]
+        cumulative, running = [], 0
+        for le, c in zip(bounds, counts):
+            running += c
+            cumulative.append((le, running))
+        histograms[key] = {"buckets": cumulative, "sum": total, "count": count}
+    return {
+        "counters": counters,
+        "timings": timings,
+        "timing_counts": timing_counts,
+        "histograms": histograms,
+        "gauges": collect_gauges() if include_gauges else {},
+    }
@@ -1,4 +1,6 @@
 import multiprocessing
+import os
+import tempfile
 
 bind = "0.0.0.0:8000"
 # Con Redis como message queue para Socket.IO podemos volver a calcular workers
@@ -10,3 +12,23 @@ errorlog = "-"
 loglevel = "info"
 # Timeout generoso por integraciones externas (p. ej. Odoo)
 timeout = 240
+
+# Métricas multiproceso: cada worker vuelca las suyas a este directorio y /metrics las agrega
+# (ver app/observability/multiprocess.py). Se hereda por los workers al hacer fork.
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "marine-metrics"))
+
+
+def on_starting(server):
+    from app.observability.multiprocess import reset_directory
+
+    reset_directory(os.environ["METRICS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    # Conserva los acumulados del worker terminado para que los totales no retrocedan
+    try:
+        from app.observability.multiprocess import mark_process_dead
+
+        mark_process_dead(worker.pid, os.environ["METRICS_MULTIPROC_DIR"])
+    except Exception as e:
+        server.log.warning(f"Could not archive metrics of worker {worker.pid}: {e}")
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Sustituto local de AISStream (wss://stream.aisstream.io/v0/stream).
+
+Permite alimentar `AISBridgeService` sin depender del feed real, p. ej. para medir
+throughput de ingesta offline. Tres modos:
+
+- record:    se conecta al feed real y graba la sesión en un fichero JSONL comprimido (gzip).
+- replay:    levanta un servidor websocket local que reproduce una grabación a N× velocidad.
+- synthetic: levanta un servidor websocket local que genera una flota sintética de K barcos
+             a M mensajes/s con una mezcla realista de PositionReport / ShipStaticData.
+
+El servidor habla el protocolo de suscripción de aisstream: espera un primer mensaje JSON con
+`APIKey`, `BoundingBoxes` y opcionalmente `FilterMessageTypes` / `FiltersShipMMSI`, y sólo
+envía los mensajes que cumplan esos filtros. Para apuntar el bridge al sustituto:
+
+    AISSTREAM_URL=ws://127.0.0.1:8765 AISSTREAM_API_KEY=local uvicorn app.main:asgi
+
+Ejemplos:
+
+    python scripts/aisstream_standin.py record --out sesion.jsonl.gz --duration 600
+    python scripts/aisstream_standin.py replay --file sesion.jsonl.gz --speed 10 --loop
+    python scripts/aisstream_standin.py synthetic --vessels 5000 --rate 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+import websockets
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("aisstream_standin")
+
+UPSTREAM_URL = "wss://stream.aisstream.io/v0/stream"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# MIDs frecuentes en el feed real (Panamá, Liberia, Marshall, Malta, Singapur, China, Grecia, NL...)
+_COMMON_MIDS = [351, 352, 353, 354, 355, 356, 357, 370, 371, 372, 636, 538, 248, 249, 256, 563, 564, 565,
+                412, 413, 414, 477, 240, 241, 244, 245, 246, 311, 366, 367, 368, 338, 232, 235, 211, 218, 219]
+# Destinos típicos tal y como los escriben las tripulaciones (UN/LOCODE, nombres, rutas "A>B")
+_DESTINATIONS = ["NLRTM", "NL RTM", "ROTTERDAM", "SGSIN", "SINGAPORE", "CNSHA", "SHANGHAI", "USHOU",
+                 "HOUSTON", "BEANR", "ANTWERP", "PAPTY", "BALBOA", "DEHAM", "HAMBURG", "ESALG",
+                 "ALGECIRAS", "BRSSZ", "SANTOS", "AEJEA", "JEBEL ALI", "USNYC", "NEW YORK",
+                 "VELAG", "LA GUAIRA", "BEANR>NLRTM", "FOR ORDERS", ""]
+# Tipos de buque (códigos AIS) ponderados: cargo y tanker dominan
+_SHIP_TYPES = [70, 70, 70, 71, 79, 80, 80, 81, 89, 60, 69, 30, 31, 52, 36, 37, 90]
+# Estados de navegación considerados "amarrado/fondeado"
+_MOORED_STATUSES = (1, 5)
+
+
+def _time_utc(ts: Optional[float] = None) -> str:
+    """Formato de `MetaData.time_utc` de aisstream: '2026-02-10 19:35:22.440065091 +0000 UTC'."""
+    dt = datetime.fromtimestamp(ts if ts is not None else time.time(), tz=timezone.utc)
+    return dt.strftime("%Y-%m-%d %H:%M:%S.%f") + "000 +0000 UTC"
+
+
+# --- Filtros de suscripción ---
+
+def _normalize_boxes(raw) -> List[Tuple[float, float, float, float]]:
+    """Convierte `BoundingBoxes` ([[[lat1, lon1], [lat2, lon2]], ...]) a (south, west, north, east)."""
+    boxes: List[Tuple[float, float, float, float]] = []
+    for box in raw or []:
+        try:
+            (lat1, lon1), (lat2, lon2) = box
+            boxes.append((min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)))
+        except (TypeError, ValueError):
+            continue
+    return boxes
+
+
+class Subscription:
+    """Filtros de una conexión cliente según el mensaje de suscripción de aisstream."""
+
+    def __init__(self, message: dict):
+        self.update(message)
+
+    def update(self, message: dict) -> None:
+        """Aplica un mensaje de suscripción (el inicial o una renegociación en la misma conexión)."""
+        self.api_key = message.get("APIKey")
+        self.boxes = _normalize_boxes(message.get("BoundingBoxes"))
+        self.types = set(message.get("FilterMessageTypes") or [])
+        self.mmsis = {str(x) for x in (message.get("FiltersShipMMSI") or [])}
+
+    def accepts(self, message: dict) -> bool:
+        if self.types and message.get("MessageType") not in self.types:
+            return False
+        meta = message.get("MetaData") or {}
+        if self.mmsis and str(meta.get("MMSI")) not in self.mmsis:
+            return False
+        lat, lon = meta.get("latitude"), meta.get("longitude")
+        if lat is None or lon is None:
+            return True
+        for south, west, north, east in self.boxes:
+            if south <= lat <= north and west <= lon <= east:
+                return True
+        return False
+
+
+# --- Flota sintética ---
+
+class _Vessel:
+    __slots__ = ("mmsi", "name", "call_sign", "imo", "ship_type", "lat", "lon", "sog", "cog",
+                 "nav_status", "dims", "destination", "draught", "eta", "last_ts")
+
+    def __init__(self, rnd: random.Random, now: float):
+        self.mmsi = rnd.choice(_COMMON_MIDS) * 1_000_000 + rnd.randint(0, 999_999)
+        self.name = f"SYNTH {rnd.choice(['STAR', 'OCEAN', 'SPIRIT', 'TRADER', 'EXPRESS', 'GLORY', 'PIONEER'])} {rnd.randint(1, 999)}"
+        self.call_sign = "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(rnd.randint(4, 7)))
+        self.imo = rnd.randint(9_000_000, 9_999_999) if rnd.random() < 0.8 else 0
+        self.ship_type = rnd.choice(_SHIP_TYPES)
+        # Sesgo hacia latitudes navegables
+        self.lat = max(-70.0, min(75.0, rnd.gauss(20.0, 25.0)))
+        self.lon = rnd.uniform(-180.0, 180.0)
+        moored = rnd.random() < 0.35
+        self.nav_status = rnd.choice(_MOORED_STATUSES) if moored else 0
+        self.sog = 0.0 if moored else round(rnd.uniform(6.0, 22.0), 1)
+        self.cog = round(rnd.uniform(0.0, 359.9), 1)
+        a, b = rnd.randint(20, 250), rnd.randint(5, 80)
+        c, d = rnd.randint(3, 30), rnd.randint(3, 30)
+        self.dims = {"A": a, "B": b, "C": c, "D": d}
+        self.destination = rnd.choice(_DESTINATIONS)
+        self.draught = round(rnd.uniform(3.0, 16.0), 1)
+        eta = datetime.fromtimestamp(now + rnd.uniform(3600, 20 * 86400), tz=timezone.utc)
+        self.eta = {"Month": eta.month, "Day": eta.day, "Hour": eta.hour, "Minute": eta.minute}
+        self.last_ts = now
+
+    def advance(self, now: float, rnd: random.Random) -> None:
+        """Dead reckoning simple a partir de SOG/COG, con pequeñas variaciones de rumbo."""
+        dt = max(0.0, now - self.last_ts)
+        self.last_ts = now
+        if self.sog <= 0.0:
+            # Deriva mínima del GPS en amarre
+            self.lat += rnd.uniform(-1e-5, 1e-5)
+            self.lon += rnd.uniform(-1e-5, 1e-5)
+            return
+        self.cog = (self.cog + rnd.uniform(-2.0, 2.0)) % 360.0
+        dist_deg = (self.sog * 1852.0 * dt) / 111_320.0
+        self.lat += dist_deg * math.cos(math.radians(self.cog))
+        self.lon += dist_deg * math.sin(math.radians(self.cog)) / max(0.05, math.cos(math.radians(self.lat)))
+        if self.lat > 80.0 or self.lat < -75.0:
+            self.cog = (180.0 - self.cog) % 360.0
+            self.lat = max(-75.0, min(80.0, self.lat))
+        if self.lon > 180.0:
+            self.lon -= 360.0
+        elif self.lon < -180.0:
+            self.lon += 360.0
+
+    def _meta(self, now: float) -> dict:
+        return {
+            "MMSI": self.mmsi,
+            "MMSI_String": self.mmsi,
+            "ShipName": self.name,
+            "latitude": round(self.lat, 6),
+            "longitude": round(self.lon, 6),
+            "time_utc": _time_utc(now),
+        }
+
+    def position_report(self, now: float) -> dict:
+        heading = int(round(self.cog)) % 360 if self.sog > 0 else 511
+        return {
+            "Message": {
+                "PositionReport": {
+                    "Cog": round(self.cog, 1),
+                    "CommunicationState": 0,
+                    "Latitude": round(self.lat, 6),
+                    "Longitude": round(self.lon, 6),
+                    "MessageID": 1,
+                    "NavigationalStatus": self.nav_status,
+                    "PositionAccuracy": True,
+                    "Raim": False,
+                    "RateOfTurn": 0,
+                    "RepeatIndicator": 0,
+                    "Sog": self.sog,
+                    "Spare": 0,
+                    "SpecialManoeuvreIndicator": 0,
+                    "Timestamp": int(now) % 60,
+                    "TrueHeading": heading,
+                    "UserID": self.mmsi,
+                    "Valid": True,
+                }
+            },
+            "MessageType": "PositionReport",
+            "MetaData": self._meta(now),
+        }
+
+    def static_data(self, now: float) -> dict:
+        return {
+            "Message": {
+                "ShipStaticData": {
+                    "AisVersion": 2,
+                    "CallSign": self.call_sign,
+                    "Destination": self.destination,
+                    "Dimension": dict(self.dims),
+                    "Dte": False,
+                    "Eta": dict(self.eta),
+                    "FixType": 1,
+                    "ImoNumber": self.imo,
+                    "MaximumStaticDraught": self.draught,
+                    "MessageID": 5,
+                    "Name": self.name,
+                    "RepeatIndicator": 0,
+                    "Spare": False,
+                    "Type": self.ship_type,
+                    "UserID": self.mmsi,
+                    "Valid": True,
+                }
+            },
+            "MessageType": "ShipStaticData",
+            "MetaData": self._meta(now),
+        }
+
+
+class SyntheticFleet:
+    """Genera mensajes aisstream para una flota de K barcos.
+
+    `static_ratio` es la fracción de mensajes ShipStaticData (en el feed real ronda el 5-10%).
+    Los barcos en ruta reportan más a menudo que los amarrados, como ocurre con Class A.
+    """
+
+    def __init__(self, vessels: int, static_ratio: float = 0.08, seed: Optional[int] = None):
+        self._rnd = random.Random(seed)
+        now = time.time()
+        self.vessels = [_Vessel(self._rnd, now) for _ in range(max(1, vessels))]
+        self.static_ratio = max(0.0, min(1.0, static_ratio))
+        # Pesos de selección: en ruta (~2-10 s) frente a amarrado (~3 min)
+        self._weights = [10.0 if v.sog > 0 else 1.0 for v in self.vessels]
+
+    def next_message(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        vessel = self._rnd.choices(self.vessels, weights=self._weights, k=1)[0]
+        vessel.advance(now, self._rnd)
+        if self._rnd.random() < self.static_ratio:
+            return vessel.static_data(now)
+        return vessel.position_report(now)
+
+    def iter_messages(self, count: int) -> Iterator[dict]:
+        for _ in range(count):
+            yield self.next_message()
+
+
+# --- Grabaciones ---
+
+def iter_recording(path: str) -> Iterator[Tuple[float, str]]:
+    """Itera (offset_segundos, mensaje_raw) de una grabación JSONL (gzip opcional)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fh:  # type: ignore[operator]
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+                yield float(item["t"]), item["m"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+
+async def record(url: str, api_key: str, out: str, boxes, types: List[str], duration: float, max_messages: int) -> int:
+    """Graba una sesión real del feed en `out` (JSONL gzip: {"t": offset, "m": raw})."""
+    count = 0
+    t0 = time.monotonic()
+    async with websockets.connect(url, ping_interval=20, ping_timeout=30) as ws:
+        subscribe = {"APIKey": api_key, "BoundingBoxes": boxes}
+        if types:
+            subscribe["FilterMessageTypes"] = types
+        await ws.send(json.dumps(subscribe))
+        log.info("Grabando %s -> %s", url, out)
+        with gzip.open(out, "wt", encoding="utf-8") as fh:
+            while True:
+                remaining = duration - (time.monotonic() - t0) if duration > 0 else None
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if isinstance(raw, bytes):
+                    raw = raw.decode("utf-8", "replace")
+                fh.write(json.dumps({"t": round(time.monotonic() - t0, 4), "m": raw}, ensure_ascii=False) + "\n")
+                count += 1
+                if count % 10000 == 0:
+                    log.info("%d mensajes grabados", count)
+                if max_messages and count >= max_messages:
+                    break
+    log.info("Grabación terminada: %d mensajes en %.1fs", count, time.monotonic() - t0)
+    return count
+
+
+# --- Fuentes del servidor ---
+
+async def replay_source(path: str, speed: float, loop: bool) -> AsyncIterator[str]:
+    """Reproduce una grabación respetando los offsets originales divididos por `speed` (0 = sin pausa)."""
+    while True:
+        t0 = time.monotonic()
+        for offset, raw in iter_recording(path):
+            if speed > 0:
+                delay = offset / speed - (time.monotonic() - t0)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield raw
+        if not loop:
+            return
+
+
+async def synthetic_source(fleet: SyntheticFleet, rate: float, limit: int = 0) -> AsyncIterator[str]:
+    """Emite mensajes sintéticos a `rate` mensajes/s (0 = tan rápido como sea posible)."""
+    sent = 0
+    t0 = time.monotonic()
+    while not limit or sent < limit:
+        if rate > 0:
+            due = int((time.monotonic() - t0) * rate) - sent
+            if due <= 0:
+                await asyncio.sleep(min(0.01, 1.0 / rate))
+                continue
+        else:
+            due = 256
+            await asyncio.sleep(0)
+        for _ in range(due):
+            yield json.dumps(fleet.next_message())
+            sent += 1
+            if limit and sent >= limit:
+                return
+
+
+class StandinServer:
+    """Servidor websocket local compatible con el protocolo de suscripción de aisstream.
+
+    `source_factory` devuelve un iterador asíncrono nuevo de mensajes raw por cada conexión.
+    """
+
+    def __init__(self, source_factory, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.source_factory = source_factory
+        self.host = host
+        self.port = port
+        self.sent = 0
+        self.resubscriptions = 0
+        self._server = None
+
+    async def _handler(self, websocket, path=None):  # noqa: ANN001 - firma de websockets 10.x
+        try:
+            first = await asyncio.wait_for(websocket.recv(), timeout=10)
+            subscription = Subscription(json.loads(first))
+        except Exception:
+            await websocket.close(code=1008, reason="invalid subscription")
+            return
+        if not subscription.api_key:
+            await websocket.send(json.dumps({"error": "Api Key Is Not Valid"}))
+            await websocket.close()
+            return
+        log.info("Cliente suscrito: boxes=%d types=%s", len(subscription.boxes), sorted(subscription.types) or "*")
+        # La fuente puede quedarse esperando (replay en pausa); cortar en cuanto se cierre el socket
+        pump = asyncio.ensure_future(self._pump(websocket, subscription))
+        closed = asyncio.ensure_future(websocket.wait_closed())
+        listen = asyncio.ensure_future(self._listen(websocket, subscription))
+        try:
+            await asyncio.wait({pump, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (pump, closed, listen):
+                task.cancel()
+        log.info("Cliente desconectado (enviados=%d)", self.sent)
+
+    async def _listen(self, websocket, subscription: Subscription) -> None:  # noqa: ANN001
+        # Como aisstream, un nuevo mensaje de suscripción reemplaza los filtros sin reconectar
+        try:
+            async for raw in websocket:
+                try:
+                    subscription.update(json.loads(raw))
+                except (ValueError, AttributeError):
+                    continue
+                self.resubscriptions += 1
+                log.info("Suscripción actualizada: boxes=%d", len(subscription.boxes))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _pump(self, websocket, subscription: Subscription) -> None:  # noqa: ANN001
+        try:
+            async for raw in self.source_factory():
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                if not subscription.accepts(message):
+                    continue
+                await websocket.send(raw)
+                self.sent += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def start(self) -> None:
+        self._server = await websockets.serve(self._handler, self.host, self.port, max_size=None)
+        # Puerto efectivo (si se pidió 0)
+        sockets = getattr(self._server, "sockets", None) or []
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        log.info("Sustituto AISStream escuchando en ws://%s:%d", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await asyncio.Future()
+        finally:
+            await self.stop()
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sustituto local de AISStream (record / replay / synthetic)")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_rec = sub.add_parser("record", help="Grabar una sesión real del feed")
+    p_rec.add_argument("--url", default=os.getenv("AISSTREAM_UPSTREAM_URL", UPSTREAM_URL))
+    p_rec.add_argument("--api-key", default=os.getenv("AISSTREAM_API_KEY"))
+    p_rec.add_argument("--out", required=True, help="Fichero de salida (.jsonl.gz)")
+    p_rec.add_argument("--bbox", default="[[[-90, -180], [90, 180]]]", help="BoundingBoxes en JSON")
+    p_rec.add_argument("--types", default="PositionReport,ShipStaticData")
+    p_rec.add_argument("--duration", type=float, default=300.0, help="Segundos a grabar (0 = sin límite)")
+    p_rec.add_argument("--max-messages", type=int, default=0)
+
+    for name, help_text in (("replay", "Reproducir una grabación"), ("synthetic", "Generar una flota sintética")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--host", default=DEFAULT_HOST)
+        p.add_argument("--port", type=int, default=DEFAULT_PORT)
+        if name == "replay":
+            p.add_argument("--file", required=True)
+            p.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad (0 = sin pausas)")
+            p.add_argument("--loop", action="store_true")
+        else:
+            p.add_argument("--vessels", type=int, default=1000, help="K barcos en la flota")
+            p.add_argument("--rate", type=float, default=500.0, help="M mensajes por segundo (0 = máximo)")
+            p.add_argument("--static-ratio", type=float, default=0.08)
+            p.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    if args.mode == "record":
+        if not args.api_key:
+            raise SystemExit("Se requiere --api-key o AISSTREAM_API_KEY para grabar el feed real")
+        types = [t.strip() for t in args.types.split(",") if t.strip()]
+        asyncio.run(record(args.url, args.api_key, args.out, json.loads(args.bbox), types,
+                           args.duration, args.max_messages))
+        return
+    if args.mode == "replay":
+        server = StandinServer(lambda: replay_source(args.file, args.speed, args.loop), args.host, args.port)
+    else:
+        fleet = SyntheticFleet(args.vessels, static_ratio=args.static_ratio, seed=args.seed)
+        server = StandinServer(lambda: synthetic_source(fleet, args.rate), args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmark reproducible del pipeline AIS de punta a punta.
+
+Levanta el sustituto local de AISStream (scripts/aisstream_standin.py) en un puerto libre,
+conecta un `AISBridgeService` real contra él y mide:
+
+- msgs/s procesados y latencia por mensaje (p50/p99) en `_handle_message`
+- latencia extremo a extremo (generación -> procesado) con la fuente sintética
+- lag del event loop (p50/p99/max)
+- crecimiento de RSS del proceso
+- coste de los emits de Socket.IO (tiempo y bytes serializados por evento)
+- `_upsert_vessels_to_db` (lotes de 50, como el syncer) y `get_positions_page` (activo y pasivo/Redis)
+
+Pensado para correr contra los contenedores de `docker-compose.test.yml`:
+
+    docker compose -f docker-compose.test.yml up -d db redis
+    REDIS_URL=redis://127.0.0.1:6380/0 POSTGRES_HOST=127.0.0.1 POSTGRES_PORT=5433 \\
+        python scripts/benchmark_ais_pipeline.py --messages 200000 --vessels 5000 --rate 0
+
+El resultado se guarda como JSON (por defecto en benchmarks/results/) para comparar ejecuciones.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from aisstream_standin import (  # noqa: E402
+    StandinServer,
+    SyntheticFleet,
+    replay_source,
+    synthetic_source,
+)
+
+log = logging.getLogger("benchmark_ais_pipeline")
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * (pct / 100.0)
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _summary(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 4),
+        "p50": round(_percentile(values, 50), 4),
+        "p99": round(_percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def _rss_kb() -> Optional[int]:
+    """RSS actual (Linux /proc); fallback al pico de getrusage."""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    except Exception:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _parse_time_utc(value: str) -> Optional[float]:
+    try:
+        return datetime.strptime(value[:26], "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+class EmitRecorder:
+    """Envuelve un AsyncServer de Socket.IO midiendo tiempo y bytes por evento."""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.stats: dict = {}
+
+    async def emit(self, event, data=None, *args, **kwargs):  # noqa: ANN001
+        t0 = time.perf_counter()
+        # Coste de serialización equivalente al paquete Socket.IO (json.dumps una vez por emit)
+        size = len(json.dumps(data, separators=(",", ":")))
+        if self.inner is not None:
+            await self.inner.emit(event, data, *args, **kwargs)
+        dt_ms = (time.perf_counter() - t0) * 1000.0
+        entry = self.stats.setdefault(event, {"count": 0, "bytes": 0, "ms": []})
+        entry["count"] += 1
+        entry["bytes"] += size
+        entry["ms"].append(dt_ms)
+
+    def __getattr__(self, item):
+        # Delegar on/enter_room/etc. al servidor real si existe
+        if self.inner is None:
+            raise AttributeError(item)
+        return getattr(self.inner, item)
+
+    def report(self) -> dict:
+        out = {}
+        for event, entry in self.stats.items():
+            out[event] = {
+                "count": entry["count"],
+                "bytes_total": entry["bytes"],
+                "bytes_per_emit": round(entry["bytes"] / entry["count"], 1) if entry["count"] else 0,
+                "emit_ms": _summary(entry["ms"]),
+            }
+        return out
+
+
+async def _hold_open(source):
+    """Mantiene la conexión abierta tras agotar la fuente (el bridge limpia su estado al reconectar)."""
+    async for raw in source:
+        yield raw
+    await asyncio.Event().wait()
+
+
+async def _loop_lag_monitor(samples: List[float], stop: asyncio.Event, interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - t0 - interval) * 1000.0))
+
+
+async def run(args) -> dict:
+    from app.integrations.aisstream.service import AISBridgeService
+    from app.integrations.aisstream.thinning import ThinningPolicy
+
+    redis_client = None
+    if args.redis_url:
+        try:
+            from redis import Redis
+            redis_client = Redis.from_url(args.redis_url)
+            redis_client.ping()
+            if args.flush_redis:
+                redis_client.delete("ais:positions", "ais:static_data", "ais:pending_static_updates")
+        except Exception as exc:
+            log.warning("Redis no disponible (%s); benchmark sin Redis", exc)
+            redis_client = None
+
+    sio_inner = None
+    if args.sio == "redis" and args.redis_url:
+        import socketio
+        sio_inner = socketio.AsyncServer(async_mode="asgi", client_manager=socketio.AsyncRedisManager(args.redis_url))
+    elif args.sio == "local":
+        import socketio
+        sio_inner = socketio.AsyncServer(async_mode="asgi")
+    sio = EmitRecorder(sio_inner)
+
+    handle_ms: List[float] = []
+    e2e_ms: List[float] = []
+    upsert_ms: List[float] = []
+    done = asyncio.Event()
+    target = args.messages
+
+    class BenchBridge(AISBridgeService):
+        processed = 0
+
+        async def _handle_message(self, message: dict) -> None:
+            t0 = time.perf_counter()
+            await super()._handle_message(message)
+            handle_ms.append((time.perf_counter() - t0) * 1000.0)
+            if args.source == "synthetic":
+                gen_ts = _parse_time_utc((message.get("MetaData") or {}).get("time_utc", ""))
+                if gen_ts is not None:
+                    e2e_ms.append((time.time() - gen_ts) * 1000.0)
+            BenchBridge.processed += 1
+            if BenchBridge.processed >= target:
+                done.set()
+
+        def _upsert_vessels_to_db(self, vessel_batch):
+            if args.no_db:
+                return
+            t0 = time.perf_counter()
+            super()._upsert_vessels_to_db(vessel_batch)
+            upsert_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    if args.source == "replay":
+        server = StandinServer(lambda: _hold_open(replay_source(args.file, args.speed, False)), "127.0.0.1", 0)
+    else:
+        fleet = SyntheticFleet(args.vessels, static_ratio=args.static_ratio, seed=args.seed)
+        server = StandinServer(lambda: _hold_open(synthetic_source(fleet, args.rate, limit=target)), "127.0.0.1", 0)
+    await server.start()
+
+    thinning = ThinningPolicy(
+        min_interval_s=args.thin_interval,
+        min_distance_m=args.thin_distance,
+        heading_delta_deg=args.thin_heading,
+    )
+    bridge = BenchBridge(sio, "benchmark", redis_client=redis_client, url=server.url, thinning=thinning)
+    lag_samples: List[float] = []
+    stop_lag = asyncio.Event()
+    lag_task = asyncio.create_task(_loop_lag_monitor(lag_samples, stop_lag))
+
+    rss_start = _rss_kb()
+    rss_peak = rss_start or 0
+    t_start = time.perf_counter()
+    await bridge.start()
+    try:
+        deadline = t_start + args.timeout
+        while not done.is_set() and time.perf_counter() < deadline:
+            try:
+                await asyncio.wait_for(done.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            rss_now = _rss_kb()
+            if rss_now:
+                rss_peak = max(rss_peak, rss_now)
+        elapsed = time.perf_counter() - t_start
+        rss_end = _rss_kb()
+
+        # --- Consultas de lectura ---
+        page_active: List[float] = []
+        for _ in range(args.page_calls):
+            t0 = time.perf_counter()
+            bridge.get_positions_page(page=1, page_size=1000)
+            page_active.append((time.perf_counter() - t0) * 1000.0)
+        page_bbox: List[float] = []
+        for _ in range(args.page_calls):
+            t0 = time.perf_counter()
+            bridge.get_positions_page(page=1, page_size=1000, bbox=(-10.0, 30.0, 30.0, 60.0))
+            page_bbox.append((time.perf_counter() - t0) * 1000.0)
+        page_passive: List[float] = []
+        if redis_client is not None:
+            passive = AISBridgeService(sio, "benchmark", redis_client=redis_client)
+            for _ in range(args.page_calls):
+                t0 = time.perf_counter()
+                passive.get_positions_page(page=1, page_size=1000)
+                page_passive.append((time.perf_counter() - t0) * 1000.0)
+
+        # --- Upserts a Postgres (lotes de 50 como el syncer) ---
+        if not args.no_db:
+            static_items = list(bridge._ship_static_data.items())[: args.upsert_batches * 50]
+            for i in range(0, len(static_items), 50):
+                batch = [{"mmsi": mmsi, "data": data} for mmsi, data in static_items[i:i + 50]]
+                await asyncio.to_thread(bridge._upsert_vessels_to_db, batch)
+    finally:
+        await bridge.stop()
+        stop_lag.set()
+        await lag_task
+        await server.stop()
+
+    processed = BenchBridge.processed
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "redis": redis_client is not None,
+        },
+        "ingest": {
+            "messages": processed,
+            "elapsed_s": round(elapsed, 3),
+            "msgs_per_s": round(processed / elapsed, 1) if elapsed > 0 else None,
+            "handle_ms": _summary(handle_ms),
+            "end_to_end_ms": _summary(e2e_ms),
+            "vessels_in_memory": len(bridge._last_pos),
+            "static_in_memory": len(bridge._ship_static_data),
+            "position_reports": dict(bridge.ingest_stats),
+        },
+        "event_loop_lag_ms": _summary(lag_samples),
+        "rss_kb": {
+            "start": rss_start,
+            "end": rss_end,
+            "peak": rss_peak,
+            "growth": (rss_end - rss_start) if (rss_end and rss_start) else None,
+        },
+        "socketio": sio.report(),
+        "db_upsert_ms": _summary(upsert_ms),
+        "get_positions_page_ms": {
+            "active": _summary(page_active),
+            "active_bbox": _summary(page_bbox),
+            "passive_redis": _summary(page_passive),
+        },
+    }
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline AIS (stand-in -> bridge -> Redis -> DB)")
+    parser.add_argument("--source", choices=("synthetic", "replay"), default="synthetic")
+    parser.add_argument("--file", help="Grabación para --source replay")
+    parser.add_argument("--speed", type=float, default=0.0, help="Velocidad de replay (0 = sin pausas)")
+    parser.add_argument("--messages", type=int, default=50000, help="Mensajes a procesar")
+    parser.add_argument("--vessels", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0.0, help="msgs/s de la fuente sintética (0 = máximo)")
+    parser.add_argument("--static-ratio", type=float, default=0.08)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://127.0.0.1:6380/0"))
+    parser.add_argument("--flush-redis", action="store_true", help="Borrar claves ais:* antes de empezar")
+    parser.add_argument("--sio", choices=("none", "local", "redis"), default="local",
+                        help="Servidor Socket.IO real detrás del medidor de emits")
+    parser.add_argument("--thin-interval", type=float, default=0.0, help="ThinningPolicy.min_interval_s (s)")
+    parser.add_argument("--thin-distance", type=float, default=0.0, help="ThinningPolicy.min_distance_m (m)")
+    parser.add_argument("--thin-heading", type=float, default=0.0, help="ThinningPolicy.heading_delta_deg (°)")
+    parser.add_argument("--no-db", action="store_true", help="No escribir en Postgres")
+    parser.add_argument("--upsert-batches", type=int, default=20)
+    parser.add_argument("--page-calls", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    args = parser.parse_args(argv)
+    if args.source == "replay" and not args.file:
+        parser.error("--source replay requiere --file")
+    return args
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    args = _parse_args(argv)
+    result = asyncio.run(run(args))
+    output = args.output
+    if not output:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = str(backend_dir / "benchmarks" / "results" / f"ais_pipeline_{stamp}.json")
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(result, fh, indent=2)
+    ingest = result["ingest"]
+    print(f"{ingest['messages']} msgs en {ingest['elapsed_s']}s -> {ingest['msgs_per_s']} msgs/s; "
+          f"handle p50={ingest['handle_ms'].get('p50')}ms p99={ingest['handle_ms'].get('p99')}ms; "
+          f"loop lag p99={result['event_loop_lag_ms'].get('p99')}ms")
+    print(f"Resultados: {output}")
+
+
+if __name__ == "__main__":
+    main()
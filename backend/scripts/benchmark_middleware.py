@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Benchmark del coste por request de la pila de middlewares.
+
+Monta el router real de `/aisstream/positions` con un servicio AIS en memoria (página fija
+de posiciones, sin Redis ni stream) y llama a la app ASGI directamente, sin red, con cada
+pila de `--stacks`:
+
+- `none`: sin middlewares (referencia)
+- `pipeline`: `RequestPipelineMiddleware` (auth context, auditoría, RequireAuth, interruptor
+  remoto y correlation-id)
+- `full`: la pila completa de `app.main.add_middlewares` (pipeline + GZip, ProxyHeaders, CORS...)
+
+Para cada pila mide latencia por request (media/p50/p99) y el overhead respecto a `none`.
+Con `--token` las requests llevan un JWT válido (coste de auth incluido).
+
+    python scripts/benchmark_middleware.py --requests 20000 --token
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import importlib  # noqa: E402
+
+from fastapi import FastAPI  # noqa: E402
+
+# Módulo del router (el paquete re-exporta el APIRouter con el mismo nombre)
+ais_router = importlib.import_module("app.integrations.aisstream.router")
+
+
+class _StaticPositions:
+    """Sustituto de `AISBridgeService` para el endpoint: página fija de posiciones."""
+
+    def __init__(self, size: int):
+        self.page = {
+            "page": 1,
+            "page_size": size,
+            "total": size,
+            "items": [
+                {"mmsi": str(200000000 + i), "lat": 10.0 + i * 1e-3, "lon": -60.0 - i * 1e-3, "sog": 12.3, "cog": 87.0}
+                for i in range(size)
+            ],
+        }
+
+    def get_positions_page(self, page=1, page_size=1000, bbox=None):  # noqa: ANN001
+        return self.page
+
+    def register_viewport(self, *args, **kwargs):  # noqa: ANN002, ANN003
+        return None
+
+
+def _build_app(stack: str, positions: int) -> FastAPI:
+    app = FastAPI()
+    app.include_router(ais_router.router)
+    service = _StaticPositions(positions)
+    app.dependency_overrides[ais_router.get_ais_bridge_service] = lambda: service
+    if stack == "pipeline":
+        from app.core.middleware.pipeline import RequestPipelineMiddleware
+        app.add_middleware(RequestPipelineMiddleware)
+    elif stack == "full":
+        from app.main import add_middlewares
+        add_middlewares(app)
+    return app
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _scope(path: str, query: bytes, token: Optional[str]) -> dict:
+    headers = [(b"host", b"bench"), (b"user-agent", b"benchmark_middleware")]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query,
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def _call(app, scope: dict) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(scope), receive, send)
+    return status
+
+
+async def _run_stack(app, scope: dict, requests: int, warmup: int, concurrency: int) -> dict:
+    for _ in range(warmup):
+        await _call(app, scope)
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    async def worker(n: int) -> None:
+        for _ in range(n):
+            t0 = time.perf_counter()
+            code = await _call(app, scope)
+            samples.append((time.perf_counter() - t0) * 1e6)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    per_worker = max(1, requests // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(_percentile(samples, 50), 1),
+        "p99_us": round(_percentile(samples, 99), 1),
+        "statuses": statuses,
+    }
+
+
+async def run(args, builders: Optional[Dict[str, Callable[[], object]]] = None) -> dict:
+    token = None
+    if args.token:
+        from app.auth.security_jwt import create_access_token
+        token = create_access_token("1")
+    scope = _scope(args.path, args.query.encode(), token)
+    results = {}
+    for stack in args.stacks:
+        app = builders[stack]() if builders and stack in builders else _build_app(stack, args.positions)
+        results[stack] = await _run_stack(app, scope, args.requests, args.warmup, args.concurrency)
+    base = results.get("none")
+    if base:
+        for stack, res in results.items():
+            res["overhead_us"] = round(res["mean_us"] - base["mean_us"], 1)
+    return {
+        "path": args.path,
+        "positions": args.positions,
+        "token": bool(token),
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del overhead de middlewares en /aisstream/positions")
+    parser.add_argument("--stacks", nargs="+", default=["none", "pipeline", "full"], choices=("none", "pipeline", "full"))
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests simultáneas (tareas asyncio)")
+    parser.add_argument("--positions", type=int, default=50, help="Tamaño de la página devuelta")
+    parser.add_argument("--path", default="/aisstream/positions")
+    parser.add_argument("--query", default="page=1&page_size=50")
+    parser.add_argument("--token", action="store_true", help="Enviar un JWT válido (Authorization: Bearer)")
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    # La auditoría escribe una línea por request: fuera del benchmark
+    logging.disable(logging.INFO)
+    result = asyncio.run(run(args))
+    for stack, res in result["results"].items():
+        print(
+            f"{stack:>9}: mean={res['mean_us']}us p50={res['p50_us']}us p99={res['p99_us']}us "
+            f"rps={res['rps']} overhead={res.get('overhead_us')}us statuses={res['statuses']}"
+        )
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+        print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
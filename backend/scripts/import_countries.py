@@ -16,6 +16,7 @@ sys.path.insert(0, str(backend_dir))
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
 from app.db.models import MarineCountry
+from app.services.country_index import bump_country_dataset_version
 
 
 def import_countries_from_csv(csv_file_path: str):
@@ -63,6 +64,8 @@ def import_countries_from_csv(csv_file_path: str):
             
             # Confirmar los cambios
             db.commit()
+            # Los procesos en marcha recargan su tabla MID -> país
+            bump_country_dataset_version()
             
             print(f"\n✅ Importación completada:")
             print(f"   - Países agregados: {countries_added}")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Sincroniza marine_port con el World Port Index de NGA (o una copia local del JSON).
+
+Uso:
+    python scripts/sync_ports.py                      # PORTS_SYNC_SOURCE (por defecto la API de NGA)
+    python scripts/sync_ports.py wpi.json.gz          # sync offline desde fichero
+"""
+import json
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz del backend al path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.config.settings import PORTS_SYNC_SOURCE
+from app.db.database import SessionLocal
+from app.services.destination_resolver import backfill_vessel_destinations, destination_resolver, load_port_rows
+from app.services.port_index import bump_port_dataset_version
+from app.services.port_sync import sync_ports_from_source
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else PORTS_SYNC_SOURCE
+    with SessionLocal() as db:
+        stats = sync_ports_from_source(db, source)
+        bump_port_dataset_version()
+        destination_resolver.ensure(lambda: load_port_rows(db), force=True)
+        stats["vessel destinations updated"] = backfill_vessel_destinations(db, destination_resolver)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 Script para actualizar el campo flag de marine_vessel con el MID (primeros 3 dígitos del MMSI).
 
 Este script:
-1. Extrae los primeros 3 dígitos del MMSI de cada vessel
+1. Extrae el MID del MMSI de cada vessel (estructura ITU, `app.services.country_index`)
 2. Valida que el MID existe en la tabla marine_country
 3. Actualiza el campo flag con el valor del MID
 """
@@ -16,6 +16,7 @@ sys.path.insert(0, str(backend_dir))
 from sqlalchemy import func
 from app.db.database import SessionLocal
 from app.db.models import MarineVessel, MarineCountry
+from app.services.country_index import country_index, mids_from_mmsis
 
 
 def update_vessel_flags():
@@ -23,14 +24,19 @@ def update_vessel_flags():
     db = SessionLocal()
     
     try:
-        # Obtener todos los MIDs válidos de marine_country
-        valid_mids = set(mid for (mid,) in db.query(MarineCountry.mid).all())
-        print(f"📋 MIDs válidos en marine_country: {len(valid_mids)}")
+        # Tabla de MIDs válidos de marine_country (en memoria)
+        country_index.build(db.query(MarineCountry.mid, MarineCountry.country).all())
+        print(f"📋 MIDs válidos en marine_country: {len(country_index)}")
         
         # Obtener todos los vessels
         vessels = db.query(MarineVessel).all()
         total_vessels = len(vessels)
         print(f"🚢 Total de vessels a procesar: {total_vessels}\n")
+
+        # MID y bandera de todos los MMSI de una vez (vectorizado)
+        mmsis = [vessel.mmsi for vessel in vessels]
+        all_mids = mids_from_mmsis(mmsis).tolist()
+        all_flags = country_index.flags(mmsis)
         
         # Contadores
         updated = 0
@@ -49,37 +55,14 @@ def update_vessel_flags():
                 continue
             
             mmsi = vessel.mmsi
-            mid = None
-            
-            # Robust parsing based on ITU MMSI structure
-            if mmsi and isinstance(mmsi, str):
-                mid_str = None
-                if mmsi.startswith("111"):  # SAR Aircraft
-                    if len(mmsi) >= 6: mid_str = mmsi[3:6]
-                elif mmsi.startswith("00"):  # Coast Stations
-                    if len(mmsi) >= 5: mid_str = mmsi[2:5]
-                elif mmsi.startswith("0"):   # Group MMSI
-                    if len(mmsi) >= 4: mid_str = mmsi[1:4]
-                elif mmsi.startswith("99") or mmsi.startswith("98"):
-                    if len(mmsi) >= 5: mid_str = mmsi[2:5]
-                elif len(mmsi) >= 3:
-                    mid_str = mmsi[:3]
-                
-                if mid_str:
-                    try:
-                        possible_mid = int(mid_str)
-                        # SAFETY CHECK: Only set if it exists in marine_country
-                        if possible_mid in valid_mids:
-                            mid = possible_mid
-                        else:
-                            mid_not_found += 1
-                            if mid_not_found <= 10:
-                                print(f"⚠️  MID {possible_mid} no encontrado (MMSI: {mmsi}, Vessel: {vessel.name})")
-                    except (ValueError, TypeError):
-                        invalid_mmsi += 1
-                else:
-                    invalid_mmsi += 1
-            
+            mid = all_flags[i - 1]
+            if all_mids[i - 1] < 0:
+                invalid_mmsi += 1
+            elif mid is None:
+                mid_not_found += 1
+                if mid_not_found <= 10:
+                    print(f"⚠️  MID {all_mids[i - 1]} no encontrado (MMSI: {mmsi}, Vessel: {vessel.name})")
+
             if mid:
                 vessel.flag = mid
                 updated += 1
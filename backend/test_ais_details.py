@@ -0,0 +1,39 @@
+from app.integrations.aisstream.details import build_detail_doc
+from app.integrations.aisstream.service import AISBridgeService
+
+from test_ais_history import FakeRedis, _ingest
+
+MMSI = "123456789"
+STATIC = {"ship_name": "TEST VESSEL", "imo_number": 9123456, "call_sign": "ABCD", "ship_type": "Cargo"}
+
+
+def test_position_does_not_rewrite_detail_doc():
+    svc = AISBridgeService(sio_server=None, api_key="x")
+    svc._details[MMSI] = build_detail_doc(STATIC, "Spain")
+    _ingest(svc, [(1.0, 2.0)], mmsi=MMSI)
+    assert not svc._details_dirty
+    assert svc._details[MMSI]["latitude"] is None
+    doc = svc.get_ship_details(MMSI)
+    assert (doc["latitude"], doc["longitude"]) == (1.0, 2.0)
+    assert doc["ship_name"] == "TEST VESSEL"
+
+
+def test_passive_worker_merges_position_from_redis():
+    redis = FakeRedis()
+    active = AISBridgeService(sio_server=None, api_key="x", redis_client=redis)
+    updates = _ingest(active, [(1.0, 2.0)], mmsi=MMSI)
+    active._write_frame_to_redis(updates, None, {MMSI: build_detail_doc(STATIC, "Spain")})
+
+    passive = AISBridgeService(sio_server=None, api_key="x", redis_client=redis)
+    doc = passive.get_ship_details(MMSI)
+    assert (doc["latitude"], doc["longitude"]) == (1.0, 2.0)
+    docs, positions = passive.get_details_bulk([MMSI, "999999999"])
+    assert list(docs) == [MMSI] and docs[MMSI]["latitude"] == 1.0
+    assert positions == {MMSI: (1.0, 2.0)}
+
+
+def test_vessel_without_static_data_has_no_doc():
+    svc = AISBridgeService(sio_server=None, api_key="x")
+    _ingest(svc, [(1.0, 2.0)], mmsi=MMSI)
+    assert svc.get_ship_details(MMSI) is None
+    assert svc.get_ship_position(MMSI) == (1.0, 2.0)
@@ -0,0 +1,101 @@
+import asyncio
+
+from app.integrations.aisstream.service import AISBridgeService
+
+
+class FakeRedis:
+    """Lo justo de redis-py (hashes, listas, pipeline) para el historial y las secuencias."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.lists = {}
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.ops.append((name, args, kwargs))
+
+    def execute(self):
+        r = self.redis
+        out = []
+        for name, args, kwargs in self.ops:
+            if name == "rpush":
+                r.lists.setdefault(args[0], []).extend(args[1:])
+                out.append(len(r.lists[args[0]]))
+            elif name == "ltrim":
+                items = r.lists.get(args[0], [])
+                start, end = args[1], args[2]
+                r.lists[args[0]] = items[start:] if end == -1 else items[start:end + 1]
+                out.append(True)
+            elif name == "hset":
+                r.hashes.setdefault(args[0], {}).update({k: str(v) for k, v in kwargs["mapping"].items()})
+                out.append(len(kwargs["mapping"]))
+            elif name == "lrange":
+                out.append(list(r.lists.get(args[0], [])))
+            elif name == "hget":
+                out.append(r.hashes.get(args[0], {}).get(args[1]))
+            elif name == "hmget":
+                out.append([r.hashes.get(args[0], {}).get(k) for k in args[1]])
+            else:
+                out.append(None)
+        self.ops = []
+        return out
+
+
+def _report(mmsi, lat, lon):
+    return {"Message": {"PositionReport": {"UserID": int(mmsi), "Latitude": lat, "Longitude": lon, "Sog": 10.0}}}
+
+
+def _ingest(svc, points, mmsi="123456789"):
+    async def run():
+        for lat, lon in points:
+            await svc._handle_position_report(_report(mmsi, lat, lon))
+    asyncio.run(run())
+    # Lo que haría el siguiente frame
+    updates, svc._frame_updates = svc._frame_updates, []
+    if svc.redis_client is not None:
+        svc._write_frame_to_redis(updates)
+    return updates
+
+
+def test_seq_continues_across_reconnect():
+    svc = AISBridgeService(sio_server=None, api_key="x")
+    first = _ingest(svc, [(1.0, 1.0), (1.1, 1.1)])
+    svc._reset_stream_state()
+    second = _ingest(svc, [(1.2, 1.2)])
+    assert [u["seq"] for u in first + second] == [1, 2, 3]
+
+
+def test_history_after_reconnect_is_complete():
+    svc = AISBridgeService(sio_server=None, api_key="x", redis_client=FakeRedis())
+    _ingest(svc, [(1.0, 1.0), (1.1, 1.1)])
+    svc._reset_stream_state()
+    _ingest(svc, [(1.2, 1.2)])
+    history = svc.get_ship_history("123456789")
+    assert history["seq"] == 3
+    assert history["positions"] == [[1.0, 1.0], [1.1, 1.1], [1.2, 1.2]]
+
+
+def test_history_after_restart_reads_redis():
+    redis = FakeRedis()
+    before = AISBridgeService(sio_server=None, api_key="x", redis_client=redis)
+    _ingest(before, [(1.0, 1.0), (1.1, 1.1)])
+
+    # Proceso nuevo: secuencias cargadas de ais:seq, memoria vacía
+    after = AISBridgeService(sio_server=None, api_key="x", redis_client=redis)
+    after._load_seq()
+    updates = _ingest(after, [(1.2, 1.2)])
+    assert updates[0]["seq"] == 3
+    history = after.get_ship_history("123456789")
+    assert history["seq"] == 3
+    assert history["positions"] == [[1.0, 1.0], [1.1, 1.1], [1.2, 1.2]]
@@ -0,0 +1,85 @@
+from shapely.geometry import box
+
+from app.integrations.aisstream.alerts import AlertEngine, AlertRule, geodesic_circle
+
+INSIDE = {"id": "123", "lat": 0.5, "lon": 0.5}
+OUTSIDE = {"id": "123", "lat": 5.0, "lon": 5.0}
+
+
+def _engine(confirm_reports=2, cooldown_seconds=300.0, events=("enter", "exit"), mmsis=None):
+    engine = AlertEngine(confirm_reports=confirm_reports, cooldown_seconds=cooldown_seconds)
+    engine.load([AlertRule(1, 7, "geofence", box(0, 0, 1, 1), mmsis, set(events))])
+    return engine
+
+
+def _events(engine, update, now):
+    return [e["event"] for e in engine.evaluate([update], now=now)]
+
+
+def test_enter_needs_confirmation():
+    engine = _engine(confirm_reports=2)
+    assert _events(engine, INSIDE, 0.0) == []
+    assert _events(engine, INSIDE, 1.0) == ["enter"]
+    assert _events(engine, INSIDE, 2.0) == []
+
+
+def test_single_outlier_report_does_not_flip_state():
+    engine = _engine(confirm_reports=2)
+    _events(engine, INSIDE, 0.0)
+    _events(engine, INSIDE, 1.0)
+    # Un salto aislado fuera de la zona se descarta al volver dentro
+    assert _events(engine, OUTSIDE, 2.0) == []
+    assert _events(engine, INSIDE, 3.0) == []
+    assert _events(engine, OUTSIDE, 4.0) == []
+    assert _events(engine, OUTSIDE, 5.0) == ["exit"]
+
+
+def test_cooldown_suppresses_repeated_events():
+    engine = _engine(confirm_reports=1, cooldown_seconds=100.0)
+    assert _events(engine, INSIDE, 0.0) == ["enter"]
+    assert _events(engine, OUTSIDE, 10.0) == ["exit"]
+    assert _events(engine, INSIDE, 20.0) == []
+    assert _events(engine, OUTSIDE, 30.0) == []
+    assert _events(engine, INSIDE, 150.0) == ["enter"]
+
+
+def test_cooldowns_survive_pruning():
+    engine = _engine(confirm_reports=1, cooldown_seconds=100.0)
+    engine.evaluate([{"id": "999", "lat": 0.5, "lon": 0.5}], now=0.0)
+    assert _events(engine, INSIDE, 90.0) == ["enter"]
+    assert _events(engine, OUTSIDE, 95.0) == ["exit"]
+    # La poda (cada cooldown_seconds) descarta el disparo de 999 pero no los recientes
+    assert _events(engine, INSIDE, 110.0) == []
+    assert all(key[1] == "123" for key in engine._last_fired)
+
+
+def test_event_filter_and_mmsi_filter():
+    only_exit = _engine(confirm_reports=1, events=("exit",))
+    assert _events(only_exit, INSIDE, 0.0) == []
+    assert _events(only_exit, OUTSIDE, 1.0) == ["exit"]
+    other_vessel = _engine(confirm_reports=1, mmsis={"456"})
+    assert _events(other_vessel, INSIDE, 0.0) == []
+
+
+def test_forget_applies_on_next_evaluation():
+    engine = _engine(confirm_reports=1, cooldown_seconds=0.0)
+    assert _events(engine, INSIDE, 0.0) == ["enter"]
+    engine.forget("123")
+    # Sin estado previo, volver a verlo dentro es una nueva entrada
+    assert _events(engine, INSIDE, 1.0) == ["enter"]
+
+
+def test_reload_keeps_state_of_surviving_alerts():
+    engine = _engine(confirm_reports=1)
+    assert _events(engine, INSIDE, 0.0) == ["enter"]
+    engine.load([
+        AlertRule(2, 7, "geofence", box(10, 10, 11, 11), None, {"enter", "exit"}),
+        AlertRule(1, 7, "geofence", box(0, 0, 1, 1), None, {"enter", "exit"}),
+    ])
+    assert _events(engine, INSIDE, 1.0) == []
+
+
+def test_port_circle_radius():
+    circle = geodesic_circle(0.0, 0.0, 10.0)
+    # 10 km ~ 0.09 grados en el ecuador
+    assert 0.085 < circle.bounds[2] < 0.095
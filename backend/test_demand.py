@@ -0,0 +1,76 @@
+from app.integrations.aisstream.demand import (
+    IDLE_BOXES,
+    DemandTracker,
+    merge_boxes,
+    normalize_boxes,
+    to_aisstream,
+    viewport_to_boxes,
+)
+
+
+def test_viewport_across_antimeridian_is_split():
+    assert viewport_to_boxes(170.0, -10.0, -170.0, 10.0) == [
+        (-10.0, 170.0, 10.0, 180.0),
+        (-10.0, -180.0, 10.0, -170.0),
+    ]
+    assert viewport_to_boxes(-10.0, 20.0, 10.0, 40.0) == [(20.0, -10.0, 40.0, 10.0)]
+
+
+def test_antimeridian_halves_are_not_merged_across_the_map():
+    halves = viewport_to_boxes(170.0, -10.0, -170.0, 10.0)
+    assert merge_boxes(halves) == sorted(halves)
+
+
+def test_merge_boxes_joins_touching_boxes():
+    assert merge_boxes([(0, 0, 10, 10), (5, 5, 15, 15), (50, 50, 60, 60)]) == [
+        (0, 0, 15, 15),
+        (50, 50, 60, 60),
+    ]
+
+
+def test_merge_boxes_respects_max_boxes():
+    boxes = [(0, 0, 1, 1), (0, 10, 1, 11), (0, 100, 1, 101)]
+    merged = merge_boxes(boxes, max_boxes=2)
+    # Se fusionan las dos cajas cercanas (menor coste en área), la lejana queda sola
+    assert merged == [(0, 0, 1, 11), (0, 100, 1, 101)]
+
+
+def test_normalize_boxes_accepts_single_box_and_list():
+    assert normalize_boxes([[10, 20], [0, 5]]) == [(0, 5, 10, 20)]
+    assert normalize_boxes([[[0, 0], [1, 1]], [[2, 2], [3, 3]]]) == [(0, 0, 1, 1), (2, 2, 3, 3)]
+    assert to_aisstream([]) == [list(map(list, b)) for b in IDLE_BOXES]
+
+
+def test_growth_is_applied_immediately():
+    tracker = DemandTracker(grid_deg=5.0)
+    assert tracker.decide([(0, 0, 4, 4)], now=0.0) == [(0, 0, 5, 5)]
+    assert tracker.decide([(0, 0, 4, 4)], now=1.0) is None
+    assert tracker.decide([(0, 0, 4, 4), (20, 20, 24, 24)], now=2.0) == [(0, 0, 5, 5), (20, 20, 25, 25)]
+
+
+def test_shrink_waits_for_delay():
+    tracker = DemandTracker(grid_deg=5.0, shrink_ratio=1.5, shrink_delay=60.0)
+    tracker.decide([(0, 0, 4, 4), (20, 20, 24, 24)], now=0.0)
+    assert tracker.decide([(0, 0, 4, 4)], now=10.0) is None
+    assert tracker.decide([(0, 0, 4, 4)], now=69.0) is None
+    assert tracker.decide([(0, 0, 4, 4)], now=70.0) == [(0, 0, 5, 5)]
+
+
+def test_shrink_timer_resets_when_demand_returns():
+    tracker = DemandTracker(grid_deg=5.0, shrink_ratio=1.5, shrink_delay=60.0)
+    both = [(0, 0, 4, 4), (20, 20, 24, 24)]
+    tracker.decide(both, now=0.0)
+    assert tracker.decide([(0, 0, 4, 4)], now=10.0) is None
+    assert tracker.decide(both, now=20.0) is None
+    # El retraso cuenta de nuevo desde la siguiente caída
+    assert tracker.decide([(0, 0, 4, 4)], now=30.0) is None
+    assert tracker.decide([(0, 0, 4, 4)], now=80.0) is None
+    assert tracker.decide([(0, 0, 4, 4)], now=90.0) == [(0, 0, 5, 5)]
+
+
+def test_small_shrink_below_ratio_is_ignored():
+    tracker = DemandTracker(base_boxes=[(0, 0, 10, 10)], grid_deg=5.0, shrink_ratio=1.5, shrink_delay=0.0)
+    assert tracker.decide([(6, 6, 9, 12)], now=0.0) == [(0, 0, 10, 15)]
+    # El área baja de 150 a 100 (ratio 1.5, no lo supera): se mantiene la suscripción
+    assert tracker.decide([], now=100.0) is None
+    assert tracker.decide([], now=200.0) is None
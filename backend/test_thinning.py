@@ -0,0 +1,48 @@
+from app.integrations.aisstream.thinning import ThinningPolicy, heading_delta, haversine_m, report_heading
+
+# ~111 m por cada 0.001 grados de latitud
+POLICY = ThinningPolicy(min_interval_s=10, min_distance_m=50, heading_delta_deg=15)
+
+
+def test_first_report_is_accepted():
+    assert POLICY.accept(None, 0.0, 10.0, 20.0, 90.0)
+
+
+def test_identical_position_is_rejected():
+    assert not ThinningPolicy().accept((0.0, 10.0, 20.0, 90.0), 100.0, 10.0, 20.0, 90.0)
+
+
+def test_rejects_below_min_distance():
+    last = (0.0, 10.0, 20.0, 90.0)
+    # 0.0001 grados ~ 11 m, aunque haya pasado tiempo de sobra
+    assert not POLICY.accept(last, 60.0, 10.0001, 20.0, 90.0)
+
+
+def test_accepts_after_min_interval():
+    last = (0.0, 10.0, 20.0, 90.0)
+    assert not POLICY.accept(last, 9.0, 10.001, 20.0, 90.0)
+    assert POLICY.accept(last, 10.0, 10.001, 20.0, 90.0)
+
+
+def test_heading_change_bypasses_interval():
+    last = (0.0, 10.0, 20.0, 90.0)
+    assert not POLICY.accept(last, 2.0, 10.001, 20.0, 100.0)
+    assert POLICY.accept(last, 2.0, 10.001, 20.0, 105.0)
+    # Sin umbral de rumbo, un giro no adelanta el intervalo
+    no_heading = ThinningPolicy(min_interval_s=10, min_distance_m=50)
+    assert not no_heading.accept(last, 2.0, 10.001, 20.0, 270.0)
+
+
+def test_heading_delta_wraps_around_north():
+    assert heading_delta(350.0, 10.0) == 20.0
+    assert heading_delta(None, 10.0) == 0.0
+
+
+def test_haversine_one_millidegree_latitude():
+    assert 110 < haversine_m(10.0, 20.0, 10.001, 20.0) < 112
+
+
+def test_report_heading_falls_back_to_cog():
+    assert report_heading({"TrueHeading": 45, "Cog": 50.0}) == 45.0
+    assert report_heading({"TrueHeading": 511, "Cog": 50.0}) == 50.0
+    assert report_heading({"TrueHeading": 511, "Cog": 360.0}) is None